@@ -1,90 +1,973 @@
+import argparse
+import ctypes
+import ctypes.util
+import hashlib
+import io
+import itertools
+import json
+import math
+import resource
+import shutil
+import struct
+import subprocess
 import sys
 import os
+import tempfile
+import time
 from PIL import Image, ImageFilter
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 WIDGET_SIZE = 300
 SCREEN_W = 1920
 SCREEN_H = 1080
 PADDING = 50
+SCALE = 0.1
+DECODE = "fast"
+
+# Lives next to caelestia's own wallpapers_cache_dir and uses the same
+# content hash, one directory per wallpaper.
+CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+                         "caelestia", "auto_position")
+CACHE_MAX_BYTES = 16 * 1024 * 1024
+
+PATH_FILE = os.path.join(os.environ.get("XDG_STATE_HOME") or os.path.expanduser("~/.local/state"),
+                         "caelestia", "wallpaper", "path.txt")
 
-def clamp_inside(x, y):
-    max_x = SCREEN_W - WIDGET_SIZE - PADDING
-    max_y = SCREEN_H - WIDGET_SIZE - PADDING
+def clamp_inside(x, y, screen_w=None, screen_h=None, widget_w=None, widget_h=None):
+    screen_w = screen_w or SCREEN_W
+    screen_h = screen_h or SCREEN_H
+    widget_w = widget_w or WIDGET_SIZE
+    widget_h = widget_h or WIDGET_SIZE
+
+    max_x = screen_w - widget_w - PADDING
+    max_y = screen_h - widget_h - PADDING
     x = max(PADDING, min(x, max_x))
     y = max(PADDING, min(y, max_y))
     return x, y
 
-def find_best_spot(wallpaper_path):
+def open_wallpaper(wallpaper_path, screen_w, screen_h, decode=None):
+    """
+    Open the wallpaper for MAPS, which only look at the analysis grid
+    (SCALE of the screen). In "fast" mode JPEGs go through draft(), so
+    libjpeg scales by 1/2, 1/4 or 1/8 towards the grid and emits grayscale
+    while decoding, and an 8K source never exists in memory at full size.
+    Other formats are decoded whole and then shrunk with Image.reduce() to
+    the smallest integer fraction still covering the grid. "full" mode
+    decodes the whole image as before.
+    """
+    img = Image.open(wallpaper_path)
+    if (decode or DECODE) != "fast":
+        return img
+    small_w = int(screen_w * SCALE)
+    small_h = int(screen_h * SCALE)
+    if img.format == "JPEG":
+        img.draft("L", (small_w, small_h))
+        return img
+    factor = min(img.size[0] // max(small_w, 1), img.size[1] // max(small_h, 1))
+    img = img.convert("L")
+    return img.reduce(factor) if factor > 1 else img
+
+def load_edges(wallpaper_path, screen_w, screen_h):
+    """Edge map of the wallpaper, downscaled to SCALE of the screen."""
+    return edges_for(open_wallpaper(wallpaper_path, screen_w, screen_h), screen_w, screen_h)
+
+def gray_for(img, screen_w, screen_h):
+    """Luminance of an already decoded image straight at the analysis grid size."""
+    small_w = int(screen_w * SCALE)
+    small_h = int(screen_h * SCALE)
+    return img.convert("L").resize((small_w, small_h), resample=Image.BOX)
+
+def edges_for(img, screen_w, screen_h):
+    """
+    Edge map of an already decoded image as shown on a screen_w x screen_h
+    monitor, found on the analysis grid rather than at full screen size.
+    """
+    return gray_for(img, screen_w, screen_h).filter(ImageFilter.FIND_EDGES)
+
+# Maps the scoring backends are computed from, all at the analysis grid size
+MAPS = {
+    "edges": edges_for,
+    "gray": gray_for,
+}
+
+# --- Cache -----------------------------------------------------------------
+
+def compute_hash(path):
+    """sha256 of the file contents, the key caelestia uses for wallpapers_cache_dir."""
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1 << 20):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+def atomic_write(path, data):
+    """Write via a temp file in the same directory so readers never see half a file."""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
     try:
-        if not os.path.exists(wallpaper_path):
-            return clamp_inside(PADDING, PADDING)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+class PlacementCache:
+    """
+    On-disk cache of downscaled edge maps and computed placements.
+
+    Layout: <root>/<content hash>/<map>-<decode>-<W>x<H>.png (see MAPS and
+    open_wallpaper) and placements.json.
+    Every hit bumps the entry's mtime; evict() drops least recently used
+    entries until the whole cache fits in max_bytes. paths.json remembers
+    the hash of each path by (size, mtime) so a known wallpaper is not
+    even re-read. Any cache failure is treated as a miss.
+    """
+
+    def __init__(self, root=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(root, "paths.json")
+
+    def _read_json(self, path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _entry(self, key):
+        return os.path.join(self.root, key)
+
+    def _touch(self, key):
+        try:
+            os.utime(self._entry(key))
+        except OSError:
+            pass
+
+    def key_for(self, wallpaper_path):
+        try:
+            real = os.path.realpath(wallpaper_path)
+            st = os.stat(real)
+            stamp = [st.st_size, st.st_mtime_ns]
+
+            index = self._read_json(self.index_path)
+            known = index.get(real)
+            if known and known[:2] == stamp:
+                return known[2]
+
+            key = compute_hash(real)
+            index[real] = stamp + [key]
+            os.makedirs(self.root, exist_ok=True)
+            atomic_write(self.index_path, json.dumps(index).encode())
+            return key
+        except OSError:
+            return None
+
+    def _map_name(self, kind, screen_w, screen_h):
+        return f"{kind}-{DECODE}-{screen_w}x{screen_h}.png"
+
+    def load_map(self, key, kind, screen_w, screen_h):
+        path = os.path.join(self._entry(key), self._map_name(kind, screen_w, screen_h))
+        try:
+            img = Image.open(path)
+            img.load()
+        except (OSError, ValueError):
+            return None
+        self._touch(key)
+        return img
+
+    def store_map(self, key, kind, screen_w, screen_h, small_map):
+        buf = io.BytesIO()
+        small_map.save(buf, "PNG")
+        try:
+            os.makedirs(self._entry(key), exist_ok=True)
+            atomic_write(os.path.join(self._entry(key), self._map_name(kind, screen_w, screen_h)), buf.getvalue())
+        except OSError:
+            pass
+        self.evict()
+
+    def load_placement(self, key, name):
+        value = self._read_json(os.path.join(self._entry(key), "placements.json")).get(name)
+        if value is not None:
+            self._touch(key)
+        return value
+
+    def store_placement(self, key, name, value):
+        path = os.path.join(self._entry(key), "placements.json")
+        placements = self._read_json(path)
+        placements[name] = value
+        try:
+            os.makedirs(self._entry(key), exist_ok=True)
+            atomic_write(path, json.dumps(placements).encode())
+        except OSError:
+            pass
+        self.evict()
+
+    def evict(self):
+        try:
+            entries = []
+            total = 0
+            for name in os.listdir(self.root):
+                path = os.path.join(self.root, name)
+                if not os.path.isdir(path):
+                    continue
+                size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+                entries.append((os.path.getmtime(path), size, path))
+                total += size
+
+            entries.sort()
+            evicted = set()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(path, ignore_errors=True)
+                evicted.add(os.path.basename(path))
+                total -= size
+
+            if evicted:
+                index = self._read_json(self.index_path)
+                index = {p: v for p, v in index.items() if v[2] not in evicted}
+                atomic_write(self.index_path, json.dumps(index).encode())
+        except OSError:
+            pass
+
+def cached_map(kind, open_image, screen_w, screen_h, cache=None, key=None):
+    """
+    One of MAPS for one screen size, from the cache when possible.
+    open_image is only called (and the wallpaper only decoded) on a miss.
+    """
+    if cache and key:
+        small_map = cache.load_map(key, kind, screen_w, screen_h)
+        if small_map is not None:
+            return small_map
+
+    small_map = MAPS[kind](open_image(), screen_w, screen_h)
+    if cache and key:
+        cache.store_map(key, kind, screen_w, screen_h, small_map)
+    return small_map
+
+def search_bounds(small_w, small_h, screen_w, screen_h, widget_w, widget_h):
+    """
+    Scaled window size and the inclusive range of top-left corners
+    that keep the widget inside the padded screen and the edge map.
+    """
+    w_scaled = int(widget_w * SCALE)
+    h_scaled = int(widget_h * SCALE)
+
+    min_x_s = int(PADDING * SCALE)
+    max_x_s = min(int((screen_w - widget_w - PADDING) * SCALE), small_w - w_scaled)
+
+    min_y_s = int(PADDING * SCALE)
+    max_y_s = min(int((screen_h - widget_h - PADDING) * SCALE), small_h - h_scaled)
+
+    return w_scaled, h_scaled, min_x_s, max_x_s, min_y_s, max_y_s
+
+# --- Scoring engines -------------------------------------------------------
+# Each engine takes the small edge map and the bounds from search_bounds()
+# and returns (energy, x, y) of the quietest window in scaled coordinates.
+
+def score_reference(small_edges, bounds, step=5, sample=2):
+    """
+    The original pure-Python loop. Kept as the reference for checking the
+    other engines: with step=1 and sample=1 it is an exhaustive search.
+    """
+    w_scaled, h_scaled, min_x_s, max_x_s, min_y_s, max_y_s = bounds
+    pixels = list(small_edges.getdata())
+    width = small_edges.size[0]
+
+    min_energy = float('inf')
+    best_x = min_x_s
+    best_y = min_y_s
+
+    for y in range(min_y_s, max_y_s + 1, step):
+        for x in range(min_x_s, max_x_s + 1, step):
+            energy = 0
+            for by in range(0, h_scaled, sample):
+                row_off = (y + by) * width
+                for bx in range(0, w_scaled, sample):
+                    energy += pixels[row_off + (x + bx)]
+
+            if energy < min_energy:
+                min_energy = energy
+                best_x = x
+                best_y = y
+
+    return min_energy, best_x, best_y
+
+def integral_image(arr):
+    """Summed-area table with a leading row and column of zeros."""
+    sat = np.zeros((arr.shape[0] + 1, arr.shape[1] + 1), dtype=np.int64)
+    np.cumsum(np.cumsum(arr, axis=0, dtype=np.int64), axis=1, out=sat[1:, 1:])
+    return sat
+
+def window_sums(sat, w, h):
+    """Sum of every w x h window, indexed by its top-left corner [y, x]."""
+    return sat[h:, w:] - sat[:-h, w:] - sat[h:, :-w] + sat[:-h, :-w]
+
+def score_sat(small_edges, bounds):
+    """Every window at stride 1, each scored in O(1) from the integral image."""
+    w_scaled, h_scaled, min_x_s, max_x_s, min_y_s, max_y_s = bounds
+    if max_x_s < min_x_s or max_y_s < min_y_s or w_scaled < 1 or h_scaled < 1:
+        return float('inf'), min_x_s, min_y_s
+
+    sat = integral_image(np.asarray(small_edges, dtype=np.uint8))
+    sums = window_sums(sat, w_scaled, h_scaled)
+    sums = sums[min_y_s:max_y_s + 1, min_x_s:max_x_s + 1]
+
+    # argmin keeps the first minimum in row-major order, same as the loop
+    idx = int(np.argmin(sums))
+    y, x = divmod(idx, sums.shape[1])
+    return int(sums[y, x]), min_x_s + x, min_y_s + y
+
+ENGINES = {
+    "sat": score_sat,
+    "reference": score_reference,
+}
+
+def resolve_engine(engine):
+    if engine == "sat" and np is None:
+        return "reference"
+    return engine
+
+# --- Scoring backends ------------------------------------------------------
+# A backend turns the analysis maps into a function of the window size that
+# returns the energy of every window as a [0, 1] grid indexed [y, x] like
+# window_sums(). WindowScorer mixes them with weights; the default is plain
+# edge energy, which ranks windows exactly like score_sat.
+
+def integral_image_float(arr):
+    sat = np.zeros((arr.shape[0] + 1, arr.shape[1] + 1), dtype=np.float64)
+    np.cumsum(np.cumsum(arr, axis=0, dtype=np.float64), axis=1, out=sat[1:, 1:])
+    return sat
+
+def box_filter(arr, k):
+    """Mean over a k x k neighbourhood, edges replicated, same shape as arr."""
+    pad = k // 2
+    padded = np.pad(arr, ((pad, k - 1 - pad), (pad, k - 1 - pad)), mode="edge")
+    return window_sums(integral_image_float(padded), k, k) / (k * k)
+
+def normalize(arr):
+    peak = float(arr.max()) if arr.size else 0.0
+    return arr / peak if peak > 0 else np.zeros_like(arr)
+
+def mean_windows(energy):
+    """Window means of a per-pixel [0, 1] energy map."""
+    sat = integral_image_float(energy)
+    return lambda w, h: window_sums(sat, w, h) / (w * h)
+
+def backend_edges(maps):
+    """FIND_EDGES energy, the original score."""
+    sat = integral_image(maps["edges"].astype(np.uint8))
+    return lambda w, h: window_sums(sat, w, h) / (w * h * 255.0)
 
-        img = Image.open(wallpaper_path)
-        img = img.resize((SCREEN_W, SCREEN_H))
-        gray = img.convert("L")
-        edges = gray.filter(ImageFilter.FIND_EDGES)
+def backend_pyramid(maps, levels=(1, 2, 4)):
+    """
+    Gradient magnitude at several scales, averaged. Coarse levels see
+    large soft structure (horizons, silhouettes) that FIND_EDGES misses.
+    """
+    gray = maps["gray"]
+    h, w = gray.shape
+    total = np.zeros_like(gray)
+    for f in levels:
+        hh, ww = h // f * f, w // f * f
+        level = gray[:hh, :ww].reshape(hh // f, f, ww // f, f).mean(axis=(1, 3))
+        grad = (np.abs(np.diff(level, axis=1, append=level[:, -1:]))
+                + np.abs(np.diff(level, axis=0, append=level[-1:, :])))
+        up = np.repeat(np.repeat(grad, f, axis=0), f, axis=1)
+        total += np.pad(up, ((0, h - hh), (0, w - ww)), mode="edge")
+    return mean_windows(normalize(total))
 
-        scale = 0.1
-        small_w = int(SCREEN_W * scale)
-        small_h = int(SCREEN_H * scale)
+def backend_saliency(maps):
+    """
+    Spectral-residual saliency (Hou & Zhang 2007): whatever the log
+    spectrum does not explain is the subject, flat or not.
+    """
+    spectrum = np.fft.fft2(maps["gray"])
+    log_amp = np.log(np.abs(spectrum) + 1e-9)
+    residual = log_amp - box_filter(log_amp, 3)
+    sal = np.abs(np.fft.ifft2(np.exp(residual + 1j * np.angle(spectrum)))) ** 2
+    sal = box_filter(box_filter(sal, 5), 5)
+    return mean_windows(normalize(sal))
 
-        small_edges = edges.resize((small_w, small_h), resample=Image.BILINEAR)
+def backend_contrast(maps):
+    """
+    Luminance spread under the window, 0 for a flat patch. The clock sits
+    on a translucent blob, so an even background keeps it legible.
+    """
+    gray = maps["gray"] / 255.0
+    sat1 = integral_image_float(gray)
+    sat2 = integral_image_float(gray * gray)
 
-        pixels = list(small_edges.getdata())
-        width = small_w
+    def grid(w, h):
+        n = w * h
+        mean = window_sums(sat1, w, h) / n
+        var = window_sums(sat2, w, h) / n - mean * mean
+        return np.minimum(np.sqrt(np.maximum(var, 0.0)) * 2.0, 1.0)
+    return grid
 
-        w_scaled = int(WIDGET_SIZE * scale)
-        h_scaled = int(WIDGET_SIZE * scale)
+BACKENDS = {
+    "edges": (backend_edges, "edges"),
+    "pyramid": (backend_pyramid, "gray"),
+    "saliency": (backend_saliency, "gray"),
+    "contrast": (backend_contrast, "gray"),
+}
+DEFAULT_WEIGHTS = {"edges": 1.0}
 
-        # Compute VALID SEARCH RANGE (scaled)
-        min_x_s = int(PADDING * scale)
-        max_x_s = int((SCREEN_W - WIDGET_SIZE - PADDING) * scale)
+def parse_weights(text):
+    """Parse "edges=1,saliency=0.5" into {"edges": 1.0, "saliency": 0.5}."""
+    weights = {}
+    for part in text.split(","):
+        name, _, value = part.partition("=")
+        name = name.strip()
+        if name not in BACKENDS:
+            raise argparse.ArgumentTypeError(f"unknown backend {name!r}, pick from {', '.join(BACKENDS)}")
+        weights[name] = float(value) if value else 1.0
+    if not any(weights.values()):
+        # load_scorer would have no map to score
+        raise argparse.ArgumentTypeError("at least one backend needs a non-zero weight")
+    return weights
 
-        min_y_s = int(PADDING * scale)
-        max_y_s = int((SCREEN_H - WIDGET_SIZE - PADDING) * scale)
+def weights_tag(weights):
+    return ",".join(f"{k}={v:g}" for k, v in sorted(weights.items()))
 
-        min_energy = float('inf')
-        best_x = min_x_s
-        best_y = min_y_s
+class WindowScorer:
+    """Weighted sum of backend window energies for any window size."""
 
-        step = 5
+    def __init__(self, maps, weights=None):
+        self.weights = {k: v for k, v in (weights or DEFAULT_WEIGHTS).items() if v}
+        self.backends = {name: BACKENDS[name][0](maps) for name in self.weights}
 
-        for y in range(min_y_s, max_y_s - h_scaled, step):
-            for x in range(min_x_s, max_x_s - w_scaled, step):
-                energy = 0
-                for by in range(0, h_scaled, 2):
-                    row_off = (y + by) * width
-                    for bx in range(0, w_scaled, 2):
-                        energy += pixels[row_off + (x + bx)]
+    def grid(self, w, h):
+        total = None
+        for name, weight in self.weights.items():
+            part = self.backends[name](w, h) * weight
+            total = part if total is None else total + part
+        return total
 
-                if energy < min_energy:
-                    min_energy = energy
-                    best_x = x
-                    best_y = y
+def load_scorer(open_image, screen_w, screen_h, weights=None, cache=None, key=None):
+    """WindowScorer for one screen size plus the (w, h) of its analysis grid."""
+    needed = {BACKENDS[name][1] for name, v in (weights or DEFAULT_WEIGHTS).items() if v}
+    maps = {}
+    for kind in needed:
+        small_map = cached_map(kind, open_image, screen_w, screen_h, cache, key)
+        maps[kind] = np.asarray(small_map, dtype=np.float64)
+        size = small_map.size
+    return WindowScorer(maps, weights), size
+
+def score_weighted(scorer, bounds):
+    """Like score_sat, on a WindowScorer mix instead of raw edges."""
+    w_scaled, h_scaled, min_x_s, max_x_s, min_y_s, max_y_s = bounds
+    if max_x_s < min_x_s or max_y_s < min_y_s or w_scaled < 1 or h_scaled < 1:
+        return float('inf'), min_x_s, min_y_s
+
+    grid = scorer.grid(w_scaled, h_scaled)[min_y_s:max_y_s + 1, min_x_s:max_x_s + 1]
+    idx = int(np.argmin(grid))
+    y, x = divmod(idx, grid.shape[1])
+    return float(grid[y, x]), min_x_s + x, min_y_s + y
+
+def find_best_spot(wallpaper_path, engine="sat", cache=None, weights=None):
+    """
+    Top-left corner for the widget. weights mixes scoring backends (see
+    BACKENDS) and needs NumPy; without it only edge energy is used, by
+    the given engine.
+    """
+    try:
+        if not os.path.exists(wallpaper_path):
+            return clamp_inside(PADDING, PADDING)
+
+        engine = resolve_engine(engine)
+        if np is None or not weights:
+            weights = DEFAULT_WEIGHTS
+        mixed = weights != DEFAULT_WEIGHTS
+
+        key = cache.key_for(wallpaper_path) if cache else None
+        name = f"{SCREEN_W}x{SCREEN_H}/{WIDGET_SIZE}x{WIDGET_SIZE}/{engine}/{DECODE}"
+        if mixed:
+            name += "/" + weights_tag(weights)
+        if key:
+            spot = cache.load_placement(key, name)
+            if spot is not None:
+                return tuple(spot)
+
+        def open_image():
+            return open_wallpaper(wallpaper_path, SCREEN_W, SCREEN_H)
+
+        if mixed:
+            scorer, small_size = load_scorer(open_image, SCREEN_W, SCREEN_H, weights, cache, key)
+            bounds = search_bounds(*small_size, SCREEN_W, SCREEN_H, WIDGET_SIZE, WIDGET_SIZE)
+            _, best_x, best_y = score_weighted(scorer, bounds)
+        else:
+            small_edges = cached_map("edges", open_image, SCREEN_W, SCREEN_H, cache, key)
+            bounds = search_bounds(*small_edges.size, SCREEN_W, SCREEN_H, WIDGET_SIZE, WIDGET_SIZE)
+            _, best_x, best_y = ENGINES[engine](small_edges, bounds)
 
         # upscale result
-        final_x = int(best_x / scale)
-        final_y = int(best_y / scale)
+        final_x = int(best_x / SCALE)
+        final_y = int(best_y / SCALE)
 
-        return clamp_inside(final_x, final_y)
+        spot = clamp_inside(final_x, final_y)
+        if key:
+            cache.store_placement(key, name, spot)
+        return spot
 
     except Exception:
         return clamp_inside(PADDING, PADDING)
 
+# --- Batch placement -------------------------------------------------------
+
+def candidate_grid(scorer, small_size, screen_w, screen_h, widget_w, widget_h):
+    """
+    Window energies for one widget size as a float array over the valid
+    top-left corners, plus the (x, y) offset of element [0, 0].
+    """
+    bounds = search_bounds(*small_size, screen_w, screen_h, widget_w, widget_h)
+    w_scaled, h_scaled, min_x_s, max_x_s, min_y_s, max_y_s = bounds
+    if max_x_s < min_x_s or max_y_s < min_y_s or w_scaled < 1 or h_scaled < 1:
+        return None, (min_x_s, min_y_s)
+
+    grid = scorer.grid(w_scaled, h_scaled)[min_y_s:max_y_s + 1, min_x_s:max_x_s + 1]
+    return grid.astype(np.float64), (min_x_s, min_y_s)
+
+def footprint(widget_w, widget_h):
+    """Widget size in scaled pixels, rounded up so masks never undershoot."""
+    return math.ceil(widget_w * SCALE), math.ceil(widget_h * SCALE)
+
+def mask_overlaps(grid, origin, size, placed):
+    """Set every corner whose window would touch an already placed rect to inf."""
+    gap = math.ceil(PADDING * SCALE)
+    w, h = size
+    ox, oy = origin
+    for px, py, pw, ph in placed:
+        x0 = max(px - w - gap + 1 - ox, 0)
+        x1 = max(px + pw + gap - ox, 0)
+        y0 = max(py - h - gap + 1 - oy, 0)
+        y1 = max(py + ph + gap - oy, 0)
+        grid[y0:y1, x0:x1] = np.inf
+
+def overlaps(a, b):
+    gap = math.ceil(PADDING * SCALE)
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    return ax < bx + bw + gap and bx < ax + aw + gap and ay < by + bh + gap and by < ay + ah + gap
+
+def top_candidates(grid, origin, size, k):
+    """
+    Up to k lowest-energy corners, suppressing neighbours closer than the
+    widget itself so the candidates are genuinely different spots.
+    """
+    grid = grid.copy()
+    found = []
+    while len(found) < k:
+        idx = int(np.argmin(grid))
+        y, x = divmod(idx, grid.shape[1])
+        energy = grid[y, x]
+        if not np.isfinite(energy):
+            break
+        found.append((float(energy), origin[0] + x, origin[1] + y))
+        w, h = size
+        grid[max(y - h + 1, 0):y + h, max(x - w + 1, 0):x + w] = np.inf
+    return found
+
+# place_optimal tries up to 8 ** 4 combinations at this size
+MAX_OPTIMAL_WIDGETS = 4
+
+def place_greedy(scorer, small_size, screen_w, screen_h, widgets):
+    """Largest widget first, each into the quietest spot left free by the others."""
+    placed = {}
+    taken = []
+    order = sorted(widgets, key=lambda wd: wd["width"] * wd["height"], reverse=True)
+    for wd in order:
+        grid, origin = candidate_grid(scorer, small_size, screen_w, screen_h, wd["width"], wd["height"])
+        size = footprint(wd["width"], wd["height"])
+        if grid is not None:
+            mask_overlaps(grid, origin, size, taken)
+            idx = int(np.argmin(grid))
+            y, x = divmod(idx, grid.shape[1])
+            if np.isfinite(grid[y, x]):
+                best = (origin[0] + x, origin[1] + y)
+                taken.append((*best, *size))
+                placed[wd["id"]] = best
+                continue
+        placed[wd["id"]] = None
+    return placed
+
+def place_optimal(scorer, small_size, screen_w, screen_h, widgets, k=8):
+    """
+    Lowest total energy over every non-overlapping combination of each
+    widget's k best spots. Exhaustive in k ** len(widgets), so above
+    MAX_OPTIMAL_WIDGETS it leaves the batch to greedy; also falls back to
+    greedy when no combination fits.
+    """
+    if len(widgets) > MAX_OPTIMAL_WIDGETS:
+        return place_greedy(scorer, small_size, screen_w, screen_h, widgets)
+    options = []
+    for wd in widgets:
+        grid, origin = candidate_grid(scorer, small_size, screen_w, screen_h, wd["width"], wd["height"])
+        size = footprint(wd["width"], wd["height"])
+        cands = top_candidates(grid, origin, size, k) if grid is not None else []
+        options.append([(e, (x, y, *size)) for e, x, y in cands])
+
+    best_total = float('inf')
+    best_combo = None
+    for combo in itertools.product(*options):
+        total = sum(e for e, _ in combo)
+        if total >= best_total:
+            continue
+        rects = [r for _, r in combo]
+        if any(overlaps(a, b) for a, b in itertools.combinations(rects, 2)):
+            continue
+        best_total = total
+        best_combo = rects
+
+    if best_combo is None:
+        return place_greedy(scorer, small_size, screen_w, screen_h, widgets)
+    return {wd["id"]: rect[:2] for wd, rect in zip(widgets, best_combo)}
+
+def free_slot(screen_w, screen_h, widget_w, widget_h, taken):
+    """
+    First corner in reading order on the scaled grid where a widget fits
+    inside the padded screen without touching any rect in taken, which it
+    is added to. None when there is no such corner.
+    """
+    size = footprint(widget_w, widget_h)
+    low = math.ceil(PADDING * SCALE)
+    max_x = int((screen_w - widget_w - PADDING) * SCALE)
+    max_y = int((screen_h - widget_h - PADDING) * SCALE)
+    for y in range(low, max_y + 1):
+        for x in range(low, max_x + 1):
+            rect = (x, y, *size)
+            if not any(overlaps(rect, other) for other in taken):
+                taken.append(rect)
+                return x, y
+    return None
+
+STRATEGIES = {
+    "greedy": place_greedy,
+    "optimal": place_optimal,
+}
+
+def place_batch(wallpaper_path, monitors, widgets, strategy="greedy", cache=None, weights=None):
+    """
+    Place every widget on every monitor from a single decode of the
+    wallpaper. Scorers are shared between monitors of the same size,
+    and with a cache the wallpaper is only decoded for sizes it lacks.
+
+    monitors: [{"name", "width", "height"}, ...] (hyprctl monitors -j works as is)
+    widgets:  [{"id", "width", "height", optional "monitors": [names]}, ...]
+
+    Returns {monitor name: {widget id: [x, y] or None}}. Widgets that get
+    no spot from the strategy (no NumPy, no wallpaper, no room left among
+    the quiet spots) take the first free slot in reading order, see
+    free_slot(); when there is none either they get None rather than a
+    spot on top of another widget.
+    """
+    exists = os.path.exists(wallpaper_path)
+    key = cache.key_for(wallpaper_path) if cache and exists else None
+    weights = weights or DEFAULT_WEIGHTS
+    spec = [[(m["name"], int(m["width"]), int(m["height"])) for m in monitors], widgets, strategy, DECODE]
+    if weights != DEFAULT_WEIGHTS:
+        spec.append(weights_tag(weights))
+    name = "batch/" + hashlib.sha1(json.dumps(spec, sort_keys=True).encode()).hexdigest()
+    if key:
+        result = cache.load_placement(key, name)
+        if result is not None:
+            return result
+
+    decoded = []
+
+    def open_image():
+        if not decoded:
+            # draft for the largest monitor, the smaller ones resize from that
+            largest = max(monitors, key=lambda m: int(m["width"]) * int(m["height"]))
+            img = open_wallpaper(wallpaper_path, int(largest["width"]), int(largest["height"]))
+            img.load()
+            decoded.append(img)
+        return decoded[0]
+
+    scorers = {}
+    result = {}
+    for mon in monitors:
+        screen_w = int(mon["width"])
+        screen_h = int(mon["height"])
+        mine = [wd for wd in widgets if "monitors" not in wd or mon["name"] in wd["monitors"]]
+
+        placed = {}
+        if exists and np is not None:
+            geometry = (screen_w, screen_h)
+            try:
+                if geometry not in scorers:
+                    scorers[geometry] = load_scorer(open_image, screen_w, screen_h, weights, cache, key)
+                scorer, small_size = scorers[geometry]
+                placed = STRATEGIES[strategy](scorer, small_size, screen_w, screen_h, mine)
+            except Exception:
+                placed = {}
+
+        taken = [(*placed[wd["id"]], *footprint(wd["width"], wd["height"]))
+                 for wd in mine if placed.get(wd["id"]) is not None]
+        for wd in mine:
+            if placed.get(wd["id"]) is None:
+                placed[wd["id"]] = free_slot(screen_w, screen_h, wd["width"], wd["height"], taken)
+
+        out = {}
+        for wd in mine:
+            spot = placed.get(wd["id"])
+            if spot is None:
+                out[wd["id"]] = None
+                continue
+            x, y = int(spot[0] / SCALE), int(spot[1] / SCALE)
+            out[wd["id"]] = list(clamp_inside(x, y, screen_w, screen_h, wd["width"], wd["height"]))
+        result[mon["name"]] = out
+
+    if key:
+        cache.store_placement(key, name, result)
+    return result
+
+def bench(wallpaper_path, runs=20):
+    """Time each engine on one edge map and check SAT against the exhaustive loop."""
+    small_edges = load_edges(wallpaper_path, SCREEN_W, SCREEN_H)
+    bounds = search_bounds(*small_edges.size, SCREEN_W, SCREEN_H, WIDGET_SIZE, WIDGET_SIZE)
+
+    print(f"screen {SCREEN_W}x{SCREEN_H}, grid {small_edges.size[0]}x{small_edges.size[1]}")
+    for name in ENGINES:
+        if resolve_engine(name) != name:
+            print(f"{name:>10}: unavailable (numpy missing)")
+            continue
+        start = time.perf_counter()
+        for _ in range(runs):
+            result = ENGINES[name](small_edges, bounds)
+        ms = (time.perf_counter() - start) * 1000 / runs
+        print(f"{name:>10}: {ms:8.3f} ms  -> {result}")
+
+    if np is not None:
+        exhaustive = score_reference(small_edges, bounds, step=1, sample=1)
+        fast = score_sat(small_edges, bounds)
+        status = "match" if exhaustive == fast else "MISMATCH"
+        print(f"exhaustive reference {exhaustive} vs sat {fast}: {status}")
+
+
+# --- Daemon ----------------------------------------------------------------
+
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+
+def inotify_events(directory, mask=IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE):
+    """Yield the names of files in directory as inotify reports them (Linux only)."""
+    libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    fd = libc.inotify_init1(os.O_CLOEXEC)
+    if fd < 0:
+        raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+    try:
+        if libc.inotify_add_watch(fd, os.fsencode(directory), mask) < 0:
+            raise OSError(ctypes.get_errno(), f"cannot watch {directory}")
+        while True:
+            buf = os.read(fd, 64 * 1024)
+            off = 0
+            while off < len(buf):
+                _, _, _, length = struct.unpack_from("iIII", buf, off)
+                name = buf[off + 16:off + 16 + length].rstrip(b"\0")
+                off += 16 + length
+                yield os.fsdecode(name)
+    finally:
+        os.close(fd)
+
+def poll_events(path, interval=1.0):
+    """Fallback for inotify_events: yield the file name whenever its mtime changes."""
+    last = None
+    while True:
+        try:
+            stamp = os.stat(path).st_mtime_ns
+        except OSError:
+            stamp = None
+        if stamp != last:
+            last = stamp
+            yield os.path.basename(path)
+        time.sleep(interval)
+
+def daemon(path_file, engine="sat", cache=None, spec=None, strategy="greedy", weights=None):
+    """
+    Stay resident and print a placement line every time path_file changes:
+    "x y" for the single widget, or the --batch JSON on one line. PIL,
+    NumPy and the cache stay loaded between wallpapers.
+    """
+    last = None
+
+    def update():
+        nonlocal last
+        try:
+            with open(path_file) as f:
+                wp_path = f.read().strip()
+        except OSError:
+            return
+        if spec:
+            line = json.dumps(place_batch(wp_path, spec["monitors"], spec["widgets"], strategy, cache, weights))
+        else:
+            x, y = find_best_spot(wp_path, engine=engine, cache=cache, weights=weights)
+            line = f"{x} {y}"
+        # one wallpaper change can arrive as several events
+        if (wp_path, line) != last:
+            last = (wp_path, line)
+            print(line, flush=True)
+
+    name = os.path.basename(path_file)
+    try:
+        events = inotify_events(os.path.dirname(path_file))
+        update()
+        for changed in events:
+            if changed == name:
+                update()
+    except OSError:
+        for _ in poll_events(path_file):
+            update()
+
+
+# --- Benchmarks ------------------------------------------------------------
+
+BENCH_FORMATS = {
+    "JPEG": ".jpg",
+    "PNG": ".png",
+    "WEBP": ".webp",
+}
+
+def decode_probe(wallpaper_path):
+    """Decode + edge map once and print "<ms> <peak RSS KiB>" (child side of bench_decode)."""
+    start = time.perf_counter()
+    load_edges(wallpaper_path, SCREEN_W, SCREEN_H)
+    ms = (time.perf_counter() - start) * 1000
+
+    # ru_maxrss survives exec on Linux and would report the parent's peak,
+    # VmHWM belongs to this process image only
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    peak = int(line.split()[1])
+    except OSError:
+        pass
+    print(f"{ms:.3f} {peak}")
+
+def bench_decode(wallpaper_path):
+    """
+    Wall time and peak RSS of decode + edge map per source format and
+    decode mode. Each run is a fresh child process so ru_maxrss is its own.
+    """
+    src = Image.open(wallpaper_path).convert("RGB")
+    print(f"source {src.size[0]}x{src.size[1]} -> screen {SCREEN_W}x{SCREEN_H}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt, ext in BENCH_FORMATS.items():
+            path = os.path.join(tmp, "wall" + ext)
+            src.save(path, fmt)
+            for mode in ("full", "fast"):
+                cmd = [sys.executable, os.path.abspath(__file__), str(SCREEN_W), str(SCREEN_H),
+                       "--decode", mode, "--decode-probe", path]
+                ms, rss = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout.split()
+                print(f"{fmt:>5} {mode:>4}: {float(ms):8.1f} ms  peak RSS {int(rss) / 1024:7.1f} MiB")
+
+def bench_backends(wallpaper_path, runs=10, screens=((1920, 1080), (2560, 1440), (3840, 2160))):
+    """
+    Cost of each scoring backend per screen megapixel, building its
+    analysis map from the decoded wallpaper included.
+    """
+    img = Image.open(wallpaper_path)
+    img.load()
+    w_scaled = h_scaled = int(WIDGET_SIZE * SCALE)
+    for screen_w, screen_h in screens:
+        mp = screen_w * screen_h / 1e6
+        small_w, small_h = int(screen_w * SCALE), int(screen_h * SCALE)
+        print(f"screen {screen_w}x{screen_h} ({mp:.1f} MP), grid {small_w}x{small_h}")
+        for name, (backend, kind) in BACKENDS.items():
+            start = time.perf_counter()
+            for _ in range(runs):
+                maps = {kind: np.asarray(MAPS[kind](img, screen_w, screen_h), dtype=np.float64)}
+                backend(maps)(w_scaled, h_scaled)
+            ms = (time.perf_counter() - start) * 1000 / runs
+            print(f"{name:>10}: {ms:8.3f} ms  {ms / mp:8.3f} ms/MP")
+
 
 if __name__ == "__main__":
-    if len(sys.argv) >= 3:
+    parser = argparse.ArgumentParser(description="Find a quiet spot on the wallpaper for the clock widget")
+    parser.add_argument("width", nargs="?", default=None)
+    parser.add_argument("height", nargs="?", default=None)
+    parser.add_argument("--engine", choices=sorted(ENGINES), default="sat")
+    parser.add_argument("--bench", action="store_true", help="time the scoring engines instead of printing a position")
+    parser.add_argument("--batch", metavar="SPEC",
+                        help='JSON file ("-" for stdin) with "monitors" and "widgets" lists; prints placements as JSON')
+    parser.add_argument("--strategy", choices=sorted(STRATEGIES), default="greedy")
+    parser.add_argument("--no-cache", action="store_true", help="skip the on-disk edge map / placement cache")
+    parser.add_argument("--decode", choices=["fast", "full"], default=DECODE,
+                        help="fast decodes straight to the analysis grid (JPEG draft, Image.reduce)")
+    parser.add_argument("--wallpaper", help="use this image instead of the one in caelestia's path.txt")
+    parser.add_argument("--bench-decode", action="store_true",
+                        help="report decode time and peak RSS per image format")
+    parser.add_argument("--decode-probe", metavar="PATH", help=argparse.SUPPRESS)
+    parser.add_argument("--weights", type=parse_weights, default=None,
+                        help=f"mix scoring backends, e.g. edges=1,saliency=0.5 ({', '.join(BACKENDS)})")
+    parser.add_argument("--bench-backends", action="store_true",
+                        help="time each scoring backend per screen megapixel")
+    parser.add_argument("--daemon", action="store_true",
+                        help="stay running, watch path.txt and print a new placement line on every change")
+    args = parser.parse_args()
+    DECODE = args.decode
+
+    if (args.batch or args.weights or args.bench_backends) and np is None:
+        parser.error("--batch, --weights and --bench-backends need numpy")
+
+    if args.width is not None and args.height is not None:
         try:
-            SCREEN_W = int(float(sys.argv[1]))
-            SCREEN_H = int(float(sys.argv[2]))
-        except:
+            SCREEN_W = int(float(args.width))
+            SCREEN_H = int(float(args.height))
+        except ValueError:
             pass
 
-    path_file = "/home/jay/.local/state/caelestia/wallpaper/path.txt"
+    if args.decode_probe:
+        decode_probe(args.decode_probe)
+        sys.exit(0)
 
-    if os.path.exists(path_file):
+    path_file = PATH_FILE
+    cache = None if args.no_cache else PlacementCache()
+
+    spec = None
+    if args.batch:
+        with (sys.stdin if args.batch == "-" else open(args.batch)) as f:
+            spec = json.load(f)
+
+    if args.daemon:
+        try:
+            daemon(path_file, args.engine, cache, spec, args.strategy, args.weights)
+        except (KeyboardInterrupt, BrokenPipeError):
+            pass
+        sys.exit(0)
+
+    if args.wallpaper:
+        wp_path = args.wallpaper
+    elif os.path.exists(path_file):
         wp_path = open(path_file).read().strip()
-        x, y = find_best_spot(wp_path)
+    else:
+        wp_path = ""
+
+    if wp_path and args.bench:
+        bench(wp_path)
+        sys.exit(0)
+    if wp_path and args.bench_decode:
+        bench_decode(wp_path)
+        sys.exit(0)
+    if wp_path and args.bench_backends:
+        bench_backends(wp_path)
+        sys.exit(0)
+
+    if spec:
+        placements = place_batch(wp_path, spec["monitors"], spec["widgets"], args.strategy, cache, args.weights)
+        print(json.dumps(placements))
+    elif wp_path:
+        x, y = find_best_spot(wp_path, engine=args.engine, cache=cache, weights=args.weights)
         print(x, y)
     else:
         print(PADDING, PADDING)
@@ -36,15 +36,13 @@ PanelWindow {
         running: true 
         
         // Complex command to:
-        // 1. Define extractor function to print "BG FG X Y"
+        // 1. Define extractor function to print "BG FG"
         // 2. Watch directory
         command: ["sh", "-c", "
             extract() { 
                 bg=$(grep '^\\$background =' /home/jay/.config/hypr/scheme/current.conf | cut -d'=' -f2 | tr -d ' ')
                 fg=$(grep '^\\$primary =' /home/jay/.config/hypr/scheme/current.conf | cut -d'=' -f2 | tr -d ' ')
-                res=$(hyprctl monitors -j | jq -r '.[0] | \"\\(.width) \\(.height)\"')
-                coords=$(python3 /home/jay/tmptasks/experiment/newsomething/auto_position.py $res)
-                echo \"$bg $fg $coords\"
+                echo \"$bg $fg\"
             }
             extract
             inotifywait -m -e close_write -q --format '%f' /home/jay/.config/hypr/scheme/ | while read -r file; do
@@ -55,23 +53,43 @@ PanelWindow {
         stdout: SplitParser {
             onRead: function(data) {
                 var parts = data.trim().split(" ")
-                if (parts.length >= 4) {
+                if (parts.length >= 2) {
                     var bg = parts[0].trim()
                     var fg = parts[1].trim()
-                    var x = parseInt(parts[2])
-                    var y = parseInt(parts[3])
                     
                     if (bg.length === 6) bgColor = "#" + bg
                     if (fg.length === 6) textColor = "#" + fg
                     
-                    // Update position automatically
-                    if (!isNaN(x) && !isNaN(y)) {
-                        clockContainer.x = x
-                        clockContainer.y = y
-                    }
-                    
-                    console.log("Update: BG=" + bgColor + " FG=" + textColor + " Pos=" + x + "," + y)
+                    console.log("Update: BG=" + bgColor + " FG=" + textColor)
+                }
+            }
+        }
+    }
+
+    Process {
+        id: positionWatcher
+        // auto_position.py stays resident, watches the caelestia wallpaper
+        // path.txt itself and prints "X Y" whenever the wallpaper changes
+        running: true
+
+        command: ["sh", "-c", "
+            res=$(hyprctl monitors -j | jq -r '.[0] | \"\\(.width) \\(.height)\"')
+            exec python3 /home/jay/tmptasks/experiment/newsomething/auto_position.py --daemon $res
+        "]
+
+        stdout: SplitParser {
+            onRead: function(data) {
+                var parts = data.trim().split(" ")
+                var x = parseInt(parts[0])
+                var y = parseInt(parts[1])
+
+                // Update position automatically
+                if (!isNaN(x) && !isNaN(y)) {
+                    clockContainer.x = x
+                    clockContainer.y = y
                 }
+
+                console.log("Update: Pos=" + x + "," + y)
             }
         }
     }
@@ -0,0 +1,75 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+from PIL import Image
+
+import auto_position as ap
+
+
+def random_map(rng, width, height):
+    return Image.fromarray(rng.integers(0, 256, (height, width), dtype=np.uint8))
+
+
+@pytest.mark.parametrize("screen", [(1920, 1080), (2560, 1440), (1080, 1920), (1366, 768)])
+@pytest.mark.parametrize("widget", [(300, 300), (120, 80), (640, 200)])
+def test_sat_matches_exhaustive_reference(screen, widget):
+    rng = np.random.default_rng(hash((screen, widget)) & 0xFFFFFFFF)
+    screen_w, screen_h = screen
+    small = random_map(rng, int(screen_w * ap.SCALE), int(screen_h * ap.SCALE))
+    bounds = ap.search_bounds(*small.size, screen_w, screen_h, *widget)
+    assert ap.score_sat(small, bounds) == ap.score_reference(small, bounds, step=1, sample=1)
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("corner", ["top-left", "top-right", "bottom-left", "bottom-right"])
+def test_sat_matches_reference_on_edge_touching_windows(seed, corner):
+    rng = np.random.default_rng(seed)
+    width, height = rng.integers(20, 60), rng.integers(20, 60)
+    w, h = rng.integers(1, width // 2), rng.integers(1, height // 2)
+    arr = rng.integers(1, 256, (height, width), dtype=np.uint8)
+    # the quietest window sits flush against the map border
+    x = 0 if corner.endswith("left") else width - w
+    y = 0 if corner.startswith("top") else height - h
+    arr[y:y + h, x:x + w] = 0
+    small = Image.fromarray(arr)
+    bounds = (w, h, 0, width - w, 0, height - h)
+
+    expected = ap.score_reference(small, bounds, step=1, sample=1)
+    assert expected == (0, x, y)
+    assert ap.score_sat(small, bounds) == expected
+
+
+def test_sat_without_room_matches_reference():
+    small = random_map(np.random.default_rng(0), 10, 10)
+    bounds = ap.search_bounds(10, 10, 100, 100, 300, 300)
+    assert ap.score_sat(small, bounds) == ap.score_reference(small, bounds)
+
+
+@pytest.mark.parametrize("text", ["edges=0", "edges=0,saliency=0"])
+def test_parse_weights_rejects_all_zero(text):
+    with pytest.raises(ap.argparse.ArgumentTypeError):
+        ap.parse_weights(text)
+
+
+def test_place_batch_leaves_unplaceable_widgets_out(tmp_path):
+    wallpaper = tmp_path / "wp.png"
+    random_map(np.random.default_rng(1), 400, 240).save(wallpaper)
+    monitors = [{"name": "DP-1", "width": 2560, "height": 1440},
+                {"name": "HDMI-A-1", "width": 1920, "height": 1080}]
+    widgets = [{"id": "clock", "width": 300, "height": 300},
+               {"id": "media", "width": 600, "height": 200},
+               {"id": "big", "width": 1800, "height": 900, "monitors": ["HDMI-A-1"]}]
+    result = ap.place_batch(str(wallpaper), monitors, widgets)
+    assert result["HDMI-A-1"]["clock"] is None
+    assert result["HDMI-A-1"]["media"] is None
+    assert result["HDMI-A-1"]["big"] is not None
+    assert None not in result["DP-1"].values()
+
+
+def test_place_optimal_hands_large_batches_to_greedy(monkeypatch):
+    small = random_map(np.random.default_rng(2), 192, 108)
+    scorer, _ = ap.load_scorer(lambda: small, 1920, 1080, ap.DEFAULT_WEIGHTS, None, None)
+    widgets = [{"id": str(i), "width": 120, "height": 80} for i in range(ap.MAX_OPTIMAL_WIDGETS + 1)]
+    monkeypatch.setattr(ap.itertools, "product", None)
+    placed = ap.place_optimal(scorer, small.size, 1920, 1080, widgets)
+    assert placed == ap.place_greedy(scorer, small.size, 1920, 1080, widgets)
@@ -0,0 +1,300 @@
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+### BEGIN LICENSE
+# Copyright (c) 2025
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License version 3, as published
+# by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranties of
+# MERCHANTABILITY, SATISFACTORY QUALITY, or FITNESS FOR A PARTICULAR
+# PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+### END LICENSE
+
+"""
+Asyncio fetch engine for the plugins in this folder.
+
+Variety calls fill_queue synchronously, one source at a time. This engine
+runs an event loop on a background thread, so a downloader can hand it a
+whole batch of requests (the first listing page of every Reddit source,
+all preview thumbnails of a page) and block once for all of them. Requests
+run concurrently with a cap per host and in total; Reddit requests still
+go through the shared RedditRateLimiter exactly once, here for httpx and
+aiohttp and in the session pool's adapter for the threads backend, at the
+priority set in their headers (RedditRateLimiter.priority_headers).
+
+Uses httpx or aiohttp when one of them is installed, otherwise the shared
+HttpSessionPool on a thread pool behind the same interface.
+
+Settings ([async] in ~/.config/variety/pluginconfig/plugins.conf):
+    backend          auto, httpx, aiohttp or threads
+    per_host         concurrent requests per host
+    max_connections  concurrent requests in total
+
+Run this file with --bench to compare the backends with sequential
+requests against a local stand-in server.
+"""
+
+import asyncio
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+
+try:
+    from HttpSessionPool import DEFAULTS as HTTP_DEFAULTS
+    from HttpSessionPool import USER_AGENT, get_shared_pool
+    from PluginConfig import get_settings
+    from RedditRateLimiter import get_reddit_limiter, is_reddit_host, pop_priority
+except ImportError:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from HttpSessionPool import DEFAULTS as HTTP_DEFAULTS
+    from HttpSessionPool import USER_AGENT, get_shared_pool
+    from PluginConfig import get_settings
+    from RedditRateLimiter import get_reddit_limiter, is_reddit_host, pop_priority
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+logger = logging.getLogger("variety")
+
+DEFAULTS = {
+    "backend": "auto",
+    "per_host": 8,
+    "max_connections": 16,
+}
+
+
+class FetchResult:
+    """A finished response, shaped like the parts of requests.Response the plugins use."""
+
+    def __init__(self, url, status_code, headers, content):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    @property
+    def text(self):
+        charset = self.headers.get("Content-Type", "").partition("charset=")[2].split(";")[0].strip(' "')
+        try:
+            return self.content.decode(charset or "utf-8", errors="replace")
+        except LookupError:
+            return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} for {self.url}")
+
+
+class AsyncFetcher:
+    """
+    Event loop on a background thread with per-host concurrency caps. The
+    public methods are synchronous and thread safe.
+    """
+
+    def __init__(self, backend="auto", per_host=8, max_connections=16, connect_timeout=5.0, read_timeout=30.0):
+        if backend == "auto":
+            backend = "httpx" if httpx else "aiohttp" if aiohttp else "threads"
+        if (backend == "httpx" and not httpx) or (backend == "aiohttp" and not aiohttp):
+            logger.warning(lambda: f"{backend} is not installed, fetching on threads")
+            backend = "threads"
+        self.backend = backend
+        self.per_host = per_host
+        self.max_connections = max_connections
+        self.timeout = (connect_timeout, read_timeout)
+
+        self._executor = ThreadPoolExecutor(max_workers=max_connections, thread_name_prefix="plugin-fetch")
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="plugin-async-fetch", daemon=True)
+        self._thread.start()
+        # Created on the loop on first use
+        self._client = None
+        self._limit = None
+        self._host_limits = {}
+        logger.info(lambda: f"Async fetch engine using {self.backend}")
+
+    def submit(self, url, headers=None, cookies=None):
+        """Start fetching url and return a concurrent.futures.Future of its FetchResult."""
+        if cookies is not None and not isinstance(cookies, dict):
+            cookies = requests.utils.dict_from_cookiejar(cookies)
+        return asyncio.run_coroutine_threadsafe(self._fetch(url, dict(headers or {}), cookies), self._loop)
+
+    def fetch(self, url, headers=None, cookies=None):
+        """Fetch one URL and return its FetchResult."""
+        return self.submit(url, headers, cookies).result()
+
+    def fetch_many(self, requests_):
+        """
+        Fetch several URLs concurrently.
+
+        Args:
+            requests_: URLs, or (url, headers, cookies) tuples
+
+        Returns:
+            list of FetchResult, or the exception raised for that request,
+            in the order of requests_
+        """
+        futures = [self.submit(*((request,) if isinstance(request, str) else request)) for request in requests_]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append(e)
+        return results
+
+    async def _fetch(self, url, headers, cookies):
+        if self._limit is None:
+            self._limit = asyncio.Semaphore(self.max_connections)
+        host = urlparse(url).netloc.lower()
+        host_limit = self._host_limits.get(host)
+        if host_limit is None:
+            host_limit = self._host_limits[host] = asyncio.Semaphore(self.per_host)
+        headers.setdefault("User-Agent", USER_AGENT)
+
+        async with self._limit, host_limit:
+            if not is_reddit_host(host) or self.backend == "threads":
+                # The shared pool's RateLimitedAdapter already paces and retries Reddit
+                # requests, and takes their priority header off
+                return await self._send(url, headers, cookies)
+
+            limiter, settings = get_reddit_limiter()
+            priority = pop_priority(headers)
+            for attempt in range(settings["throttle_retries"] + 1):
+                await self._loop.run_in_executor(self._executor, limiter.acquire, priority)
+                result = await self._send(url, headers, cookies)
+                limiter.observe(result)
+                if result.status_code != 429:
+                    break
+            return result
+
+    async def _send(self, url, headers, cookies):
+        if self.backend == "httpx":
+            if self._client is None:
+                self._client = httpx.AsyncClient(
+                    timeout=httpx.Timeout(self.timeout[1], connect=self.timeout[0]),
+                    limits=httpx.Limits(max_connections=self.max_connections),
+                    transport=httpx.AsyncHTTPTransport(retries=2),
+                    follow_redirects=True,
+                )
+            r = await self._client.get(url, headers=headers, cookies=cookies)
+            return FetchResult(str(r.url), r.status_code, r.headers, r.content)
+
+        if self.backend == "aiohttp":
+            if self._client is None:
+                self._client = aiohttp.ClientSession(
+                    timeout=aiohttp.ClientTimeout(sock_connect=self.timeout[0], sock_read=self.timeout[1]),
+                    connector=aiohttp.TCPConnector(limit=self.max_connections),
+                )
+            async with self._client.get(url, headers=headers, cookies=cookies) as r:
+                return FetchResult(str(r.url), r.status, r.headers, await r.read())
+
+        get = functools.partial(get_shared_pool().get, url, headers=headers, cookies=cookies)
+        r = await self._loop.run_in_executor(self._executor, get)
+        return FetchResult(r.url, r.status_code, r.headers, r.content)
+
+    def close(self):
+        async def close_client():
+            if self.backend == "httpx" and self._client is not None:
+                await self._client.aclose()
+            elif self.backend == "aiohttp" and self._client is not None:
+                await self._client.close()
+
+        asyncio.run_coroutine_threadsafe(close_client(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._executor.shutdown(wait=False)
+
+
+_fetcher = None
+_fetcher_lock = threading.Lock()
+
+
+def get_fetcher():
+    """The process-wide fetch engine, configured from plugins.conf on first use."""
+    global _fetcher
+    with _fetcher_lock:
+        if _fetcher is None:
+            http = get_settings("http", HTTP_DEFAULTS)
+            _fetcher = AsyncFetcher(
+                connect_timeout=http["connect_timeout"], read_timeout=http["read_timeout"], **get_settings("async", DEFAULTS)
+            )
+        return _fetcher
+
+
+def bench(sources=20, pages=3, latency=0.1, per_host=4):
+    """Fetch sources x pages URLs from a local server with the given latency, sequentially and per backend."""
+    import time
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    body = json.dumps({"data": {"children": [], "after": None}}).encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    # Several stand-in hosts, like reddit.com and the image CDNs
+    servers = [ThreadingHTTPServer(("127.0.0.1", 0), Handler) for _ in range(4)]
+    for server in servers:
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    hosts = [f"127.0.0.1:{server.server_port}" for server in servers]
+    urls = [f"http://{hosts[s % len(hosts)]}/r/source{s}.json?page={p}" for s in range(sources) for p in range(pages)]
+
+    print(f"{len(urls)} requests, {latency * 1000:.0f} ms server latency, {len(hosts)} hosts, {per_host} per host")
+    pool = get_shared_pool()
+    start = time.perf_counter()
+    for url in urls:
+        pool.get(url).raise_for_status()
+    print(f"{'sequential requests':<22}{time.perf_counter() - start:8.2f} s")
+
+    for backend in ("threads", "httpx", "aiohttp"):
+        if (backend == "httpx" and not httpx) or (backend == "aiohttp" and not aiohttp):
+            print(f"{backend:<22}{'not installed':>8}")
+            continue
+        fetcher = AsyncFetcher(backend=backend, per_host=per_host)
+        fetcher.fetch(urls[0])  # open the client outside the timing
+        start = time.perf_counter()
+        results = fetcher.fetch_many(urls)
+        elapsed = time.perf_counter() - start
+        failed = sum(1 for r in results if isinstance(r, Exception) or r.status_code != 200)
+        print(f"{backend:<22}{elapsed:8.2f} s{f'  {failed} failed' if failed else ''}")
+        fetcher.close()
+    for server in servers:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    if "--bench" in sys.argv:
+        bench()
+    else:
+        print(__doc__)
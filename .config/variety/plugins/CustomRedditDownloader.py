@@ -21,32 +21,269 @@ Handles downloading images from custom Reddit URLs.
 Used by CustomRedditSource.
 """
 
+import functools
+import json
 import logging
-import random
+import math
 import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import weakref
 import http.cookiejar
+from concurrent.futures import ThreadPoolExecutor
 
 from variety.plugins.downloaders.DefaultDownloader import DefaultDownloader
 from variety.Util import Util
 
+try:
+    from AsyncFetch import get_fetcher
+    from DownloadIndex import get_download_index
+    from HttpSessionPool import get_shared_pool
+    from PerceptualHash import dhash_bytes, get_hash_index
+    from PluginConfig import cache_dir, get_settings
+    from PrefetchQueue import download_with_prefetch
+    from QueueOrder import order_queue
+    from RedditFanIn import get_fan_in
+    from RedditListingCache import get_listing_cache
+    from RedditListingParser import CHUNK_SIZE, ListingStream
+    from RedditRateLimiter import PRIORITY_AUTH, PRIORITY_DEFAULT, get_reddit_limiter, priority_headers
+    from RedditTokenCache import get_token_cache
+except ImportError:
+    # Jumble loads plugin files by path in alphabetical order, so a helper
+    # that sorts later is not importable yet
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from AsyncFetch import get_fetcher
+    from DownloadIndex import get_download_index
+    from HttpSessionPool import get_shared_pool
+    from PerceptualHash import dhash_bytes, get_hash_index
+    from PluginConfig import cache_dir, get_settings
+    from PrefetchQueue import download_with_prefetch
+    from QueueOrder import order_queue
+    from RedditFanIn import get_fan_in
+    from RedditListingCache import get_listing_cache
+    from RedditListingParser import CHUNK_SIZE, ListingStream
+    from RedditRateLimiter import PRIORITY_AUTH, PRIORITY_DEFAULT, get_reddit_limiter, priority_headers
+    from RedditTokenCache import get_token_cache
+
 logger = logging.getLogger("variety")
 
+# Responses that mean the listing needs a logged-in user
+AUTH_STATUSES = (401, 403, 404)
+
+# source -> (credentials, cookies), shared by all downloaders of a source
+_auth_by_source = weakref.WeakKeyDictionary()
+_auth_lock = threading.Lock()
+
+# Last time every source's first listing page was prefetched
+_prefetched_at = 0
+_prefetch_lock = threading.Lock()
+
+POST_BATCH = 10  # posts handed to the queue at a time while a page streams in
+PAGE_LIMIT = 100  # posts per listing page, the limit every request asks for
+
+# [reddit] in plugins.conf
+LISTING_DEFAULTS = {
+    "max_pages": 5,  # Try up to 5 pages
+    "target_images": 20,  # Target number of images
+    "seed_cursors": True,  # Request later pages in parallel from the last refresh's cursors
+    "listing_cache": True,  # Keep listing pages on disk and revalidate them with ETag/Last-Modified
+    "listing_ttl": 300,  # Serve cached listing pages without a request for this many seconds
+    "fan_in": True,  # Fetch sources with the same sort order through combined multi-reddit requests
+    "stream_listings": True,  # Parse listing pages while they download and stop once there are enough images
+    "prefetch_sources": True,  # Fetch the first page of every Reddit source at once, into the listing cache
+    "size_threshold": 0.8,  # Skip images smaller than the screen times this (0 keeps all)
+    "aspect_tolerance": 0.5,  # Skip images whose aspect ratio is off the screen's by more than this fraction (0 keeps all)
+    "gallery_items": 3,  # Images taken from each gallery post (0 takes all)
+}
+
+_screen_sizes = None
+_screen_lock = threading.Lock()
+
+
+def screen_sizes():
+    """
+    Sizes wallpapers are shown at: (width, height) of every monitor, as
+    the monitor stands (rotated ones swapped). Asks Hyprland first, then
+    Variety for the primary display, and falls back to 1920x1080.
+    """
+    global _screen_sizes
+    with _screen_lock:
+        if _screen_sizes is None:
+            try:
+                out = subprocess.run(["hyprctl", "-j", "monitors"], capture_output=True, timeout=2, check=True).stdout
+                sizes = []
+                for monitor in json.loads(out):
+                    width, height = monitor["width"], monitor["height"]
+                    if monitor.get("transform", 0) % 2:
+                        # Rotated by 90 or 270 degrees
+                        width, height = height, width
+                    sizes.append((width, height))
+                if not sizes:
+                    raise ValueError("no monitors")
+                _screen_sizes = sizes
+            except Exception:
+                try:
+                    _screen_sizes = [tuple(Util.get_primary_display_size())]
+                except Exception:
+                    _screen_sizes = [(1920, 1080)]
+            logger.info(lambda: f"Filtering Reddit images for {', '.join(f'{w}x{h}' for w, h in _screen_sizes)} screens")
+        return _screen_sizes
+
+
+def _listing_variant(headers, cookies):
+    """Listing cache variant of a request with these credentials."""
+    return "auth" if cookies or "Authorization" in (headers or {}) else "anon"
+
+
+def _has_posts(data):
+    """Whether a listing (JSON or ListingStream) has any post."""
+    if isinstance(data, ListingStream):
+        return data.has_posts()
+    return bool(data.get("data", {}).get("children"))
+
+
+def _listing_after(data):
+    if isinstance(data, ListingStream):
+        return data.after
+    return data.get("data", {}).get("after")
+
+
+def _listing_posts(data):
+    """Post data dicts of a listing (JSON or ListingStream)."""
+    if isinstance(data, ListingStream):
+        return iter(data)
+    return (item.get("data", {}) for item in data.get("data", {}).get("children", []))
+
+
+def _close(data):
+    if isinstance(data, ListingStream):
+        data.close()
+
+
+def _discard(future):
+    """Close the listing of a page fetch whose result is not needed."""
+    if not future.cancelled() and future.exception() is None:
+        _close(future.result())
+
+
+def request_oauth_token(session_pool, username, password):
+    """
+    Request a new OAuth2 token from Reddit.
+
+    Module level, so the token cache's refresh timer holds the session
+    pool and the credentials, never a downloader.
+
+    Args:
+        session_pool: HttpSessionPool.SessionPool to post through
+
+    Returns:
+        Reddit's token JSON (access_token, expires_in, ...) or None
+    """
+    try:
+        # Reddit OAuth2 endpoint
+        auth_url = "https://www.reddit.com/api/v1/access_token"
+        
+        # Use a generic client ID (Reddit's official mobile app)
+        # This is publicly known and safe to use
+        client_id = "ohXpoqrZYub1kg"
+        
+        data = {
+            'grant_type': 'password',
+            'username': username,
+            'password': password
+        }
+        
+        headers = priority_headers(PRIORITY_AUTH, {
+            'User-Agent': 'Variety:CustomRedditDownloader:v1.0'
+        })
+        
+        # Basic auth with client_id (no secret for mobile app)
+        auth = (client_id, '')
+        
+        r = session_pool.post(auth_url, data=data, headers=headers, auth=auth)
+        r.raise_for_status()
+        
+        token_data = r.json()
+        if not token_data.get('access_token'):
+            logger.error(lambda: "No access token in response")
+            return None
+        return token_data
+            
+    except Exception:
+        logger.exception(lambda: "Failed to request OAuth2 token")
+        return None
+
+
+class ListingCursors:
+    """
+    Pagination cursors of the last refresh of each listing URL.
+
+    Kept on disk so the next refresh (also after a restart) can request
+    the later pages in parallel instead of waiting for each page's cursor.
+    """
+
+    def __init__(self, filename="cursors.json"):
+        self.filename = filename
+        self._cursors = None
+        self._lock = threading.Lock()
+
+    def _path(self):
+        return os.path.join(cache_dir("CustomRedditDownloader"), self.filename)
+
+    def _loaded(self):
+        if self._cursors is None:
+            try:
+                with open(self._path()) as f:
+                    self._cursors = json.load(f)
+            except (OSError, ValueError):
+                self._cursors = {}
+        return self._cursors
+
+    def get(self, url):
+        with self._lock:
+            return list(self._loaded().get(url, []))
+
+    def put(self, url, cursors):
+        with self._lock:
+            self._loaded()[url] = cursors
+            try:
+                fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self._path()), prefix=".cursors-")
+                with os.fdopen(fd, "w") as f:
+                    json.dump(self._cursors, f)
+                os.replace(tmp, self._path())
+            except OSError:
+                logger.exception(lambda: "Could not save the Reddit listing cursors")
+
+
+_cursor_store = ListingCursors()
+
 
 class CustomRedditDownloader(DefaultDownloader):
     """
     Downloads images from a custom Reddit URL (subreddit or multi-reddit).
     """
 
-    def __init__(self, source, url):
+    def __init__(self, source, url, session_pool=None, fetcher=None):
         """
         Initialize downloader with a Reddit URL.
         
         Args:
             source: The ImageSource instance
             url: Reddit URL (e.g., https://www.reddit.com/r/wallpaper/top/?t=month)
+            session_pool: HttpSessionPool.SessionPool to fetch through
+                (defaults to the shared pool)
+            fetcher: AsyncFetch.AsyncFetcher for batches of concurrent
+                requests (defaults to the shared one)
         """
         DefaultDownloader.__init__(self, source=source, config=url)
-        self.auth_headers, self.cookies = self._get_auth_headers()
+        self.http = session_pool or get_shared_pool()
+        self.fetcher = fetcher or get_fetcher()
+        # Switched to the OAuth2 token, see _fetch_listing
+        self.authenticated = False
+        get_fan_in().register(self)
 
     def _build_json_url(self, url):
         """
@@ -62,9 +299,9 @@ class CustomRedditDownloader(DefaultDownloader):
         # Add .json before query parameters
         if "?" in url:
             base, query = url.split("?", 1)
-            json_url = f"{base}.json?{query}&limit=100"
+            json_url = f"{base}.json?{query}&limit={PAGE_LIMIT}"
         else:
-            json_url = f"{url}.json?limit=100"
+            json_url = f"{url}.json?limit={PAGE_LIMIT}"
         
         return json_url
 
@@ -109,49 +346,18 @@ class CustomRedditDownloader(DefaultDownloader):
     def _get_oauth_token(self, username, password):
         """
         Get Reddit OAuth2 access token using username/password.
+
+        Tokens are shared through the process-wide RedditTokenCache, so
+        only the first downloader for a user (or a restart after the
+        token expired) does the token request.
         
         Returns:
             Access token string or None
         """
-        try:
-            import requests
-            
-            # Reddit OAuth2 endpoint
-            auth_url = "https://www.reddit.com/api/v1/access_token"
-            
-            # Use a generic client ID (Reddit's official mobile app)
-            # This is publicly known and safe to use
-            client_id = "ohXpoqrZYub1kg"
-            
-            data = {
-                'grant_type': 'password',
-                'username': username,
-                'password': password
-            }
-            
-            headers = {
-                'User-Agent': 'Variety:CustomRedditDownloader:v1.0'
-            }
-            
-            # Basic auth with client_id (no secret for mobile app)
-            auth = (client_id, '')
-            
-            r = requests.post(auth_url, data=data, headers=headers, auth=auth, timeout=30)
-            r.raise_for_status()
-            
-            token_data = r.json()
-            access_token = token_data.get('access_token')
-            
-            if access_token:
-                logger.info(lambda: "Successfully obtained OAuth2 access token")
-                return access_token
-            else:
-                logger.error(lambda: "No access token in response")
-                return None
-                
-        except Exception:
-            logger.exception(lambda: "Failed to get OAuth2 token")
-            return None
+        access_token = get_token_cache().get(username, functools.partial(request_oauth_token, self.http, username, password))
+        if not access_token:
+            logger.error(lambda: "Failed to get OAuth2 token")
+        return access_token
 
     def _load_cookies(self):
         """
@@ -194,174 +400,635 @@ class CustomRedditDownloader(DefaultDownloader):
             logger.exception(lambda: "Could not load Reddit cookies")
             return None
 
-    def _get_auth_headers(self):
+    def _get_auth_headers(self, oauth=True):
         """
         Get authentication headers for Reddit API.
         Tries OAuth2 first, then falls back to cookies.
-        
+
+        The token is taken from the token cache on every call, so a token
+        the cache refreshed in the background is used right away.
+
+        Args:
+            oauth: Use the OAuth2 token when credentials are configured
+
         Returns:
             tuple of (headers dict, cookies or None)
         """
         headers = {
             "User-Agent": "Mozilla/5.0 (X11; Linux x86_64; rv:120.0) Gecko/20100101 Firefox/120.0"
         }
-        
+        credentials, cookies = self._resolve_auth()
+
         # Try OAuth2 authentication first
-        credentials = self._load_credentials()
-        if credentials:
+        if oauth and credentials:
             token = self._get_oauth_token(credentials['username'], credentials['password'])
             if token:
                 # Use OAuth2 bearer token
                 headers['Authorization'] = f'Bearer {token}'
-                logger.info(lambda: "Using OAuth2 authentication")
                 return headers, None
-        
+
         # Fall back to cookies
-        cookies = self._load_cookies()
-        if cookies:
-            logger.info(lambda: "Using cookie authentication")
-            return headers, cookies
-        
-        # No authentication
-        logger.info(lambda: "No authentication configured (NSFW content may be blocked)")
-        return headers, None
+        return headers, cookies
 
-    def fill_queue(self):
+    def auth_variant(self):
         """
-        Fetch posts from Reddit and extract image URLs.
-        Returns list of (origin_url, image_url, extra_metadata) tuples.
-        Ensures at least 20 images are returned.
+        Listing cache variant ("anon" or "auth") of this downloader's requests.
+
+        Only looks at what is already known: a source whose credentials and
+        cookies were not read yet counts as anonymous until its own first
+        request reads them, and no token is requested here.
         """
-        logger.info(lambda: f"Custom Reddit URL: {self.config}")
+        with _auth_lock:
+            auth = _auth_by_source.get(self.source)
+        if auth is None:
+            return "anon"
+        credentials, cookies = auth
+        return "auth" if cookies or (credentials and self.authenticated) else "anon"
 
-        queue = []
-        after = None  # For pagination
-        max_attempts = 5  # Try up to 5 pages
-        target_images = 20  # Target number of images
+    def _resolve_auth(self):
+        """
+        Credentials and cookies of this downloader's source.
+
+        Read once per source and shared by all of its downloaders, so the
+        files are only touched on the first request of a source.
+
+        Returns:
+            tuple of (credentials dict or None, cookies or None)
+        """
+        with _auth_lock:
+            auth = _auth_by_source.get(self.source)
+            if auth is None:
+                auth = _auth_by_source[self.source] = (self._load_credentials(), self._load_cookies())
+                if auth[0]:
+                    logger.info(lambda: "Using OAuth2 authentication where anonymous requests get nothing")
+                elif auth[1]:
+                    logger.info(lambda: "Using cookie authentication")
+                else:
+                    logger.info(lambda: "No authentication configured (NSFW content may be blocked)")
+            return auth
+
+    def _fetch_listing(self, json_url, first_page=False, priority=PRIORITY_DEFAULT):
+        """
+        Fetch one page of the listing.
+
+        Cookies from cookies.txt go with every request that has no token,
+        as they always did. A token costs a token request, so with
+        credentials.conf the listing is fetched anonymously as long as
+        that works, and the token is only used once Reddit refuses the
+        anonymous request or the first page comes back empty (private,
+        quarantined or NSFW-only listings). A token Reddit rejects is
+        dropped from the token cache and the page is requested once more
+        with a new one. All of its requests go to the rate limiter with
+        the given priority.
+
+        Returns:
+            Listing JSON or a ListingStream
+        """
+        credentials = self._resolve_auth()[0]
+        headers, cookies = self._get_auth_headers(oauth=self.authenticated)
+        r, data = self._get(json_url, headers=headers, cookies=cookies, priority=priority)
+
+        if credentials and "Authorization" not in headers and r is not None:
+            # Nothing is escalated for a page fresh from the listing cache
+            refused = r.status_code in AUTH_STATUSES
+            if refused or (first_page and not _has_posts(data)):
+                oauth_headers, oauth_cookies = self._get_auth_headers()
+                if "Authorization" in oauth_headers:
+                    logger.info(lambda: f"Anonymous request for {json_url} got nothing, trying authentication")
+                    self.authenticated = True
+                    _close(data)
+                    headers, cookies = oauth_headers, oauth_cookies
+                    r, data = self._get(json_url, headers=headers, cookies=cookies, priority=priority)
+
+        if data is None and r.status_code == 401 and "Authorization" in headers:
+            logger.info(lambda: "Reddit rejected the OAuth2 token, requesting a new one")
+            get_token_cache().invalidate(credentials["username"], headers["Authorization"][len("Bearer ") :])
+            headers, cookies = self._get_auth_headers()
+            r, data = self._get(json_url, headers=headers, cookies=cookies, priority=priority)
+
+        if data is None:
+            r.raise_for_status()
+        return data
+
+    def _get(self, json_url, headers=None, cookies=None, priority=PRIORITY_DEFAULT):
+        """
+        GET one listing page through the listing cache.
+
+        A page fetched less than listing_ttl seconds ago is served from
+        disk, an older one is revalidated with a conditional request.
+
+        With stream_listings the page is not read here: a ListingStream
+        parses it while the caller consumes the posts, and the page is
+        cached once it has been read to the end, or as far as it was read
+        when the caller stops early.
+
+        Returns:
+            (response or None when served from the cache, listing JSON or
+            ListingStream, or None when Reddit refused the request with one
+            of AUTH_STATUSES)
+        """
+        settings = get_settings("reddit", LISTING_DEFAULTS)
+        cache = get_listing_cache(settings["listing_ttl"]) if settings["listing_cache"] else None
+        variant = _listing_variant(headers, cookies)
+
+        entry = cache.get(json_url, variant) if cache else None
+        if entry and cache.is_fresh(entry):
+            logger.info(lambda: f"Using cached listing for {json_url}")
+            return None, entry["listing"]
+
+        request_headers = priority_headers(priority, headers)
+        if entry:
+            request_headers.update(cache.conditional_headers(entry))
+        stream = settings["stream_listings"]
+        r = self.http.get(json_url, headers=request_headers, cookies=cookies, stream=stream)
+        if r.status_code == 304 and entry:
+            logger.info(lambda: f"Listing not modified: {json_url}")
+            r.close()
+            return r, cache.revalidated(json_url, variant, entry)
+        if r.status_code >= 400:
+            # A streamed response holds its pooled connection until closed
+            r.close()
+            if r.status_code in AUTH_STATUSES:
+                return r, None
+            r.raise_for_status()
+
+        if stream:
+            on_complete = (lambda listing: cache.store_listing(json_url, variant, r, listing)) if cache else None
+            return r, ListingStream(r.iter_content(CHUNK_SIZE), on_complete=on_complete, close=r.close)
+        data = r.json()
+        return r, cache.store(json_url, variant, r, data) if cache else data
+
+    def _page_url(self, listing_url, after=None):
+        """JSON URL of the listing page that starts after the given cursor."""
+        json_url = self._build_json_url(listing_url)
+        if after:
+            separator = '&' if '?' in json_url else '?'
+            json_url = f"{json_url}{separator}after={after}"
+        return json_url
+
+    def _fetch_page(self, listing_url, page, after):
+        """
+        Fetch and parse one listing page. Runs on the pipeline's worker threads.
+
+        Earlier pages get a higher priority with the rate limiter, so the
+        first pages of every source go out before anyone's later ones.
+        """
+        json_url = self._page_url(listing_url, after)
+        logger.info(lambda: f"Fetching from: {json_url} (page {page + 1})")
+        return self._fetch_listing(json_url, first_page=page == 0, priority=page)
+
+    def _queue_items(self, post):
+        """
+        Queue entries for one Reddit post.
+
+        Returns:
+            list of (origin_url, image_url, extra_metadata) tuples
+        """
+        items = []
+
+        # Get image URL
+        image_url = post.get("url_overridden_by_dest") or post.get("url")
+
+        if not image_url:
+            return items
+
+        # Handle different image sources
+        processed_urls = []
+        
+        # Direct image links
+        if image_url.lower().endswith((".jpg", ".jpeg", ".png", ".webp", ".gif")):
+            processed_urls.append(image_url)
         
+        # Imgur single image (convert to direct link)
+        elif "imgur.com" in image_url and not any(x in image_url for x in ['/a/', '/gallery/']):
+            # Convert imgur.com/abc123 to i.imgur.com/abc123.jpg
+            if not image_url.startswith("https://i.imgur.com"):
+                img_id = image_url.split('/')[-1].split('.')[0]
+                processed_urls.append(f"https://i.imgur.com/{img_id}.jpg")
+        
+        # Reddit gallery (first gallery_items images, or all)
+        elif "reddit.com/gallery/" in image_url:
+            # Try to get gallery images from post data
+            gallery_data = post.get("gallery_data", {})
+            media_metadata = post.get("media_metadata", {})
+            if gallery_data and media_metadata:
+                gallery_items = gallery_data.get("items", [])
+                limit = get_settings("reddit", LISTING_DEFAULTS)["gallery_items"]
+                for item_data in gallery_items[:limit] if limit > 0 else gallery_items:
+                    media_id = item_data.get("media_id")
+                    if media_id and media_id in media_metadata:
+                        img_data = media_metadata[media_id]
+                        if img_data.get("status") == "valid":
+                            img_url = self._gallery_rendition(img_data)[0]
+                            if img_url:
+                                processed_urls.append(img_url)
+        
+        # i.redd.it images
+        elif "i.redd.it" in image_url:
+            processed_urls.append(image_url)
+
+        # Process all extracted URLs
+        for img_url in processed_urls:
+            # Get metadata
+            title = post.get("title", "")
+            author = post.get("author", "")
+            subreddit = post.get("subreddit", "")
+            permalink = post.get("permalink", "")
+            score = post.get("score", 0)
+            over_18 = post.get("over_18", False)
+
+            # Build origin URL
+            origin_url = f"https://www.reddit.com{permalink}"
+
+            # Handle NSFW content
+            if over_18:
+                if self.is_safe_mode_enabled():
+                    logger.info(lambda: f"Skipping NSFW post: {title}")
+                    continue
+
+            # Build metadata
+            extra_metadata = {
+                "sourceType": "reddit",
+                "sfwRating": 0 if over_18 else 100,
+                "headline": title,
+                "author": f"u/{author}",
+                "description": f"r/{subreddit} - Score: {score}",
+                "keywords": [subreddit],
+            }
+
+            items.append((origin_url, img_url, extra_metadata))
+
+        return items
+
+    def _add_posts(self, queue, seen, posts):
+        """
+        Append the queue entries of posts (data dicts) whose image is not
+        in seen yet and was not downloaded before. seen maps each image
+        URL to its post.
+        """
+        queue.extend(self._drop_near_duplicates(self._candidates(seen, posts)))
+
+    def _usable_images(self, posts):
+        """How many images of posts pass the filters of _add_posts before the near-duplicate check."""
+        return len(self._candidates({}, posts))
+
+    def _candidates(self, seen, posts):
+        """
+        (entry, post) pairs of the images of posts not in seen that fit the
+        screen and were not downloaded before. Adds them to seen.
+        """
+        settings = get_settings("reddit", LISTING_DEFAULTS)
+        candidates = []
+        for post in posts:
+            try:
+                for entry in self._queue_items(post):
+                    if entry[1] not in seen:
+                        seen[entry[1]] = post
+                        if self._fits_screen(self._image_size(post, entry[1]), settings):
+                            candidates.append((entry, post))
+                        else:
+                            logger.info(lambda: f"Skipping image that does not fit the screen: {entry[1]}")
+            except Exception:
+                logger.exception(lambda: "Could not process a Reddit post")
+
+        # Skip if already downloaded, one index lookup for the whole page
+        new = set(get_download_index().filter_new(self, [entry[1] for entry, post in candidates]))
+        return [(entry, post) for entry, post in candidates if entry[1] in new]
+
+    def _gallery_rendition(self, media):
+        """
+        URL and (width, height) of the rendition of a gallery item to download.
+
+        The smallest of Reddit's resized renditions that still covers one
+        of the screens, so an 8K original is not fetched for a 1080p
+        monitor; the source image when none does (or for animated items).
+        """
+        source = media.get("s", {})
+        if source.get("u"):
+            screens = screen_sizes()
+            for rendition in sorted(media.get("p") or [], key=lambda p: p.get("x", 0)):
+                width, height = rendition.get("x", 0), rendition.get("y", 0)
+                if rendition.get("u") and any(width >= w and height >= h for w, h in screens):
+                    # Decode HTML entities
+                    return rendition["u"].replace("&amp;", "&"), (rendition["x"], rendition["y"])
+
+        img_url = source.get("u") or source.get("gif")
+        if not img_url:
+            return None, None
+        size = (source["x"], source["y"]) if source.get("x") and source.get("y") else None
+        return img_url.replace("&amp;", "&"), size
+
+    def _image_size(self, post, image_url):
+        """(width, height) of image_url according to the post's metadata, or None."""
+        for media in (post.get("media_metadata") or {}).values():
+            img_url, size = self._gallery_rendition(media)
+            if img_url == image_url:
+                return size
+
+        images = (post.get("preview") or {}).get("images") or []
+        if images:
+            source = images[0].get("source") or {}
+            if source.get("width") and source.get("height"):
+                return source["width"], source["height"]
+        return None
+
+    def _fits_screen(self, size, settings):
+        """
+        Whether an image of size is big enough for one of the screens and
+        has a usable aspect ratio for that screen.
+        """
+        if size is None:
+            # Unknown until downloaded, let Variety decide
+            return True
+        width, height = size
+        threshold = settings["size_threshold"]
+        tolerance = settings["aspect_tolerance"]
+
+        for screen_width, screen_height in screen_sizes():
+            if width < screen_width * threshold or height < screen_height * threshold:
+                continue
+            if tolerance > 0:
+                ratio = (width / height) / (screen_width / screen_height)
+                if not 1 / (1 + tolerance) <= ratio <= 1 + tolerance:
+                    continue
+            return True
+        return False
+
+    def _thumbnail_url(self, post, image_url):
+        """URL of the smallest Reddit preview of image_url in post, or None."""
+        for media in (post.get("media_metadata") or {}).values():
+            if self._gallery_rendition(media)[0] == image_url:
+                previews = media.get("p") or []
+                return previews[0]["u"].replace("&amp;", "&") if previews else None
+
+        images = (post.get("preview") or {}).get("images") or []
+        if images:
+            resolutions = images[0].get("resolutions") or []
+            if resolutions:
+                return resolutions[0]["url"].replace("&amp;", "&")
+        return None
+
+    def _thumbnail_hashes(self, urls):
+        """Perceptual hashes of the preview images at urls, None where there is none."""
+        fetched = {url: None for url in urls if url}
+        for url, r in zip(fetched, self.fetcher.fetch_many(list(fetched))):
+            if isinstance(r, Exception) or r.status_code != 200:
+                logger.warning(lambda: f"Could not fetch preview {url}")
+                continue
+            fetched[url] = dhash_bytes(r.content)
+        return [fetched.get(url) for url in urls]
+
+    def _drop_near_duplicates(self, candidates):
+        """
+        Queue entries of candidates ((entry, post) pairs) that are not a
+        near-duplicate of an image downloaded or queued before.
+
+        Compared by the perceptual hash of the post's small preview, so a
+        crosspost is recognised before its full image is downloaded.
+        Entries without a preview are kept.
+        """
+        hash_index = get_hash_index()
+        if hash_index is None or not candidates:
+            return [entry for entry, post in candidates]
+
+        hashes = self._thumbnail_hashes([self._thumbnail_url(post, entry[1]) for entry, post in candidates])
+
+        kept = []
+        for (entry, post), value in zip(candidates, hashes):
+            if value is not None and not hash_index.claim(value, self):
+                logger.info(lambda: f"Skipping near-duplicate image: {entry[1]}")
+                continue
+            kept.append(entry)
+        return kept
+
+    def download_queue_item(self, queue_item):
+        """
+        Download one queue entry and record it in the download index.
+
+        Entries staged by the prefetch queue are only moved into place. The
+        entries handed out next are staged while this one is saved.
+        """
+        return download_with_prefetch(self, queue_item, super().download_queue_item)
+
+    def _fetch_pages(self, listing_url, on_page):
+        """
+        Page through a listing, calling on_page(posts) with batches of post
+        data dicts until it returns 0 or the pages run out.
+
+        on_page returns how many more images are wanted, 0 once there are
+        enough; on_page([]) only reports that number.
+
+        Streamed pages are handed over in batches as they are parsed, and
+        the rest of the page is left unread once on_page has enough. The
+        next page is only requested once a page falls short: as soon as
+        the images a page gave so far, projected over its PAGE_LIMIT posts,
+        will not cover what is wanted, the pages expected to make up the
+        difference are requested while the page is still being handled.
+        Beyond the next page these use the cursors of the previous refresh
+        instead of waiting for each page's cursor; a seeded page that comes
+        back empty (its cursor went stale) is fetched again from the live
+        cursor.
+        """
+        settings = get_settings("reddit", LISTING_DEFAULTS)
+        max_pages = max(1, settings["max_pages"])
+
+        cursors = []  # cursor of page n + 1 is the after of page n
+        executor = ThreadPoolExecutor(max_workers=max_pages, thread_name_prefix="reddit-page")
+        pending = {0: (None, executor.submit(self._fetch_page, listing_url, 0, None))}
+        seeds = _cursor_store.get(listing_url)[: max_pages - 1] if settings["seed_cursors"] else []
+
+        def request_ahead(page, after, shortfall, per_page):
+            """Request the pages after page that shortfall images take at per_page images a page."""
+            ahead = max_pages if per_page <= 0 else page + 1 + math.ceil(shortfall / per_page)
+            for later in range(page + 1, min(ahead, max_pages)):
+                if later in pending:
+                    continue
+                if later == page + 1:
+                    if not after:
+                        return
+                    pending[later] = (None, executor.submit(self._fetch_page, listing_url, later, after))
+                elif later - 1 < len(seeds):
+                    seeded_after = seeds[later - 1]
+                    pending[later] = (seeded_after, executor.submit(self._fetch_page, listing_url, later, seeded_after))
+
+        needed = on_page([])
         try:
-            import requests
-            
-            for attempt in range(max_attempts):
-                # Build URL with pagination
-                json_url = self._build_json_url(self.config)
-                if after:
-                    separator = '&' if '?' in json_url else '?'
-                    json_url = f"{json_url}{separator}after={after}"
-                
-                logger.info(lambda: f"Fetching from: {json_url} (attempt {attempt + 1})")
-                
-                # Use authentication if available
-                r = requests.get(json_url, headers=self.auth_headers, cookies=self.cookies, timeout=30)
-                r.raise_for_status()
-                data = r.json()
-                
-                posts = data.get("data", {}).get("children", [])
-                after = data.get("data", {}).get("after")  # For next page
-                
-                logger.info(lambda: f"Found {len(posts)} posts on page {attempt + 1}")
-
-                for item in posts:
-                    try:
-                        post = item.get("data", {})
-
-                        # Get image URL
-                        image_url = post.get("url_overridden_by_dest") or post.get("url")
-
-                        if not image_url:
-                            continue
-
-                        # Handle different image sources
-                        processed_urls = []
-                        
-                        # Direct image links
-                        if image_url.lower().endswith((".jpg", ".jpeg", ".png", ".webp", ".gif")):
-                            processed_urls.append(image_url)
-                        
-                        # Imgur single image (convert to direct link)
-                        elif "imgur.com" in image_url and not any(x in image_url for x in ['/a/', '/gallery/']):
-                            # Convert imgur.com/abc123 to i.imgur.com/abc123.jpg
-                            if not image_url.startswith("https://i.imgur.com"):
-                                img_id = image_url.split('/')[-1].split('.')[0]
-                                processed_urls.append(f"https://i.imgur.com/{img_id}.jpg")
-                        
-                        # Reddit gallery (extract first image)
-                        elif "reddit.com/gallery/" in image_url:
-                            # Try to get gallery images from post data
-                            gallery_data = post.get("gallery_data", {})
-                            media_metadata = post.get("media_metadata", {})
-                            if gallery_data and media_metadata:
-                                for item_data in gallery_data.get("items", [])[:3]:  # Get first 3 images
-                                    media_id = item_data.get("media_id")
-                                    if media_id and media_id in media_metadata:
-                                        img_data = media_metadata[media_id]
-                                        if img_data.get("status") == "valid":
-                                            # Get highest quality image
-                                            source = img_data.get("s", {})
-                                            img_url = source.get("u") or source.get("gif")
-                                            if img_url:
-                                                # Decode HTML entities
-                                                img_url = img_url.replace("&amp;", "&")
-                                                processed_urls.append(img_url)
-                        
-                        # i.redd.it images
-                        elif "i.redd.it" in image_url:
-                            processed_urls.append(image_url)
-
-                        # Process all extracted URLs
-                        for img_url in processed_urls:
-                            # Skip if already downloaded (only if download folder is initialized)
-                            try:
-                                if self.is_in_downloaded(img_url):
-                                    continue
-                            except Exception:
-                                pass
-
-                            # Get metadata
-                            title = post.get("title", "")
-                            author = post.get("author", "")
-                            subreddit = post.get("subreddit", "")
-                            permalink = post.get("permalink", "")
-                            score = post.get("score", 0)
-                            over_18 = post.get("over_18", False)
-
-                            # Build origin URL
-                            origin_url = f"https://www.reddit.com{permalink}"
-
-                            # Handle NSFW content
-                            if over_18:
-                                if self.is_safe_mode_enabled():
-                                    logger.info(lambda: f"Skipping NSFW post: {title}")
-                                    continue
-
-                            # Build metadata
-                            extra_metadata = {
-                                "sourceType": "reddit",
-                                "sfwRating": 0 if over_18 else 100,
-                                "headline": title,
-                                "author": f"u/{author}",
-                                "description": f"r/{subreddit} - Score: {score}",
-                                "keywords": [subreddit],
-                            }
-
-                            queue.append((origin_url, img_url, extra_metadata))
-
-                    except Exception:
-                        logger.exception(lambda: "Could not process a Reddit post")
-
-                # Check if we have enough images
-                if len(queue) >= target_images:
-                    logger.info(lambda: f"Reached target of {target_images} images")
+            for page in range(max_pages):
+                seeded_after, future = pending.pop(page)
+                data = future.result()
+
+                if seeded_after is not None and cursors and cursors[-1] and cursors[-1] != seeded_after and not _has_posts(data):
+                    logger.info(lambda: f"Seeded cursor for page {page + 1} is stale, refetching")
+                    _close(data)
+                    data = self._fetch_page(listing_url, page, cursors[-1])
+
+                after = _listing_after(data)  # For next page
+                cursors.append(after)
+
+                wanted = needed
+                count = 0
+                batch = []
+                try:
+                    for post in _listing_posts(data):
+                        count += 1
+                        batch.append(post)
+                        if len(batch) >= POST_BATCH:
+                            needed = on_page(batch)
+                            batch = []
+                            if needed <= 0:
+                                break
+                            # Images this page is on course to give
+                            per_page = (wanted - needed) * PAGE_LIMIT / count
+                            if per_page < wanted:
+                                request_ahead(page, after, wanted - per_page, per_page)
+                    if batch and needed > 0:
+                        needed = on_page(batch)
+                finally:
+                    _close(data)
+
+                logger.info(lambda: f"Found {count} posts on page {page + 1}")
+
+                if needed <= 0:
+                    logger.info(lambda: f"Got enough posts from {listing_url}")
                     break
-                
+
                 # Check if there are more pages
                 if not after:
                     logger.info(lambda: "No more pages available")
                     break
 
+                request_ahead(page, after, needed, wanted - needed)
+
         except Exception:
             logger.exception(lambda: "Failed to fetch from Reddit")
 
-        random.shuffle(queue)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+            for seeded_after, future in pending.values():
+                # Release the connections of pages that are no longer needed
+                future.add_done_callback(_discard)
+
+        if any(cursors):
+            known = [c for c in cursors if c]
+            # A refresh the first page satisfied keeps the later cursors it did not need
+            _cursor_store.put(listing_url, known + seeds[len(known) :])
+
+    def _prefetch_listings(self):
+        """
+        Fetch the first listing page of every Reddit source due for a refresh at once.
+
+        Variety refreshes its sources one after another, each waiting for
+        its own first page. A refresh instead requests the first pages of
+        all registered sources whose queue is empty (their combined
+        requests with fan_in) concurrently through the async engine and
+        stores them in the listing cache, where the following refreshes
+        find them fresh. Sources with queued images are skipped, as are
+        pages already fresh in the cache; cached ones are revalidated. At
+        most once per listing_ttl.
+        """
+        global _prefetched_at
+        settings = get_settings("reddit", LISTING_DEFAULTS)
+        if not settings["prefetch_sources"] or not settings["listing_cache"]:
+            return
+        with _prefetch_lock:
+            if time.time() - _prefetched_at < settings["listing_ttl"]:
+                return
+            _prefetched_at = time.time()
+
+        cache = get_listing_cache(settings["listing_ttl"])
+        pending = []
+        for listing_url, group in get_fan_in().listing_urls(combined=settings["fan_in"]):
+            # Sources with queued images are not refreshing, their page would go stale unused
+            if not any(member is self or not member.queue for member in group):
+                continue
+            member = group[0]
+            json_url = member._page_url(listing_url)
+            headers, cookies = member._get_auth_headers(oauth=member.authenticated)
+            variant = _listing_variant(headers, cookies)
+            entry = cache.get(json_url, variant)
+            if entry and cache.is_fresh(entry):
+                continue
+            request_headers = dict(headers or {})
+            if entry:
+                request_headers.update(cache.conditional_headers(entry))
+            pending.append((json_url, variant, entry, request_headers, cookies))
+        if not pending:
+            return
+
+        logger.info(lambda: f"Prefetching the first page of {len(pending)} Reddit listings")
+        results = self.fetcher.fetch_many([(url, headers, cookies) for url, _, _, headers, cookies in pending])
+        for (json_url, variant, entry, _, _), r in zip(pending, results):
+            if isinstance(r, Exception):
+                logger.warning(lambda: f"Could not prefetch {json_url}: {r}")
+            elif r.status_code == 304 and entry:
+                cache.revalidated(json_url, variant, entry)
+            elif r.status_code == 200:
+                try:
+                    cache.store(json_url, variant, r, r.json())
+                except ValueError:
+                    logger.warning(lambda: f"Prefetched listing is not JSON: {json_url}")
+            # Anything else is left to the source's own request, which handles auth
+
+    def fill_queue(self):
+        """
+        Fetch posts from Reddit and extract image URLs.
+        Returns list of (origin_url, image_url, extra_metadata) tuples.
+        Ensures at least 20 images are returned.
+
+        When other Reddit sources with the same sort order are configured,
+        the posts come from one combined multi-reddit request shared with
+        them (see RedditFanIn); if that share falls short of the target,
+        the source's own listing is fetched on top.
+
+        The queue is ordered by post score, age and screen fit (see
+        QueueOrder), so the best candidates are handed out and prefetched
+        first.
+        """
+        logger.info(lambda: f"Custom Reddit URL: {self.config}")
+
+        settings = get_settings("reddit", LISTING_DEFAULTS)
+        target_images = settings["target_images"]
+
+        queue = []
+        seen = {}
+
+        # The queue is rebuilt, whatever it claimed before is gone or downloaded
+        hash_index = get_hash_index()
+        if hash_index:
+            hash_index.release(self)
+
+        self._prefetch_listings()
+
+        if settings["fan_in"]:
+            # Grouped by the auth members already resolved, this one's requests need its own anyway
+            self._resolve_auth()
+            posts = get_fan_in().posts_for(
+                self, self._fetch_pages, target_images, settings["listing_ttl"], lambda member, posts: member._usable_images(posts)
+            )
+            if posts is not None:
+                self._add_posts(queue, seen, posts)
+                if len(queue) < target_images:
+                    logger.info(lambda: f"Combined request gave {len(queue)} images, fetching {self.config} itself")
+
+        if len(queue) < target_images:
+
+            def on_page(posts):
+                self._add_posts(queue, seen, posts)
+                # Images still missing
+                return max(target_images - len(queue), 0)
+
+            self._fetch_pages(self.config, on_page)
+
+        def features(entry):
+            post = seen[entry[1]]
+            return {
+                "score": post.get("score"),
+                "created": post.get("created_utc"),
+                "size": self._image_size(post, entry[1]),
+                "group": post.get("subreddit", "").lower(),
+            }
+
+        order_queue(queue, features, screen_sizes())
         logger.info(lambda: f"Queue populated with {len(queue)} images")
+        logger.info(lambda: f"Reddit rate limiter: {get_reddit_limiter()[0].stats()}")
         return queue
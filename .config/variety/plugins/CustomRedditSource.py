@@ -29,6 +29,8 @@ Examples of what you can add:
 """
 
 import logging
+import os
+import sys
 
 from variety.plugins.downloaders.ConfigurableImageSource import ConfigurableImageSource
 from variety.Util import Util, _
@@ -40,6 +42,14 @@ except ImportError:
     # Fallback for different import contexts
     from variety.plugins.CustomRedditDownloader import CustomRedditDownloader
 
+try:
+    from HttpSessionPool import get_shared_pool
+    from PerceptualHash import get_hash_index
+except ImportError:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from HttpSessionPool import get_shared_pool
+    from PerceptualHash import get_hash_index
+
 logger = logging.getLogger("variety")
 
 
@@ -118,8 +128,14 @@ class CustomRedditSource(ConfigurableImageSource):
         
         # Try to fetch and validate
         try:
-            dl = CustomRedditDownloader(self, query)
-            queue = dl.fill_queue()
+            dl = CustomRedditDownloader(self, query, session_pool=get_shared_pool())
+            try:
+                queue = dl.fill_queue()
+            finally:
+                # The test queue is thrown away, its images stay available to the real one
+                hash_index = get_hash_index()
+                if hash_index:
+                    hash_index.release(dl)
             
             if len(queue) > 0:
                 return query, None  # Success
@@ -140,4 +156,4 @@ class CustomRedditSource(ConfigurableImageSource):
         Returns:
             CustomRedditDownloader instance
         """
-        return CustomRedditDownloader(self, config)
+        return CustomRedditDownloader(self, config, session_pool=get_shared_pool())
@@ -0,0 +1,220 @@
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+### BEGIN LICENSE
+# Copyright (c) 2025
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License version 3, as published
+# by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranties of
+# MERCHANTABILITY, SATISFACTORY QUALITY, or FITNESS FOR A PARTICULAR
+# PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+### END LICENSE
+
+"""
+Index of downloaded images for the already-downloaded check.
+
+DefaultDownloader.is_in_downloaded stats one file per candidate, which
+dominates filling a queue once the download folder holds tens of
+thousands of images. This index answers the same question from memory:
+
+- normalized image URLs and content hashes of everything downloaded
+  through these plugins, kept in SQLite and loaded once per process
+- the file names in each download folder, listed once per process, so
+  files that were there before the index existed still count
+
+Downloaders add each image they save, so the index stays current without
+rescanning. Lookups are set membership; filter_new checks a whole page of
+candidates at once, and add() reports a saved image whose content is
+already in the folder under another URL. Entries whose file is no longer
+in its folder (deleted by the user or purged by Variety) are dropped when
+the index loads and every PRUNE_INTERVAL after, when the folders are
+listed again, so those images can be downloaded again.
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+try:
+    from PluginConfig import cache_dir
+except ImportError:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from PluginConfig import cache_dir
+
+logger = logging.getLogger("variety")
+
+# Image hosts whose query string is only signing/resizing, not a different image
+QUERYLESS_HOSTS = ("i.redd.it", "preview.redd.it", "i.imgur.com")
+
+PRUNE_INTERVAL = 24 * 3600  # seconds between checks for downloaded files that are gone
+
+
+def normalize_url(url):
+    """Image URL reduced to what identifies the image."""
+    scheme, _, rest = url.strip().replace("&amp;", "&").rpartition("://")
+    host, _, path = rest.partition("/")
+    host = host.lower()
+    path = path.partition("#")[0]
+    if host in QUERYLESS_HOSTS:
+        path = path.partition("?")[0]
+    return f"{scheme.lower() or 'https'}://{host}/{path}"
+
+
+def file_hash(path):
+    """SHA-1 of a file's content."""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DownloadIndex:
+    """
+    Downloaded URLs, content hashes and folder contents. Thread safe.
+    """
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS downloads ("
+            "url TEXT PRIMARY KEY, folder TEXT, filename TEXT, sha1 TEXT, added REAL)"
+        )
+        if "sha1" not in {column for _, column, *_ in self._db.execute("PRAGMA table_info(downloads)")}:
+            # Created by a version that did not keep content hashes
+            self._db.execute("ALTER TABLE downloads ADD COLUMN sha1 TEXT")
+        self._db.execute("CREATE INDEX IF NOT EXISTS downloads_sha1 ON downloads (sha1)")
+        self._db.commit()
+
+        self._urls = set()
+        self._hashes = {}  # sha1 -> local path
+        self._folders = {}  # folder -> set of file names
+        self._pruned_at = 0
+        with self._lock:
+            self._prune()
+        logger.info(lambda: f"Download index: {len(self._urls)} URLs from {path}")
+
+    def _prune(self):
+        """
+        Reload the index with fresh folder listings, dropping the entries
+        whose file is gone. Needs the lock.
+        """
+        self._folders = {}
+        self._urls = set()
+        self._hashes = {}
+        gone = []
+        for url, folder, filename, sha1 in self._db.execute("SELECT url, folder, filename, sha1 FROM downloads"):
+            # A folder that cannot be listed (an unmounted drive) proves nothing
+            if folder and filename and os.path.isdir(folder) and filename not in self._folder_names(folder):
+                gone.append((url,))
+                continue
+            self._urls.add(url)
+            if sha1:
+                self._hashes[sha1] = os.path.join(folder, filename)
+        self._pruned_at = time.time()
+        if gone:
+            logger.info(lambda: f"Download index: forgetting {len(gone)} images no longer on disk")
+            try:
+                self._db.executemany("DELETE FROM downloads WHERE url = ?", gone)
+                self._db.commit()
+            except sqlite3.Error:
+                logger.exception(lambda: "Could not prune the download index")
+
+    def _folder_names(self, folder):
+        """File names in folder, listed on first use. Needs the lock."""
+        names = self._folders.get(folder)
+        if names is None:
+            try:
+                with os.scandir(folder) as entries:
+                    names = {entry.name for entry in entries}
+            except OSError:
+                names = set()
+            self._folders[folder] = names
+        return names
+
+    def _local_name(self, downloader, url):
+        try:
+            return os.path.basename(downloader.get_local_filename(url))
+        except Exception:
+            return None
+
+    def filter_new(self, downloader, urls):
+        """
+        The urls that were not downloaded yet, in their original order.
+
+        Args:
+            downloader: DefaultDownloader whose target folder counts too,
+                if it has one (the throwaway downloader of a source's
+                validate() does not)
+            urls: Candidate image URLs
+        """
+        target = downloader.target_folder
+        names = [self._local_name(downloader, url) for url in urls] if target else [None] * len(urls)
+        with self._lock:
+            if time.time() - self._pruned_at > PRUNE_INTERVAL:
+                self._prune()
+            folder = self._folder_names(os.path.normpath(target)) if target else set()
+            return [
+                url
+                for url, name in zip(urls, names)
+                if (name is None or name not in folder) and normalize_url(url) not in self._urls
+            ]
+
+    def add(self, url, local_path):
+        """
+        Record a finished download of url to local_path.
+
+        Returns:
+            path of an earlier download with the same content that is
+            still on disk, or None. The caller removes local_path then;
+            url is recorded with the earlier file, so it is not downloaded
+            again while that file exists.
+        """
+        local_path = os.path.normpath(local_path)
+        key = normalize_url(url)
+        try:
+            sha1 = file_hash(local_path)
+        except OSError:
+            sha1 = None
+
+        with self._lock:
+            self._urls.add(key)
+            earlier = self._hashes.get(sha1) if sha1 else None
+            if earlier in (None, local_path) or not os.path.exists(earlier):
+                earlier = None
+                if sha1:
+                    self._hashes[sha1] = local_path
+            folder, filename = os.path.split(earlier or local_path)
+            if folder in self._folders:
+                self._folders[folder].add(filename)
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO downloads (url, folder, filename, sha1, added) VALUES (?, ?, ?, ?, ?)",
+                    (key, folder, filename, sha1, time.time()),
+                )
+                self._db.commit()
+            except sqlite3.Error:
+                logger.exception(lambda: f"Could not record {url} in the download index")
+        return earlier
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_download_index():
+    """The process-wide download index."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = DownloadIndex(os.path.join(cache_dir("DownloadIndex"), "downloads.sqlite"))
+        return _index
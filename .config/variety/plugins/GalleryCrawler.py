@@ -0,0 +1,311 @@
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+### BEGIN LICENSE
+# Copyright (c) 2025
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License version 3, as published
+# by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranties of
+# MERCHANTABILITY, SATISFACTORY QUALITY, or FITNESS FOR A PARTICULAR
+# PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+### END LICENSE
+
+"""
+Image discovery across the pages of a gallery site.
+
+A single page often only shows the first part of a gallery: the rest is
+behind "next page" links and sub-gallery pages. GalleryCrawler starts at
+the configured page and follows links breadth-first through the async
+fetch engine, several pages at a time, yielding each page's images as
+soon as the page has been parsed, so the downloader can stop once its
+queue is full.
+
+Links are followed when they stay inside the start page's folder on the
+same host (https://site/gallery/index.html -> https://site/gallery/...)
+or are marked rel="next"; pagination does not count towards the depth.
+Every page is fetched at most once, robots.txt is honoured for every page
+but the configured one, and the whole crawl stops after a time limit.
+
+Run this file to crawl a generated local gallery site with different
+concurrency limits.
+"""
+
+import collections
+import logging
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+from urllib.parse import urldefrag, urljoin, urlparse
+from urllib.robotparser import RobotFileParser
+
+from bs4 import BeautifulSoup
+
+try:
+    from AsyncFetch import AsyncFetcher, get_fetcher
+    from HttpSessionPool import USER_AGENT
+except ImportError:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from AsyncFetch import AsyncFetcher, get_fetcher
+    from HttpSessionPool import USER_AGENT
+
+logger = logging.getLogger("variety")
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".webp", ".bmp", ".tiff")
+SKIPPED_IMAGES = ("icon", "logo", "avatar", "thumb")  # likely not wallpapers
+
+
+def is_image_url(url):
+    return url.lower().split("?")[0].endswith(IMAGE_EXTENSIONS)
+
+
+def _absolute(page_url, href):
+    url = urldefrag(urljoin(page_url, href.strip()))[0]
+    return url if url.startswith(("http://", "https://")) else None
+
+
+def extract_images(soup, page_url):
+    """Image URLs of a parsed page: <img> sources and links to image files."""
+    images = []
+    for img in soup.find_all("img"):
+        src = img.get("src") or img.get("data-src")
+        src = src and _absolute(page_url, src)
+        if src and is_image_url(src) and not any(x in src.lower() for x in SKIPPED_IMAGES):
+            images.append(src)
+    for link in soup.find_all("a", href=True):
+        href = _absolute(page_url, link["href"])
+        if href and is_image_url(href):
+            images.append(href)
+    return list(dict.fromkeys(images))
+
+
+def extract_pages(soup, page_url):
+    """
+    Page links of a parsed page.
+
+    Returns:
+        (rel="next" links, other links), neither pointing at image files
+    """
+    following, other = [], []
+    for link in soup.find_all(["a", "link"], href=True):
+        href = _absolute(page_url, link["href"])
+        if not href or is_image_url(href):
+            continue
+        if "next" in (link.get("rel") or []):
+            following.append(href)
+        elif link.name == "a":
+            other.append(href)
+    return following, other
+
+
+class GalleryCrawler:
+    """
+    Bounded breadth-first crawl of a gallery site.
+
+    Args:
+        fetcher: AsyncFetch.AsyncFetcher (defaults to the shared one)
+        max_depth: Links followed away from the start page, not counting
+            rel="next" pagination
+        max_pages: Pages fetched in total, the start page included
+        same_host: Only follow links inside the start page's folder
+        robots: Honour robots.txt
+        concurrency: Pages fetched at the same time
+        time_limit: Seconds after which the crawl stops
+    """
+
+    def __init__(self, fetcher=None, max_depth=2, max_pages=20, same_host=True, robots=True, concurrency=4, time_limit=30.0):
+        self.fetcher = fetcher or get_fetcher()
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        self.same_host = same_host
+        self.robots = robots
+        self.concurrency = max(1, concurrency)
+        self.time_limit = time_limit
+        self._robots = {}  # scheme://host -> RobotFileParser or None
+
+    def _in_scope(self, url, scope):
+        if not self.same_host:
+            return True
+        return url.startswith(scope)
+
+    def _allowed(self, url):
+        if not self.robots:
+            return True
+        parsed = urlparse(url)
+        site = f"{parsed.scheme}://{parsed.netloc}"
+        if site not in self._robots:
+            parser = RobotFileParser(site + "/robots.txt")
+            try:
+                r = self.fetcher.fetch(site + "/robots.txt")
+                if r.status_code in (401, 403):
+                    parser.disallow_all = True
+                elif r.status_code == 200:
+                    parser.parse(r.text.splitlines())
+                else:
+                    parser.allow_all = True
+            except Exception:
+                parser.allow_all = True
+            self._robots[site] = parser
+        return self._robots[site].can_fetch(USER_AGENT, url)
+
+    def _parse(self, r, url):
+        content_type = r.headers.get("Content-Type", "")
+        if r.status_code != 200 or (content_type and "html" not in content_type):
+            return [], [], []
+        soup = BeautifulSoup(r.text, "html.parser")
+        return (extract_images(soup, url),) + extract_pages(soup, url)
+
+    def crawl(self, start_url, start_page=None):
+        """
+        Discover images from start_url on.
+
+        Args:
+            start_url: The configured page
+            start_page: Its response when already fetched
+
+        Yields:
+            (page URL, list of image URLs found on that page)
+        """
+        deadline = time.monotonic() + self.time_limit
+        start_url = urldefrag(start_url)[0]
+        parsed = urlparse(start_url)
+        scope = f"{parsed.scheme}://{parsed.netloc}{parsed.path.rpartition('/')[0]}/"
+
+        visited = {start_url}
+        waiting = collections.deque()  # (depth, url)
+        pending = {}  # future -> (depth, url)
+        fetched = 0
+
+        if start_page is not None:
+            done = [(0, start_url, start_page)]
+        else:
+            pending[self.fetcher.submit(start_url)] = (0, start_url)
+            done = []
+
+        try:
+            while True:
+                for depth, url, r in done:
+                    fetched += 1
+                    images, following, other = self._parse(r, url)
+                    if images:
+                        yield url, images
+                    # Pagination first and at the same depth
+                    for link in reversed(following):
+                        if link not in visited and self._in_scope(link, scope):
+                            visited.add(link)
+                            waiting.appendleft((depth, link))
+                    if depth < self.max_depth:
+                        for link in other:
+                            if link not in visited and self._in_scope(link, scope):
+                                visited.add(link)
+                                waiting.append((depth + 1, link))
+
+                while waiting and len(pending) < self.concurrency and fetched + len(pending) < self.max_pages:
+                    depth, url = waiting.popleft()
+                    if self._allowed(url):
+                        pending[self.fetcher.submit(url)] = (depth, url)
+                    else:
+                        logger.info(lambda: f"robots.txt disallows {url}")
+                if not pending:
+                    break
+
+                remaining = deadline - time.monotonic()
+                finished = wait(pending, timeout=max(remaining, 0), return_when=FIRST_COMPLETED)[0] if remaining > 0 else ()
+                if not finished:
+                    logger.info(lambda: f"Crawl of {start_url} hit its {self.time_limit:.0f} s limit")
+                    break
+
+                done = []
+                for future in finished:
+                    depth, url = pending.pop(future)
+                    try:
+                        done.append((depth, url, future.result()))
+                    except Exception:
+                        fetched += 1
+                        logger.warning(lambda: f"Could not fetch {url}")
+        finally:
+            for future in pending:
+                future.cancel()
+        logger.info(lambda: f"Crawled {fetched} pages from {start_url}")
+
+
+def fixture_site(latency=0.05, pages=5, galleries=4, images=6):
+    """
+    A local gallery site: an index paginated over pages, each page
+    linking galleries sub-gallery pages of images, plus an off-limits
+    /gallery/private folder and a robots.txt that disallows it.
+
+    Returns:
+        (server, index URL); call server.shutdown() when done
+    """
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    def page(n):
+        links = "".join(f'<a href="/gallery/g{n}-{g}.html">gallery {g}</a>' for g in range(galleries))
+        following = f'<a rel="next" href="/gallery/index{n + 1}.html">next</a>' if n + 1 < pages else ""
+        return f'<html><img src="/static/logo.png">{links}{following}<a href="/gallery/private/x.html">x</a><a href="https://elsewhere.example/">y</a></html>'
+
+    def gallery(name):
+        imgs = "".join(f'<img src="/img/{name}-{i}.jpg">' for i in range(images))
+        return f'<html>{imgs}<a href="/gallery/index0.html">back</a><a href="/img/{name}-big.png">full</a></html>'
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            time.sleep(latency)
+            path = self.path
+            content_type = "text/html"
+            status = 200
+            if path == "/robots.txt":
+                body, content_type = "User-agent: *\nDisallow: /gallery/private/\n", "text/plain"
+            elif path.startswith("/gallery/index"):
+                body = page(int(path[len("/gallery/index") : -len(".html")]))
+            elif path.startswith("/gallery/g"):
+                body = gallery(path[len("/gallery/") : -len(".html")])
+            else:
+                body, status = "not found", 404
+            data = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/gallery/index0.html"
+
+
+def bench(latency=0.05):
+    """Crawl the fixture site sequentially and with a few concurrency limits."""
+    server, start_url = fixture_site(latency)
+    fetcher = AsyncFetcher(per_host=8)
+    print(f"Fixture site at {start_url}, {latency * 1000:.0f} ms per response")
+    print(f"{'concurrency':<14}{'pages':>6}{'images':>8}{'first s':>9}{'total s':>9}")
+    for concurrency in (1, 2, 4, 8):
+        crawler = GalleryCrawler(fetcher, max_depth=2, max_pages=100, concurrency=concurrency)
+        start = time.perf_counter()
+        first = None
+        pages = images = 0
+        for url, found in crawler.crawl(start_url):
+            if first is None:
+                first = time.perf_counter() - start
+            pages += 1
+            images += len(found)
+        print(f"{concurrency:<14}{pages:>6}{images:>8}{first or 0:>9.2f}{time.perf_counter() - start:>9.2f}")
+    fetcher.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    bench()
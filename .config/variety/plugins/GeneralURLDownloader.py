@@ -25,91 +25,195 @@ Supports:
 """
 
 import logging
-import random
+import os
 import re
+import sys
+import threading
+import time
+import weakref
+
+from bs4 import BeautifulSoup
 
 from variety.plugins.downloaders.DefaultDownloader import DefaultDownloader
-from variety.Util import Util
+
+try:
+    from AsyncFetch import get_fetcher
+    from DownloadIndex import get_download_index
+    from GalleryCrawler import GalleryCrawler, extract_images
+    from HttpSessionPool import get_shared_pool
+    from PluginConfig import get_settings
+    from PrefetchQueue import download_with_prefetch
+    from QueueOrder import order_queue
+except ImportError:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from AsyncFetch import get_fetcher
+    from DownloadIndex import get_download_index
+    from GalleryCrawler import GalleryCrawler, extract_images
+    from HttpSessionPool import get_shared_pool
+    from PluginConfig import get_settings
+    from PrefetchQueue import download_with_prefetch
+    from QueueOrder import order_queue
 
 logger = logging.getLogger("variety")
 
+# Pages of all General URL sources are fetched in one batch, see _get_page
+PREFETCH_TTL = 300  # seconds a page fetched for another source stays usable
+_downloaders = weakref.WeakSet()
+_prefetched = {}  # page URL -> (time, FetchResult)
+_prefetching = set()  # page URLs being fetched for another source
+_prefetch_lock = threading.Lock()
+
+# [url] in plugins.conf
+CRAWL_DEFAULTS = {
+    "crawl": False,  # Follow pagination and sub-gallery links from the configured page
+    "crawl_depth": 2,  # Links followed away from the configured page (pagination does not count)
+    "crawl_pages": 20,  # Pages fetched per refresh
+    "crawl_same_host": True,  # Only follow links inside the configured page's folder
+    "crawl_robots": True,  # Honour robots.txt for the pages followed
+    "crawl_concurrency": 4,  # Pages fetched at the same time
+    "crawl_time_limit": 30.0,  # Seconds a refresh may spend crawling
+    "target_images": 50,  # Stop crawling once this many new images are queued
+}
+
 
 class GeneralURLDownloader(DefaultDownloader):
     """
     Downloads images from any URL - either direct image links or HTML pages.
     """
 
-    def __init__(self, source, url):
+    def __init__(self, source, url, session_pool=None, fetcher=None):
         """
         Initialize downloader with a URL.
         
         Args:
             source: The ImageSource instance
             url: URL to download from (direct image or HTML page)
+            session_pool: HttpSessionPool.SessionPool to fetch through
+                (defaults to the shared pool)
+            fetcher: AsyncFetch.AsyncFetcher for the HTML pages (defaults
+                to the shared one)
         """
         DefaultDownloader.__init__(self, source=source, config=url)
+        self.http = session_pool or get_shared_pool()
+        self.fetcher = fetcher or get_fetcher()
+        _downloaders.add(self)
 
     def _is_direct_image_url(self, url):
         """Check if URL points directly to an image file"""
         return url.lower().endswith(('.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.tiff'))
 
+    def _get_page(self, url):
+        """
+        Fetch an HTML page.
+
+        Variety refreshes its sources one after another. A refresh also
+        fetches the pages of the other General URL sources that are due for
+        a refresh themselves (their queue is empty), concurrently through
+        the async engine, and their refreshes take the pages from that
+        batch. Sources with queued images are left alone, their page would
+        be stale by the time they need it.
+        """
+        with _prefetch_lock:
+            fetched_at, r = _prefetched.pop(url, (0, None))
+            if r is not None and time.time() - fetched_at < PREFETCH_TTL:
+                return r
+
+            others = []
+            for d in list(_downloaders):
+                if d is self or d.queue or d.config == url or d._is_direct_image_url(d.config):
+                    continue
+                if d.config not in _prefetched and d.config not in _prefetching and d.config not in others:
+                    others.append(d.config)
+            _prefetching.update(others)
+
+        if others:
+            logger.info(lambda: f"Fetching {len(others) + 1} General URL pages at once")
+        try:
+            results = self.fetcher.fetch_many([url] + others)
+        except Exception:
+            with _prefetch_lock:
+                _prefetching.difference_update(others)
+            raise
+        now = time.time()
+        with _prefetch_lock:
+            _prefetching.difference_update(others)
+            for other, result in zip(others, results[1:]):
+                if not isinstance(result, Exception):
+                    _prefetched[other] = (now, result)
+
+        if isinstance(results[0], Exception):
+            raise results[0]
+        return results[0]
+
     def _extract_images_from_html(self, url):
         """
         Scrape HTML page to find image URLs.
         Returns list of image URLs found on the page.
         """
         try:
-            soup = Util.html_soup(url)
-            image_urls = []
-
-            # Find all img tags
-            for img in soup.find_all('img'):
-                src = img.get('src') or img.get('data-src')
-                if src:
-                    # Make absolute URL
-                    if src.startswith('//'):
-                        src = 'https:' + src
-                    elif src.startswith('/'):
-                        from urllib.parse import urlparse
-                        parsed = urlparse(url)
-                        src = f"{parsed.scheme}://{parsed.netloc}{src}"
-                    elif not src.startswith('http'):
-                        continue
-                    
-                    # Filter out small images (likely icons/thumbnails)
-                    if any(x in src.lower() for x in ['icon', 'logo', 'avatar', 'thumb']):
-                        continue
-                    
-                    if self._is_direct_image_url(src):
-                        image_urls.append(src)
-
-            # Also check for links to images
-            for link in soup.find_all('a'):
-                href = link.get('href')
-                if href and self._is_direct_image_url(href):
-                    if href.startswith('//'):
-                        href = 'https:' + href
-                    elif href.startswith('/'):
-                        from urllib.parse import urlparse
-                        parsed = urlparse(url)
-                        href = f"{parsed.scheme}://{parsed.netloc}{href}"
-                    
-                    if href.startswith('http'):
-                        image_urls.append(href)
-
-            return list(set(image_urls))  # Remove duplicates
+            r = self._get_page(url)
+            r.raise_for_status()
+            return extract_images(BeautifulSoup(r.text, "html.parser"), url)
 
         except Exception:
             logger.exception(lambda: f"Could not extract images from {url}")
             return []
 
+    def _crawl(self, queue, settings):
+        """
+        Queue the images of the configured page and of the gallery pages
+        it links to, page by page as they are crawled, until target_images
+        new ones are queued.
+        """
+        crawler = GalleryCrawler(
+            self.fetcher,
+            max_depth=settings["crawl_depth"],
+            max_pages=settings["crawl_pages"],
+            same_host=settings["crawl_same_host"],
+            robots=settings["crawl_robots"],
+            concurrency=settings["crawl_concurrency"],
+            time_limit=settings["crawl_time_limit"],
+        )
+        pages = crawler.crawl(self.config, start_page=self._get_page(self.config))
+        seen = set()
+        try:
+            for page_url, image_urls in pages:
+                image_urls = [url for url in image_urls if url not in seen]
+                seen.update(image_urls)
+                for image_url in get_download_index().filter_new(self, image_urls):
+                    extra_metadata = {
+                        "sourceType": "url",
+                        "sfwRating": 100,
+                        "headline": "Image from custom URL",
+                        "description": f"Downloaded from {page_url}",
+                    }
+                    queue.append((page_url, image_url, extra_metadata))
+                if len(queue) >= settings["target_images"]:
+                    logger.info(lambda: f"Got enough images from {self.config}")
+                    break
+        finally:
+            pages.close()
+
+    def download_queue_item(self, queue_item):
+        """
+        Download one queue entry and record it in the download index.
+
+        Entries staged by the prefetch queue are only moved into place. The
+        entries handed out next are staged while this one is saved.
+        """
+        return download_with_prefetch(self, queue_item, super().download_queue_item)
+
     def fill_queue(self):
         """
         Fetch images from the URL.
         Returns list of (origin_url, image_url, extra_metadata) tuples.
+
+        With crawl enabled, linked gallery pages are searched as well (see
+        GalleryCrawler).
         """
         logger.info(lambda: f"General URL: {self.config}")
 
+        settings = get_settings("url", CRAWL_DEFAULTS)
         queue = []
         
         try:
@@ -125,6 +229,11 @@ class GeneralURLDownloader(DefaultDownloader):
                 
                 queue.append((self.config, self.config, extra_metadata))
             
+            elif settings["crawl"]:
+                logger.info(lambda: "Crawling gallery pages")
+                self._crawl(queue, settings)
+                logger.info(lambda: f"Found {len(queue)} new images while crawling")
+
             else:
                 # Try to extract images from HTML page
                 logger.info(lambda: "Attempting to extract images from HTML page")
@@ -132,15 +241,11 @@ class GeneralURLDownloader(DefaultDownloader):
                 image_urls = self._extract_images_from_html(self.config)
                 logger.info(lambda: f"Found {len(image_urls)} images on page")
 
+                # Skip if already downloaded
+                image_urls = get_download_index().filter_new(self, image_urls)
+
                 for image_url in image_urls:
                     try:
-                        # Skip if already downloaded
-                        try:
-                            if self.is_in_downloaded(image_url):
-                                continue
-                        except Exception:
-                            pass
-
                         extra_metadata = {
                             "sourceType": "url",
                             "sfwRating": 100,
@@ -156,6 +261,7 @@ class GeneralURLDownloader(DefaultDownloader):
         except Exception:
             logger.exception(lambda: "Failed to fetch from URL")
 
-        random.shuffle(queue)
+        # Nothing to weigh a scraped page's images by, so this is a plain shuffle
+        order_queue(queue)
         logger.info(lambda: f"Queue populated with {len(queue)} images")
         return queue
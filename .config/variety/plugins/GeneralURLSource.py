@@ -27,6 +27,8 @@ Examples of what you can add:
 """
 
 import logging
+import os
+import sys
 
 from variety.plugins.downloaders.ConfigurableImageSource import ConfigurableImageSource
 from variety.Util import Util, _
@@ -37,6 +39,12 @@ try:
 except ImportError:
     from variety.plugins.GeneralURLDownloader import GeneralURLDownloader
 
+try:
+    from HttpSessionPool import get_shared_pool
+except ImportError:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from HttpSessionPool import get_shared_pool
+
 logger = logging.getLogger("variety")
 
 
@@ -110,7 +118,7 @@ class GeneralURLSource(ConfigurableImageSource):
         
         # Try to fetch and validate
         try:
-            dl = GeneralURLDownloader(self, query)
+            dl = GeneralURLDownloader(self, query, session_pool=get_shared_pool())
             queue = dl.fill_queue()
             
             if len(queue) > 0:
@@ -132,4 +140,4 @@ class GeneralURLSource(ConfigurableImageSource):
         Returns:
             GeneralURLDownloader instance
         """
-        return GeneralURLDownloader(self, config)
+        return GeneralURLDownloader(self, config, session_pool=get_shared_pool())
@@ -0,0 +1,166 @@
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+### BEGIN LICENSE
+# Copyright (c) 2025
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License version 3, as published
+# by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranties of
+# MERCHANTABILITY, SATISFACTORY QUALITY, or FITNESS FOR A PARTICULAR
+# PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+### END LICENSE
+
+"""
+Shared HTTP session pool for the plugins in this folder.
+
+Keeps one requests.Session per host with keep-alive connection pooling,
+retry with exponential backoff on 5xx errors and default connect/read
+timeouts. Sessions for reddit.com hosts additionally go through the shared
+RedditRateLimiter. Downloaders take a pool in their constructor (the sources pass
+the shared one), so paginated fetches and several configured sources
+reuse the same connections instead of opening a new TCP+TLS connection
+for every request.
+
+Settings ([http] in ~/.config/variety/pluginconfig/plugins.conf):
+    pool_size        connections kept open per host
+    retries          retries for failed connections and 5xx responses
+    backoff          backoff factor between retries, in seconds
+    connect_timeout  default connect timeout, in seconds
+    read_timeout     default read timeout, in seconds
+"""
+
+import http.cookiejar
+import logging
+import os
+import sys
+import threading
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    from PluginConfig import get_settings
+    from RedditRateLimiter import RateLimitedAdapter, get_reddit_limiter, is_reddit_host
+except ImportError:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from PluginConfig import get_settings
+    from RedditRateLimiter import RateLimitedAdapter, get_reddit_limiter, is_reddit_host
+
+logger = logging.getLogger("variety")
+
+USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64; rv:120.0) Gecko/20100101 Firefox/120.0"
+
+DEFAULTS = {
+    "pool_size": 10,
+    "retries": 3,
+    "backoff": 0.5,
+    "connect_timeout": 5.0,
+    "read_timeout": 30.0,
+}
+
+
+class TimeoutSession(requests.Session):
+    """
+    Session that applies a default timeout when the caller does not pass one.
+
+    Its cookie jar keeps nothing: the session is shared by every source
+    on a host, so Set-Cookie from one source's logged-in request would go
+    out with the anonymous requests of all others. Callers pass their
+    cookies with each request instead.
+    """
+
+    def __init__(self, timeout):
+        super().__init__()
+        self.timeout = timeout
+        self.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+
+    def request(self, method, url, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        return super().request(method, url, **kwargs)
+
+
+class SessionPool:
+    """
+    Per-host pooled sessions. Thread safe; sessions are created on first use.
+    """
+
+    def __init__(self, pool_size=10, retries=3, backoff=0.5, connect_timeout=5.0, read_timeout=30.0):
+        self.pool_size = pool_size
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = (connect_timeout, read_timeout)
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def _make_adapter(self, host):
+        """Transport adapter for one host's session."""
+        retry = Retry(
+            total=self.retries,
+            backoff_factor=self.backoff,
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=frozenset(["GET", "HEAD"]),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        if is_reddit_host(host):
+            limiter, settings = get_reddit_limiter()
+            # 429s are paused and retried by the limiter for all Reddit traffic
+            retry = retry.new(respect_retry_after_header=False)
+            return RateLimitedAdapter(
+                limiter,
+                throttle_retries=settings["throttle_retries"],
+                pool_connections=1,
+                pool_maxsize=self.pool_size,
+                max_retries=retry,
+            )
+        return HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=retry)
+
+    def _make_session(self, host):
+        session = TimeoutSession(self.timeout)
+        session.headers["User-Agent"] = USER_AGENT
+        adapter = self._make_adapter(host)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        logger.info(lambda: f"Opened pooled HTTP session for {host}")
+        return session
+
+    def session_for(self, url):
+        """The pooled session for the host of url."""
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = self._sessions[host] = self._make_session(host)
+            return session
+
+    def get(self, url, **kwargs):
+        return self.session_for(url).get(url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.session_for(url).post(url, **kwargs)
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+
+_shared_pool = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_pool():
+    """The process-wide pool, configured from plugins.conf on first use."""
+    global _shared_pool
+    with _shared_lock:
+        if _shared_pool is None:
+            _shared_pool = SessionPool(**get_settings("http", DEFAULTS))
+        return _shared_pool
@@ -0,0 +1,220 @@
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+### BEGIN LICENSE
+# Copyright (c) 2025
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License version 3, as published
+# by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranties of
+# MERCHANTABILITY, SATISFACTORY QUALITY, or FITNESS FOR A PARTICULAR
+# PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+### END LICENSE
+
+"""
+Near-duplicate detection with perceptual hashes.
+
+The same wallpaper gets crossposted to several subreddits and image
+hosts under different URLs. Every image is reduced to a 64 bit dHash
+(brightness gradients of a 9x8 grayscale thumbnail), which survives
+rescaling and recompression, and two images whose hashes differ in at
+most a few bits are treated as the same picture.
+
+Hashes of downloaded files are kept in SQLite and loaded once per process
+into a multi-index hash table, so a lookup only compares the few hashes
+that can be within the distance. Candidates are hashed from their small
+Reddit preview thumbnail before the full image is downloaded. Accepted
+candidates are claimed by the downloader that queued them, so crossposts
+queued by two sources are caught as well; a downloader releases its
+claims when it rebuilds its queue, and only saved images stay in the
+index for good.
+
+Settings ([dedup] in ~/.config/variety/pluginconfig/plugins.conf):
+    phash           enable the near-duplicate check
+    phash_distance  differing bits (of 64) still counted as the same image
+"""
+
+import io
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import weakref
+
+try:
+    from PluginConfig import cache_dir, get_settings
+except ImportError:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from PluginConfig import cache_dir, get_settings
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+logger = logging.getLogger("variety")
+
+DEFAULTS = {
+    "phash": True,
+    "phash_distance": 6,
+}
+
+
+def dhash(image):
+    """64 bit difference hash of a PIL image."""
+    if image.format == "JPEG":
+        # Let libjpeg scale down while decoding, the hash only needs 9x8
+        image.draft("L", (64, 64))
+    pixels = list(image.convert("L").resize((9, 8), Image.LANCZOS).getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return value
+
+
+def dhash_bytes(data):
+    """dHash of encoded image data, or None if it cannot be decoded."""
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            return dhash(image)
+    except Exception:
+        return None
+
+
+def dhash_file(path):
+    """dHash of an image file, or None if it cannot be decoded."""
+    try:
+        with Image.open(path) as image:
+            return dhash(image)
+    except Exception:
+        return None
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+class MultiIndex:
+    """
+    Multi-index hashing over 64 bit hashes. Not thread safe.
+
+    Each hash is cut into radius + 1 chunks with one lookup table per
+    chunk. Two hashes at most radius bits apart agree exactly on at least
+    one chunk (pigeonhole), so a search only compares the hashes that share
+    a chunk with the query instead of every stored one.
+    """
+
+    def __init__(self, radius):
+        self.radius = radius
+        chunks = radius + 1
+        self._chunks = []  # (shift, mask)
+        shift = 0
+        for chunk in range(chunks):
+            width = 64 // chunks + (1 if chunk < 64 % chunks else 0)
+            self._chunks.append((shift, (1 << width) - 1))
+            shift += width
+        self._tables = [{} for _ in self._chunks]
+        self._values = set()
+
+    @property
+    def size(self):
+        return len(self._values)
+
+    def add(self, value):
+        if value in self._values:
+            return
+        self._values.add(value)
+        for table, (shift, mask) in zip(self._tables, self._chunks):
+            table.setdefault((value >> shift) & mask, []).append(value)
+
+    def find(self, value):
+        """Some stored hash within radius of value, or None."""
+        if value in self._values:
+            return value
+        compared = set()
+        for table, (shift, mask) in zip(self._tables, self._chunks):
+            for other in table.get((value >> shift) & mask, ()):
+                if other not in compared:
+                    compared.add(other)
+                    if hamming(value, other) <= self.radius:
+                        return other
+        return None
+
+
+class HashIndex:
+    """
+    Perceptual hashes of downloaded images plus those claimed by the
+    queues of live downloaders. Thread safe.
+    """
+
+    def __init__(self, path, distance=6):
+        self._lock = threading.Lock()
+        self._hashes = MultiIndex(distance)
+        self._claims = weakref.WeakKeyDictionary()  # owner -> MultiIndex of its queued hashes
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS hashes (url TEXT PRIMARY KEY, hash TEXT)")
+        self._db.commit()
+        for (value,) in self._db.execute("SELECT hash FROM hashes"):
+            self._hashes.add(int(value, 16))
+        logger.info(lambda: f"Perceptual hash index: {self._hashes.size} images from {path}")
+
+    def claim(self, value, owner):
+        """
+        Check a candidate's hash and claim it for owner's queue if it is new.
+
+        Args:
+            value: The candidate's hash
+            owner: The downloader queueing it
+
+        Returns:
+            True if no near-duplicate was downloaded or is queued
+        """
+        with self._lock:
+            if self._hashes.find(value) is not None:
+                return False
+            if any(claims.find(value) is not None for claims in self._claims.values()):
+                return False
+            claims = self._claims.get(owner)
+            if claims is None:
+                claims = self._claims[owner] = MultiIndex(self._hashes.radius)
+            claims.add(value)
+            return True
+
+    def release(self, owner):
+        """Drop owner's claims, when its queue is rebuilt or thrown away."""
+        with self._lock:
+            self._claims.pop(owner, None)
+
+    def add_file(self, url, path):
+        """Hash a downloaded file and remember it."""
+        value = dhash_file(path)
+        if value is None:
+            return
+        with self._lock:
+            self._hashes.add(value)
+            try:
+                self._db.execute("INSERT OR REPLACE INTO hashes VALUES (?, ?)", (url, f"{value:016x}"))
+                self._db.commit()
+            except sqlite3.Error:
+                logger.exception(lambda: f"Could not record the perceptual hash of {url}")
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_hash_index():
+    """The process-wide hash index, or None when disabled or Pillow is missing."""
+    global _index
+    settings = get_settings("dedup", DEFAULTS)
+    if not settings["phash"] or Image is None:
+        return None
+    with _index_lock:
+        if _index is None:
+            _index = HashIndex(os.path.join(cache_dir("PerceptualHash"), "hashes.sqlite"), settings["phash_distance"])
+        return _index
@@ -0,0 +1,100 @@
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+### BEGIN LICENSE
+# Copyright (c) 2025
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License version 3, as published
+# by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranties of
+# MERCHANTABILITY, SATISFACTORY QUALITY, or FITNESS FOR A PARTICULAR
+# PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+### END LICENSE
+
+"""
+Shared settings and cache locations for the plugins in this folder.
+
+Settings are read once per process from
+~/.config/variety/pluginconfig/plugins.conf, one section per component:
+
+    [http]
+    pool_size = 10
+    read_timeout = 30
+
+Keys that are missing fall back to the defaults the caller passes in,
+and values are converted to the type of their default.
+
+Caches go under ~/.cache/variety/plugins/ rather than ~/.config, so they
+are not picked up together with the dotfiles.
+"""
+
+import configparser
+import logging
+import os
+import threading
+
+logger = logging.getLogger("variety")
+
+CONFIG_FILE = os.path.expanduser("~/.config/variety/pluginconfig/plugins.conf")
+CACHE_ROOT = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "variety", "plugins"
+)
+
+_parser = None
+_lock = threading.Lock()
+
+
+def _load():
+    global _parser
+    with _lock:
+        if _parser is None:
+            parser = configparser.ConfigParser()
+            try:
+                parser.read(CONFIG_FILE)
+            except configparser.Error:
+                logger.exception(lambda: f"Could not parse {CONFIG_FILE}, using defaults")
+            _parser = parser
+        return _parser
+
+
+def get_settings(section, defaults):
+    """
+    Settings of one section of plugins.conf.
+
+    Args:
+        section: Section name, e.g. "http"
+        defaults: dict of every known key with its default value
+
+    Returns:
+        dict with the same keys as defaults
+    """
+    parser = _load()
+    settings = dict(defaults)
+    if not parser.has_section(section):
+        return settings
+
+    for key, default in defaults.items():
+        if not parser.has_option(section, key):
+            continue
+        try:
+            if isinstance(default, bool):
+                settings[key] = parser.getboolean(section, key)
+            elif isinstance(default, int):
+                settings[key] = parser.getint(section, key)
+            elif isinstance(default, float):
+                settings[key] = parser.getfloat(section, key)
+            else:
+                settings[key] = parser.get(section, key)
+        except ValueError:
+            logger.warning(lambda: f"Ignoring invalid value for [{section}] {key} in {CONFIG_FILE}")
+    return settings
+
+
+def cache_dir(name):
+    """Cache folder for one component, created on first use."""
+    path = os.path.join(CACHE_ROOT, name)
+    os.makedirs(path, exist_ok=True)
+    return path
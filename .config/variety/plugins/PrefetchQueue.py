@@ -0,0 +1,319 @@
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+### BEGIN LICENSE
+# Copyright (c) 2025
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License version 3, as published
+# by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranties of
+# MERCHANTABILITY, SATISFACTORY QUALITY, or FITNESS FOR A PARTICULAR
+# PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+### END LICENSE
+
+"""
+Background download of the images a downloader hands out next.
+
+fill_queue only returns (origin_url, image_url, extra_metadata) entries;
+Variety pops them from the end of the queue one rotation at a time and
+downloads the full image then. This queue keeps the last few entries of
+each downloader's queue downloaded and checked in a staging folder, so
+download_queue_item only has to move the file into place and write its
+metadata. Entries that are not staged (yet) are downloaded as before.
+The plugins' downloaders do this through download_with_prefetch.
+
+Staged files count against a byte budget; files of entries that dropped
+out of every queue are evicted first, and an image is not staged when the
+budget is taken by images still waiting their turn. The staging folder is
+emptied on start, Variety's queues do not outlive the process.
+
+Settings ([prefetch] in ~/.config/variety/pluginconfig/plugins.conf):
+    prefetch  enable staging
+    images    entries staged ahead per downloader
+    max_mb    staging folder budget, in MiB
+    workers   concurrent background downloads
+"""
+
+import hashlib
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+from variety.Util import Util
+
+try:
+    from DownloadIndex import get_download_index
+    from HttpSessionPool import get_shared_pool
+    from PerceptualHash import get_hash_index
+    from PluginConfig import cache_dir, get_settings
+except ImportError:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from DownloadIndex import get_download_index
+    from HttpSessionPool import get_shared_pool
+    from PerceptualHash import get_hash_index
+    from PluginConfig import cache_dir, get_settings
+
+logger = logging.getLogger("variety")
+
+DEFAULTS = {
+    "prefetch": True,
+    "images": 3,
+    "max_mb": 200,
+    "workers": 2,
+}
+
+CHUNK_SIZE = 256 * 1024
+
+
+class PrefetchQueue:
+    """
+    Staged downloads of the next queue entries of registered downloaders.
+    Thread safe.
+    """
+
+    def __init__(self, folder, images=3, max_bytes=200 * 2**20, workers=2, session_pool=None):
+        self.folder = folder
+        self.images = images
+        self.max_bytes = max_bytes
+        self.http = session_pool or get_shared_pool()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="wallpaper-prefetch")
+        self._lock = threading.Lock()
+        self._staged = {}  # image URL -> (path, size)
+        self._inflight = {}  # image URL -> Future of the staged path or None
+        self._reserved = 0  # bytes of downloads in flight
+        self._upcoming = weakref.WeakKeyDictionary()  # downloader -> image URLs it hands out next
+
+        for name in os.listdir(folder):
+            try:
+                os.unlink(os.path.join(folder, name))
+            except OSError:
+                pass
+
+    def _path(self, url):
+        ext = os.path.splitext(url.split("?")[0])[1].lower()
+        return os.path.join(self.folder, hashlib.sha1(url.encode("utf-8")).hexdigest() + (ext if len(ext) <= 5 else ""))
+
+    def _used(self):
+        return sum(size for path, size in self._staged.values()) + self._reserved
+
+    def _wanted(self):
+        wanted = set()
+        for urls in self._upcoming.values():
+            wanted.update(urls)
+        return wanted
+
+    def schedule(self, downloader, queue):
+        """
+        Stage the entries downloader's queue hands out next.
+
+        Args:
+            downloader: The DefaultDownloader owning queue
+            queue: Its queue of (origin_url, image_url, extra_metadata),
+                consumed from the end
+        """
+        upcoming = [entry[1] for entry in reversed(queue[-self.images :])] if self.images > 0 else []
+        with self._lock:
+            self._upcoming[downloader] = upcoming
+            for url in upcoming:
+                if url not in self._staged and url not in self._inflight:
+                    self._inflight[url] = self._executor.submit(self._download, url)
+
+    def _reserve(self, size):
+        """Make room for size bytes, evicting staged images nobody waits for. Needs the lock."""
+        if self._used() + size > self.max_bytes:
+            wanted = self._wanted()
+            for url in [url for url in self._staged if url not in wanted]:
+                self._evict(url)
+                if self._used() + size <= self.max_bytes:
+                    break
+        if self._used() + size > self.max_bytes:
+            return False
+        self._reserved += size
+        return True
+
+    def _evict(self, url):
+        path, size = self._staged.pop(url)
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+    def _download(self, url):
+        """Download url into the staging folder. Runs on the executor."""
+        reserved = 0
+        tmp_path = None
+        try:
+            r = self.http.get(url, stream=True)
+            try:
+                r.raise_for_status()
+                expected = int(r.headers.get("Content-Length") or 0)
+                with self._lock:
+                    if expected and not self._reserve(expected):
+                        logger.info(lambda: f"Prefetch budget full, not staging {url}")
+                        return None
+                    reserved = expected
+
+                fd, tmp_path = tempfile.mkstemp(dir=self.folder, prefix=".part-")
+                size = 0
+                with os.fdopen(fd, "wb") as f:
+                    for chunk in r.iter_content(CHUNK_SIZE):
+                        f.write(chunk)
+                        size += len(chunk)
+                        if size > reserved:
+                            # No or a wrong Content-Length, account as it arrives
+                            with self._lock:
+                                if not self._reserve(size - reserved):
+                                    logger.info(lambda: f"Prefetch budget full, not staging {url}")
+                                    return None
+                            reserved = size
+            finally:
+                r.close()
+
+            if expected and size != expected:
+                logger.warning(lambda: f"Prefetch of {url} is incomplete ({size} of {expected} bytes)")
+                return None
+            if not Util.is_image(tmp_path, check_contents=True):
+                logger.info(lambda: f"Prefetched file is not an image: {url}")
+                return None
+
+            path = self._path(url)
+            os.replace(tmp_path, path)
+            tmp_path = None
+            with self._lock:
+                self._staged[url] = (path, size)
+            logger.info(lambda: f"Staged {url} ({size / 2**20:.1f} MiB)")
+            return path
+        except Exception:
+            logger.warning(lambda: f"Could not prefetch {url}")
+            return None
+        finally:
+            if tmp_path:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+            with self._lock:
+                self._reserved -= reserved
+                self._inflight.pop(url, None)
+
+    def take(self, url):
+        """
+        Hand over the staged file of url, waiting for a download in flight.
+
+        Returns:
+            path of the staged file, now owned by the caller, or None
+        """
+        with self._lock:
+            future = self._inflight.get(url)
+        if future is not None:
+            future.result()
+        with self._lock:
+            path, size = self._staged.pop(url, (None, 0))
+        return path
+
+    def save_staged(self, downloader, queue_item):
+        """
+        Save a staged queue entry the way save_locally saves a download:
+        banned and unsafe entries and existing files are skipped, and the
+        metadata defaults come from the downloader.
+
+        Returns:
+            the local file name, or None when the entry is not staged and
+            has to be downloaded, or was skipped (save_locally skips it
+            again without downloading)
+        """
+        origin_url, image_url, extra_metadata = queue_item
+        path = self.take(image_url)
+        if path is None:
+            return None
+
+        try:
+            local_filename = downloader.get_local_filename(image_url)
+            if (
+                downloader.is_in_banned(origin_url)
+                or downloader.is_unsafe(extra_metadata or {})[0]
+                or os.path.exists(local_filename)
+            ):
+                os.unlink(path)
+                return None
+            os.makedirs(downloader.target_folder, exist_ok=True)
+            shutil.move(path, local_filename)
+            metadata = {
+                "sourceType": downloader.get_source_type(),
+                "sourceName": downloader.get_source_name(),
+                "sourceLocation": downloader.get_source_location() or downloader.get_description(),
+                "sourceURL": origin_url,
+                "imageURL": image_url,
+            }
+            metadata.update(extra_metadata or {})
+            Util.write_metadata(local_filename, metadata)
+        except Exception:
+            logger.exception(lambda: f"Could not save staged image {image_url}")
+            return None
+        logger.info(lambda: f"Using prefetched image {image_url}")
+        return local_filename
+
+
+def download_with_prefetch(downloader, queue_item, download):
+    """
+    download_queue_item of the plugins' downloaders.
+
+    Saves the staged file of queue_item, or downloads it with
+    download(queue_item) (DefaultDownloader.download_queue_item) when it is
+    not staged, stages the entries handed out next meanwhile, and records
+    the saved image in the download and perceptual hash indexes. An image
+    whose content is already in the download folder under another URL is
+    removed again.
+
+    Returns:
+        the local file name or None
+    """
+    prefetch = get_prefetch_queue()
+    local_path = None
+    if prefetch:
+        local_path = prefetch.save_staged(downloader, queue_item)
+        prefetch.schedule(downloader, downloader.queue)
+    if local_path is None:
+        local_path = download(queue_item)
+    if local_path:
+        earlier = get_download_index().add(queue_item[1], local_path)
+        if earlier:
+            logger.info(lambda: f"{queue_item[1]} is the same image as {earlier}, not keeping it")
+            try:
+                os.unlink(local_path)
+            except OSError:
+                pass
+            return None
+        hash_index = get_hash_index()
+        if hash_index:
+            hash_index.add_file(queue_item[1], local_path)
+    return local_path
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_prefetch_queue():
+    """The process-wide prefetch queue, or None when staging is disabled."""
+    global _queue
+    settings = get_settings("prefetch", DEFAULTS)
+    if not settings["prefetch"] or settings["images"] <= 0:
+        return None
+    with _queue_lock:
+        if _queue is None:
+            _queue = PrefetchQueue(
+                cache_dir("Prefetch"),
+                images=settings["images"],
+                max_bytes=settings["max_mb"] * 2**20,
+                workers=max(1, settings["workers"]),
+            )
+        return _queue
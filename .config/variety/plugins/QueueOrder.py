@@ -0,0 +1,152 @@
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+### BEGIN LICENSE
+# Copyright (c) 2025
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License version 3, as published
+# by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranties of
+# MERCHANTABILITY, SATISFACTORY QUALITY, or FITNESS FOR A PARTICULAR
+# PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+### END LICENSE
+
+"""
+Weighted ordering of download queues.
+
+Variety pops queue entries from the end, and the prefetch queue stages the
+last few, so the order decides which candidates get bandwidth and disk.
+Instead of a uniform shuffle, each entry gets a weight
+
+    score ** score_weight * age ** age_weight * fit ** fit_weight
+
+from what the downloader knows about it, each term in (0, 1]:
+
+    score  log-scaled post score, relative to the best post of the same
+           subreddit in this queue, so a small subreddit in a multi-reddit
+           is not drowned out by a big one
+    age    halves every age_half_life days since the post was made
+    fit    how much of the screen the image covers, times how close its
+           aspect ratio is to the screen's, for the monitor it suits best
+
+Terms that are unknown for an entry count as 1. The order is a weighted
+random permutation (Efraimidis-Spirakis keys) whose randomness is tunable:
+0 sorts strictly by weight, 1 draws in proportion to the weights, and
+larger values flatten them towards a plain shuffle.
+
+Settings ([order] in ~/.config/variety/pluginconfig/plugins.conf):
+    order          weighted or shuffle
+    randomness     see above
+    score_weight   exponents of the terms, 0 ignores a term
+    age_weight
+    fit_weight
+    age_half_life  in days
+"""
+
+import logging
+import math
+import os
+import random
+import sys
+import time
+
+try:
+    from PluginConfig import get_settings
+except ImportError:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from PluginConfig import get_settings
+
+logger = logging.getLogger("variety")
+
+DEFAULTS = {
+    "order": "weighted",
+    "randomness": 0.5,
+    "score_weight": 1.0,
+    "age_weight": 0.5,
+    "fit_weight": 1.0,
+    "age_half_life": 30.0,
+}
+
+
+def screen_fit(size, screen):
+    """How well an image of size (width, height) fills screen, in (0, 1]."""
+    width, height = size
+    screen_width, screen_height = screen
+    if width <= 0 or height <= 0:
+        return 1.0
+    coverage = min(1.0, width / screen_width, height / screen_height)
+    ratio, screen_ratio = width / height, screen_width / screen_height
+    return max(coverage * min(ratio, screen_ratio) / max(ratio, screen_ratio), 1e-3)
+
+
+def entry_weights(features, screens=None, settings=DEFAULTS, now=None):
+    """
+    Weights of queue entries.
+
+    Args:
+        features: One dict per entry with any of "score", "created"
+            (epoch seconds), "size" ((width, height)) and "group" (score
+            normalisation group, e.g. the subreddit)
+        screens: (width, height) of each monitor the fit term compares against
+        settings: [order] settings
+        now: Reference time for the age term
+
+    Returns:
+        list of weights in (0, 1]
+    """
+    now = now or time.time()
+    best = {}
+    for feature in features:
+        if feature.get("score") is not None:
+            group = feature.get("group")
+            best[group] = max(best.get(group, 0.0), math.log1p(max(feature["score"], 0)))
+
+    half_life = max(settings["age_half_life"], 1e-3) * 86400
+    weights = []
+    for feature in features:
+        weight = 1.0
+        if feature.get("score") is not None and settings["score_weight"]:
+            top = best[feature.get("group")]
+            score = (1 + math.log1p(max(feature["score"], 0))) / (1 + top)
+            weight *= score ** settings["score_weight"]
+        if feature.get("created") and settings["age_weight"]:
+            age = 0.5 ** (max(now - feature["created"], 0) / half_life)
+            weight *= max(age, 1e-6) ** settings["age_weight"]
+        if feature.get("size") and screens and settings["fit_weight"]:
+            fit = max(screen_fit(feature["size"], screen) for screen in screens)
+            weight *= fit ** settings["fit_weight"]
+        weights.append(weight)
+    return weights
+
+
+def order_queue(queue, features=None, screens=None):
+    """
+    Reorder queue in place, entries worth the most last.
+
+    Args:
+        queue: List of queue entries
+        features: features(entry) returns the entry's feature dict (see
+            entry_weights); without it all entries weigh the same
+        screens: (width, height) of each monitor, for the fit term
+    """
+    settings = get_settings("order", DEFAULTS)
+    if settings["order"] != "weighted" or not features or len(queue) < 2:
+        random.shuffle(queue)
+        return
+
+    weights = entry_weights([features(entry) for entry in queue], screens, settings)
+    randomness = settings["randomness"]
+    if randomness <= 0:
+        keys = weights
+    else:
+        # Efraimidis-Spirakis keys u ** (1 / w) as their Gumbel form
+        # log(w) - log(-log(u)), with the weights sharpened or flattened
+        keys = [
+            math.log(weight) / randomness - math.log(max(random.expovariate(1.0), 1e-300)) for weight in weights
+        ]
+    order = sorted(range(len(queue)), key=keys.__getitem__)
+    queue[:] = [queue[i] for i in order]
+    logger.info(lambda: f"Ordered {len(queue)} queue entries by weight, best {max(weights):.2f}, worst {min(weights):.2f}")
@@ -0,0 +1,224 @@
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+### BEGIN LICENSE
+# Copyright (c) 2025
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License version 3, as published
+# by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranties of
+# MERCHANTABILITY, SATISFACTORY QUALITY, or FITNESS FOR A PARTICULAR
+# PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+### END LICENSE
+
+"""
+Fan-in of several Reddit sources into combined multi-reddit requests.
+
+Sources configured separately (r/wallpaper, r/wallpapers, ...) with the
+same sort and time period, and requested with the same authentication,
+are grouped and fetched as one multi-reddit listing
+(r/wallpaper+wallpapers/top/?t=month). The posts are then split
+by subreddit: the downloader that triggered the fetch gets its share
+right away, and the shares of the other members are kept until their own
+fill_queue asks for them. Listings that are not plain subreddit listings
+(user multis, search, ...) are not grouped.
+"""
+
+import logging
+import re
+import threading
+import time
+import weakref
+
+logger = logging.getLogger("variety")
+
+MAX_SUBREDDITS = 20  # subreddits per combined request, keeps URLs short
+
+LISTING_RE = re.compile(r"^https?://(?:www\.|old\.)?reddit\.com/r/([A-Za-z0-9_+]+)/?([^?#]*)(?:\?([^#]*))?$")
+
+
+def parse_listing_url(url):
+    """
+    Split a subreddit listing URL into its subreddits and its feed.
+
+    Returns:
+        (frozenset of lower case subreddit names, (path, query)) or None
+        for URLs that cannot be combined with others
+    """
+    match = LISTING_RE.match(url.strip())
+    if not match:
+        return None
+    subreddits = frozenset(name.lower() for name in match.group(1).split("+") if name)
+    path = match.group(2).strip("/")
+    query = match.group(3) or ""
+    return subreddits, (path, query)
+
+
+def listing_url(subreddits, feed):
+    """Listing URL of several subreddits with the given (path, query) feed."""
+    path, query = feed
+    url = "https://www.reddit.com/r/" + "+".join(sorted(subreddits))
+    if path:
+        url += "/" + path
+    if query:
+        url += "/?" + query
+    return url
+
+
+class RedditFanIn:
+    """
+    Registry of live Reddit downloaders and the combined requests they share.
+    Thread safe.
+    """
+
+    def __init__(self):
+        self._members = weakref.WeakSet()
+        self._shares = weakref.WeakKeyDictionary()  # downloader -> (time, posts)
+        self._fetch_locks = {}
+        self._lock = threading.Lock()
+
+    def register(self, downloader):
+        with self._lock:
+            self._members.add(downloader)
+
+    def plan(self):
+        """
+        Combined requests for all registered downloaders.
+
+        Members are only grouped with members whose requests carry the
+        same authentication (downloader.auth_variant()), as a listing looks
+        different to a logged-in user. auth_variant() only reports what a
+        member already resolved, so planning reads no credentials; members
+        that did not make a request yet count as anonymous.
+
+        Returns:
+            list of (combined listing URL, list of downloaders); groups of
+            a single downloader are left out
+        """
+        with self._lock:
+            members = list(self._members)
+
+        by_feed = {}
+        for member in members:
+            parsed = parse_listing_url(member.config)
+            if parsed:
+                subreddits, feed = parsed
+                by_feed.setdefault((feed, member.auth_variant()), []).append((subreddits, member))
+
+        plan = []
+        for (feed, _), entries in by_feed.items():
+            # Largest sources first, then fill each request up to MAX_SUBREDDITS
+            chunks = []
+            for subreddits, member in sorted(entries, key=lambda e: (-len(e[0]), sorted(e[0]))):
+                for chunk in chunks:
+                    if len(chunk[0] | subreddits) <= MAX_SUBREDDITS:
+                        chunk[0] |= subreddits
+                        chunk[1].append(member)
+                        break
+                else:
+                    chunks.append([set(subreddits), [member]])
+            for subreddits, group in chunks:
+                if len(group) > 1:
+                    plan.append((listing_url(subreddits, feed), group))
+        return plan
+
+    def listing_urls(self, combined=True):
+        """
+        The listings a refresh of every registered downloader requests.
+
+        Args:
+            combined: Whether grouped downloaders share their combined
+                request (see plan)
+
+        Returns:
+            list of (listing URL, list of the downloaders it serves); the
+            settings of the first one fetch it
+        """
+        with self._lock:
+            members = list(self._members)
+        urls = []
+        grouped = set()
+        if combined:
+            for url, group in self.plan():
+                urls.append((url, group))
+                grouped.update(group)
+        urls.extend((member.config, [member]) for member in members if member not in grouped)
+        return urls
+
+    def posts_for(self, downloader, fetch_pages, target, ttl, usable=None):
+        """
+        Posts of downloader's listing, fetched through its combined request.
+
+        Args:
+            downloader: A registered downloader
+            fetch_pages: fetch_pages(url, on_page) pages through url,
+                calling on_page(post data dicts) until it returns 0, the
+                number of images still wanted
+            target: Images wanted per member
+            ttl: Seconds a share kept for another member stays usable
+            usable: usable(member, posts) returns how many images posts
+                give member's queue once its own filters ran; without it
+                every post counts as one image
+
+        Returns:
+            list of post data dicts, or None when downloader is not part of
+            a combined request
+        """
+        share = self._take_share(downloader, ttl)
+        if share is not None:
+            return share
+
+        for url, group in self.plan():
+            if downloader in group:
+                break
+        else:
+            return None
+
+        with self._lock:
+            fetch_lock = self._fetch_locks.setdefault((url, downloader.auth_variant()), threading.Lock())
+        with fetch_lock:
+            # Another member may have fetched the combined listing meanwhile
+            share = self._take_share(downloader, ttl)
+            if share is not None:
+                return share
+
+            wanted = {member: parse_listing_url(member.config)[0] for member in group}
+            shares = {member: [] for member in group}
+            counts = {member: 0 for member in group}
+
+            def on_page(posts):
+                for member, subreddits in wanted.items():
+                    mine = [post for post in posts if post.get("subreddit", "").lower() in subreddits]
+                    if mine:
+                        shares[member].extend(mine)
+                        counts[member] += usable(member, mine) if usable else len(mine)
+                return max(max(target - count for count in counts.values()), 0)
+
+            logger.info(lambda: f"Fetching {len(group)} Reddit sources in one request: {url}")
+            fetch_pages(url, on_page)
+
+            now = time.time()
+            with self._lock:
+                for member, posts in shares.items():
+                    if member is not downloader:
+                        self._shares[member] = (now, posts)
+            return shares[downloader]
+
+    def _take_share(self, downloader, ttl):
+        with self._lock:
+            fetched_at, posts = self._shares.pop(downloader, (0, None))
+        if posts is not None and time.time() - fetched_at < ttl:
+            logger.info(lambda: f"Using {len(posts)} posts from a combined Reddit request for {downloader.config}")
+            return posts
+        return None
+
+
+_fan_in = RedditFanIn()
+
+
+def get_fan_in():
+    """The process-wide fan-in registry."""
+    return _fan_in
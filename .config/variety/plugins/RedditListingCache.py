@@ -0,0 +1,198 @@
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+### BEGIN LICENSE
+# Copyright (c) 2025
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License version 3, as published
+# by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranties of
+# MERCHANTABILITY, SATISFACTORY QUALITY, or FITNESS FOR A PARTICULAR
+# PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+### END LICENSE
+
+"""
+On-disk HTTP cache for Reddit listing JSON.
+
+Every listing page is stored in a compact form (only the post fields the
+downloader reads) together with its ETag and Last-Modified headers.
+Within the TTL a page is served without touching the network; after it,
+the page is revalidated with a conditional request and a 304 is answered
+from the cache. One small JSON file per page, under
+~/.cache/variety/plugins/CustomRedditDownloader/listings.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+try:
+    from PluginConfig import cache_dir
+except ImportError:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from PluginConfig import cache_dir
+
+logger = logging.getLogger("variety")
+
+MAX_AGE = 7 * 24 * 3600  # entries not revalidated for this long are removed
+
+# Post fields the downloader reads, everything else is dropped
+POST_FIELDS = (
+    "name",
+    "url",
+    "url_overridden_by_dest",
+    "title",
+    "author",
+    "subreddit",
+    "permalink",
+    "score",
+    "over_18",
+    "created_utc",
+    "gallery_data",
+    "media_metadata",
+    "preview",
+)
+MEDIA_FIELDS = ("status", "e", "m", "s", "p")
+
+
+def compact_post(post):
+    """The fields of one post's data the downloader uses."""
+    compact = {key: post[key] for key in POST_FIELDS if key in post}
+
+    if compact.get("gallery_data"):
+        compact["gallery_data"] = {
+            "items": [{"media_id": item.get("media_id")} for item in compact["gallery_data"].get("items", [])]
+        }
+    if compact.get("media_metadata"):
+        compact["media_metadata"] = {
+            media_id: {key: media[key] for key in MEDIA_FIELDS if key in media}
+            for media_id, media in compact["media_metadata"].items()
+            if isinstance(media, dict)
+        }
+    if compact.get("preview"):
+        compact["preview"] = {
+            "images": [
+                {"source": image.get("source"), "resolutions": image.get("resolutions", [])}
+                for image in compact["preview"].get("images", [])
+            ]
+        }
+    return compact
+
+
+def compact_listing(data):
+    """Listing JSON reduced to its posts' used fields and the pagination cursor."""
+    listing = data.get("data", {})
+    return {
+        "data": {
+            "after": listing.get("after"),
+            "children": [{"data": compact_post(child.get("data", {}))} for child in listing.get("children", [])],
+        }
+    }
+
+
+class ListingCache:
+    """
+    Compact listing pages with their validators, keyed by URL and auth mode.
+    Thread safe.
+    """
+
+    def __init__(self, folder, ttl=300):
+        self.folder = folder
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._prune()
+
+    def _path(self, url, variant):
+        key = hashlib.sha1(f"{variant}\n{url}".encode("utf-8")).hexdigest()
+        return os.path.join(self.folder, key + ".json")
+
+    def _prune(self):
+        now = time.time()
+        try:
+            for name in os.listdir(self.folder):
+                path = os.path.join(self.folder, name)
+                if now - os.path.getmtime(path) > MAX_AGE:
+                    os.remove(path)
+        except OSError:
+            pass
+
+    def get(self, url, variant):
+        """
+        Cached entry for url, or None.
+
+        The entry has "listing" (compact listing JSON), "etag",
+        "last_modified" and "fetched_at".
+        """
+        try:
+            with open(self._path(url, variant)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def is_fresh(self, entry):
+        return time.time() - entry.get("fetched_at", 0) < self.ttl
+
+    @staticmethod
+    def conditional_headers(entry):
+        """Validator headers for revalidating entry."""
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def store(self, url, variant, response, data):
+        """Store a 200 response and return the compact listing."""
+        return self.store_listing(url, variant, response, compact_listing(data))
+
+    def store_listing(self, url, variant, response, listing):
+        """Store the already compact listing of a 200 response and return it."""
+        self._write(
+            url,
+            variant,
+            {
+                "listing": listing,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "fetched_at": time.time(),
+            },
+        )
+        return listing
+
+    def revalidated(self, url, variant, entry):
+        """Mark entry as fresh again after a 304 and return its listing."""
+        entry["fetched_at"] = time.time()
+        self._write(url, variant, entry)
+        return entry["listing"]
+
+    def _write(self, url, variant, entry):
+        with self._lock:
+            try:
+                fd, tmp = tempfile.mkstemp(dir=self.folder, prefix=".listing-")
+                with os.fdopen(fd, "w") as f:
+                    json.dump(entry, f, separators=(",", ":"))
+                os.replace(tmp, self._path(url, variant))
+            except OSError:
+                logger.exception(lambda: f"Could not cache the listing {url}")
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_listing_cache(ttl):
+    """The process-wide listing cache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ListingCache(cache_dir(os.path.join("CustomRedditDownloader", "listings")), ttl)
+        return _cache
@@ -0,0 +1,288 @@
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+### BEGIN LICENSE
+# Copyright (c) 2025
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License version 3, as published
+# by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranties of
+# MERCHANTABILITY, SATISFACTORY QUALITY, or FITNESS FOR A PARTICULAR
+# PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+### END LICENSE
+
+"""
+Incremental parser for Reddit listing JSON.
+
+A limit=100 listing with gallery media_metadata runs to several MB.
+Instead of loading the whole document, ListingParser is fed the response
+in chunks, decodes data.children one post at a time and keeps only the
+fields the downloader reads (compact_post). ListingStream wraps a chunk
+iterator: the pagination cursor is available as soon as it has arrived,
+posts can be consumed while the rest of the page is still downloading,
+and closing the stream early leaves the remainder unread.
+
+Run this file to compare it with json.loads on recorded listings:
+
+    python3 RedditListingParser.py [listing.json ...]
+
+Without arguments it uses the listings in tests/fixtures and a synthetic
+gallery-heavy listing.
+"""
+
+import codecs
+import collections
+import json
+import os
+import re
+import sys
+
+try:
+    from RedditListingCache import compact_post
+except ImportError:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from RedditListingCache import compact_post
+
+CHUNK_SIZE = 64 * 1024
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tests", "fixtures")
+
+CHILDREN_RE = re.compile(r'"children"\s*:\s*\[')
+AFTER_RE = re.compile(r'"after"\s*:\s*(null|"(?:[^"\\]|\\.)*")')
+SEPARATORS = " \t\r\n,"
+
+
+class ListingParser:
+    """
+    Feed a listing document in chunks and get its posts back as they complete.
+    """
+
+    def __init__(self):
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self.state = "prefix"  # -> "children" -> "suffix"
+        self.after = None
+        self.after_known = False
+
+    def _find_after(self, text):
+        match = AFTER_RE.search(text)
+        if match:
+            self.after = json.loads(match.group(1))
+            self.after_known = True
+
+    def feed(self, chunk):
+        """
+        Parse the next chunk of the document.
+
+        Returns:
+            list of compact post data dicts completed by this chunk
+        """
+        self._buffer += self._text.decode(chunk)
+        posts = []
+
+        if self.state == "prefix":
+            match = CHILDREN_RE.search(self._buffer)
+            if not match:
+                return posts
+            self._find_after(self._buffer[: match.start()])
+            self._buffer = self._buffer[match.end() :]
+            self.state = "children"
+
+        if self.state == "children":
+            buffer = self._buffer
+            pos = 0
+            while True:
+                while pos < len(buffer) and buffer[pos] in SEPARATORS:
+                    pos += 1
+                if pos >= len(buffer):
+                    break
+                if buffer[pos] == "]":
+                    pos += 1
+                    self.state = "suffix"
+                    break
+                try:
+                    child, end = self._decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    # The post is not complete yet
+                    break
+                posts.append(compact_post(child.get("data", {})))
+                pos = end
+            self._buffer = buffer[pos:]
+
+        if self.state == "suffix" and not self.after_known:
+            self._find_after(self._buffer)
+        return posts
+
+
+class ListingStream:
+    """
+    Posts of one listing page, parsed while the page downloads.
+
+    Args:
+        chunks: Iterator of the document's byte chunks
+        on_complete: Called with the compact listing JSON once the whole
+            page was read. A stream closed early passes the posts read so
+            far instead, with the name of the last one as the cursor, so
+            the next page continues right after them
+        close: Called to release the connection
+    """
+
+    def __init__(self, chunks, on_complete=None, close=None):
+        self._chunks = iter(chunks)
+        self._parser = ListingParser()
+        self._pending = collections.deque()
+        self._seen = []
+        self._on_complete = on_complete
+        self._close = close
+        self.done = False
+        self.complete = False
+
+    def _read(self):
+        if self.done:
+            return False
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            self.done = self.complete = True
+            if self._on_complete:
+                self._on_complete(_listing(self._seen + list(self._pending), self.after))
+            self.close()
+            return False
+        self._pending.extend(self._parser.feed(chunk))
+        return True
+
+    @property
+    def after(self):
+        """Cursor of the next page, reading ahead as far as needed."""
+        while not self._parser.after_known and self._read():
+            pass
+        return self._parser.after
+
+    def has_posts(self):
+        """Whether the page has at least one post, reading ahead to the first."""
+        while not self._pending and not self._seen and self._parser.state != "suffix" and self._read():
+            pass
+        return bool(self._pending or self._seen)
+
+    def __iter__(self):
+        while True:
+            while self._pending:
+                post = self._pending.popleft()
+                self._seen.append(post)
+                yield post
+            if not self._read() and not self._pending:
+                return
+
+    def close(self):
+        if not self.done and self._on_complete and self._seen and self._seen[-1].get("name"):
+            self._on_complete(_listing(self._seen, self._seen[-1]["name"]))
+        self.done = True
+        if self._close:
+            self._close()
+            self._close = None
+
+
+def _listing(posts, after):
+    return {"data": {"after": after, "children": [{"data": post} for post in posts]}}
+
+
+def synthetic_listing(posts=100, gallery_items=20):
+    """A listing shaped like Reddit's with large gallery metadata."""
+    children = []
+    for n in range(posts):
+        media = {
+            f"m{n}_{i}": {
+                "status": "valid",
+                "e": "Image",
+                "m": "image/jpg",
+                "s": {"u": f"https://preview.redd.it/m{n}_{i}.jpg?width=7680&amp;s=x", "x": 7680, "y": 4320},
+                "p": [
+                    {"u": f"https://preview.redd.it/m{n}_{i}.jpg?width={w}&amp;s=x", "x": w, "y": w * 9 // 16}
+                    for w in (108, 216, 320, 640, 960, 1080)
+                ],
+                "o": [{"u": "x" * 200, "x": 7680, "y": 4320}],
+            }
+            for i in range(gallery_items)
+        }
+        children.append(
+            {
+                "kind": "t3",
+                "data": {
+                    "name": f"t3_{n}",
+                    "title": f"Post {n}",
+                    "selftext_html": "<p>" + "lorem ipsum " * 200 + "</p>",
+                    "all_awardings": [{"name": "award", "description": "x" * 300}] * 5,
+                    "url": f"https://www.reddit.com/gallery/{n}",
+                    "permalink": f"/r/wallpaper/comments/{n}/",
+                    "subreddit": "wallpaper",
+                    "score": n,
+                    "gallery_data": {"items": [{"media_id": m, "id": i} for i, m in enumerate(media)]},
+                    "media_metadata": media,
+                },
+            }
+        )
+    return json.dumps({"kind": "Listing", "data": {"after": "t3_next", "dist": posts, "children": children, "before": None}})
+
+
+def bench(paths, target=20):
+    """Time and peak memory of json.loads against streaming, full page and early stop."""
+    import time
+    import tracemalloc
+
+    synthetic = not paths
+    if synthetic and os.path.isdir(FIXTURES):
+        paths = sorted(os.path.join(FIXTURES, name) for name in os.listdir(FIXTURES) if name.endswith(".json"))
+    documents = []
+    for path in paths:
+        with open(path, "rb") as f:
+            documents.append((os.path.basename(path), f.read()))
+    if synthetic:
+        documents.append(("synthetic", synthetic_listing().encode("utf-8")))
+
+    def chunks(data):
+        for start in range(0, len(data), CHUNK_SIZE):
+            yield data[start : start + CHUNK_SIZE]
+
+    def run_loads(data):
+        listing = json.loads(data)
+        return [child["data"] for child in listing["data"]["children"]]
+
+    def run_stream(data):
+        return list(ListingStream(chunks(data)))
+
+    def run_first(data):
+        stream = ListingStream(chunks(data))
+        posts = []
+        for post in stream:
+            posts.append(post)
+            if len(posts) >= target:
+                stream.close()
+                break
+        return posts
+
+    print(f"{'listing':<24}{'mode':<16}{'posts':>6}{'ms':>9}{'first ms':>10}{'peak MiB':>10}")
+    for name, data in documents:
+        for mode, run in (("json.loads", run_loads), ("stream", run_stream), (f"stream, {target}", run_first)):
+            tracemalloc.start()
+            start = time.perf_counter()
+            posts = run(data)
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            # Latency to the first post, measured on its own run
+            start = time.perf_counter()
+            if mode == "json.loads":
+                run_loads(data)
+            else:
+                next(iter(ListingStream(chunks(data))))
+            first = time.perf_counter() - start
+            print(f"{name[:23]:<24}{mode:<16}{len(posts):>6}{elapsed * 1e3:>9.1f}{first * 1e3:>10.1f}{peak / 2**20:>10.1f}")
+        print(f"{'':<24}{len(data) / 2**20:.1f} MiB document")
+
+
+if __name__ == "__main__":
+    bench(sys.argv[1:])
@@ -0,0 +1,252 @@
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+### BEGIN LICENSE
+# Copyright (c) 2025
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License version 3, as published
+# by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranties of
+# MERCHANTABILITY, SATISFACTORY QUALITY, or FITNESS FOR A PARTICULAR
+# PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+### END LICENSE
+
+"""
+Process-wide rate limiter for Reddit requests.
+
+All sessions the pool opens for reddit.com hosts send through a
+RateLimitedAdapter sharing one token bucket, so any number of configured
+Reddit sources together stay under Reddit's limits. Waiting requests are
+served by priority (lower first, see priority_headers), then in arrival
+order. The bucket follows the X-Ratelimit-Remaining/-Reset headers Reddit
+sends, and a 429 pauses all Reddit traffic for Retry-After seconds before
+the request is sent again instead of failing.
+
+Settings ([ratelimit] in ~/.config/variety/pluginconfig/plugins.conf):
+    rate              requests per second at most
+    burst             requests that may go out back to back
+    max_wait          longest a request waits for its turn, in seconds
+    throttle_retries  times a 429 response is retried
+"""
+
+import email.utils
+import heapq
+import itertools
+import logging
+import os
+import sys
+import threading
+import time
+
+from requests.adapters import HTTPAdapter
+
+try:
+    from PluginConfig import get_settings
+except ImportError:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from PluginConfig import get_settings
+
+logger = logging.getLogger("variety")
+
+DEFAULTS = {
+    "rate": 1.0,
+    "burst": 5,
+    "max_wait": 120.0,
+    "throttle_retries": 3,
+}
+
+PRIORITY_AUTH = -1
+PRIORITY_DEFAULT = 0
+
+# Carries a request's priority to the limiter, which takes it off before sending
+PRIORITY_HEADER = "X-Variety-Priority"
+
+
+def priority_headers(priority, headers=None):
+    """
+    Copy of headers that sends a Reddit request with the given priority
+    (lower goes first). The priority travels with the request itself, so
+    it holds on whatever thread the request is sent from.
+    """
+    headers = dict(headers or {})
+    headers[PRIORITY_HEADER] = str(priority)
+    return headers
+
+
+def pop_priority(headers):
+    """Take the priority off a request's headers, PRIORITY_DEFAULT without one."""
+    try:
+        return int(headers.pop(PRIORITY_HEADER, PRIORITY_DEFAULT))
+    except ValueError:
+        return PRIORITY_DEFAULT
+
+
+def is_reddit_host(host):
+    host = host.split(":")[0]
+    return host == "reddit.com" or host.endswith(".reddit.com")
+
+
+def _header_seconds(value):
+    """Seconds in a Retry-After/X-Ratelimit-Reset header (delta or HTTP date), or None."""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(email.utils.parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """
+    Token bucket with a priority queue of waiting requests. Thread safe.
+    """
+
+    def __init__(self, rate=1.0, burst=5, max_wait=120.0):
+        self.rate = rate
+        self.burst = burst
+        self.max_wait = max_wait
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._budget_rate = None  # rate left by Reddit's X-Ratelimit headers
+        self._budget_until = 0.0
+        self._blocked_until = 0.0
+        self._waiters = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._stats = {"requests": 0, "waited": 0, "wait_seconds": 0.0, "max_wait": 0.0, "throttled": 0, "timeouts": 0}
+
+    def _current_rate(self, now):
+        if self._budget_rate is not None and now < self._budget_until:
+            return min(self.rate, self._budget_rate)
+        return self.rate
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self._current_rate(now))
+        self._updated = now
+
+    def acquire(self, priority=PRIORITY_DEFAULT):
+        """
+        Wait for the turn of one request.
+
+        Returns:
+            Seconds waited
+        """
+        ticket = (priority, next(self._seq))
+        start = time.monotonic()
+
+        with self._cond:
+            heapq.heappush(self._waiters, ticket)
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                first = self._waiters[0] == ticket
+                if first and now >= self._blocked_until and self._tokens >= 1:
+                    heapq.heappop(self._waiters)
+                    self._tokens -= 1
+                    break
+
+                left = start + self.max_wait - now
+                if left <= 0:
+                    # Send anyway rather than stall the refresh forever
+                    self._waiters.remove(ticket)
+                    heapq.heapify(self._waiters)
+                    self._stats["timeouts"] += 1
+                    break
+
+                if first and now < self._blocked_until:
+                    delay = self._blocked_until - now
+                elif first:
+                    delay = (1 - self._tokens) / self._current_rate(now)
+                else:
+                    delay = left
+                self._cond.wait(min(delay, left))
+
+            waited = time.monotonic() - start
+            self._stats["requests"] += 1
+            if waited > 0.01:
+                self._stats["waited"] += 1
+                self._stats["wait_seconds"] += waited
+                self._stats["max_wait"] = max(self._stats["max_wait"], waited)
+            self._cond.notify_all()
+        return waited
+
+    def observe(self, response):
+        """Adjust to Reddit's rate limit headers and 429 responses."""
+        headers = response.headers
+        remaining = headers.get("X-Ratelimit-Remaining")
+        reset = _header_seconds(headers.get("X-Ratelimit-Reset"))
+        now = time.monotonic()
+
+        with self._cond:
+            if response.status_code == 429:
+                self._stats["throttled"] += 1
+                pause = _header_seconds(headers.get("Retry-After"))
+                if pause is None:
+                    pause = reset if reset is not None else 60.0
+                self._blocked_until = max(self._blocked_until, now + pause)
+                logger.warning(lambda: f"Reddit rate limited us, pausing Reddit requests for {pause:.0f}s")
+            elif remaining is not None and reset is not None:
+                try:
+                    remaining = float(remaining)
+                except ValueError:
+                    return
+                if remaining < 1:
+                    self._blocked_until = max(self._blocked_until, now + reset)
+                else:
+                    # Spread what is left evenly over the rest of the window
+                    self._budget_rate = remaining / max(reset, 1.0)
+                    self._budget_until = now + reset
+            self._cond.notify_all()
+
+    def stats(self):
+        """Counters of requests, waits (count and seconds) and 429s so far."""
+        with self._cond:
+            stats = dict(self._stats)
+            stats["queued"] = len(self._waiters)
+            return stats
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    """
+    Transport adapter that sends through a RateLimiter and retries 429s
+    after the pause. The priority comes from the request's PRIORITY_HEADER,
+    which is not sent on.
+    """
+
+    def __init__(self, limiter, throttle_retries=3, **kwargs):
+        self.limiter = limiter
+        self.throttle_retries = throttle_retries
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        priority = pop_priority(request.headers)
+        for attempt in range(self.throttle_retries + 1):
+            self.limiter.acquire(priority)
+            response = super().send(request, **kwargs)
+            self.limiter.observe(response)
+            if response.status_code != 429 or attempt == self.throttle_retries:
+                return response
+            logger.info(lambda: f"Retrying {request.url} after 429 ({attempt + 1}/{self.throttle_retries})")
+            response.close()
+
+
+_limiter = None
+_settings = None
+_limiter_lock = threading.Lock()
+
+
+def get_reddit_limiter():
+    """The process-wide Reddit limiter and its settings, configured from plugins.conf on first use."""
+    global _limiter, _settings
+    with _limiter_lock:
+        if _limiter is None:
+            _settings = get_settings("ratelimit", DEFAULTS)
+            _limiter = RateLimiter(_settings["rate"], _settings["burst"], _settings["max_wait"])
+        return _limiter, _settings
@@ -0,0 +1,183 @@
+# -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
+### BEGIN LICENSE
+# Copyright (c) 2025
+# This program is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License version 3, as published
+# by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranties of
+# MERCHANTABILITY, SATISFACTORY QUALITY, or FITNESS FOR A PARTICULAR
+# PURPOSE.  See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program.  If not, see <http://www.gnu.org/licenses/>.
+### END LICENSE
+
+"""
+Reddit OAuth token cache.
+
+One cache per process, mirrored to disk so a Variety restart reuses a
+token that is still valid. Tokens are keyed by username and kept until
+shortly before Reddit's expires_in runs out; a background timer fetches
+the next one ahead of time. Concurrent callers asking for the same user
+share a single in-flight token request.
+"""
+
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+try:
+    from PluginConfig import cache_dir
+except ImportError:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from PluginConfig import cache_dir
+
+logger = logging.getLogger("variety")
+
+MIN_VALIDITY = 60  # never hand out a token with less than this many seconds left
+REFRESH_MARGIN = 300  # refresh in the background this long before expiry
+FLIGHT_TIMEOUT = 60
+
+
+class _Flight:
+    """One in-flight token request that several callers can wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.token = None
+
+
+class TokenCache:
+    def __init__(self, path):
+        self.path = path
+        self._tokens = self._load()  # username -> {"access_token", "expires_at"}
+        self._flights = {}
+        self._timers = {}
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                tokens = json.load(f)
+            return {user: entry for user, entry in tokens.items() if entry.get("expires_at", 0) > time.time()}
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        """Write the cache atomically, readable by the user only."""
+        try:
+            folder = os.path.dirname(self.path)
+            fd, tmp = tempfile.mkstemp(dir=folder, prefix=".tokens-")
+            with os.fdopen(fd, "w") as f:
+                json.dump(self._tokens, f)
+            os.chmod(tmp, 0o600)
+            os.replace(tmp, self.path)
+        except OSError:
+            logger.exception(lambda: "Could not save the Reddit token cache")
+
+    def get(self, username, fetch):
+        """
+        A valid access token for username.
+
+        Args:
+            username: Cache key
+            fetch: Callable doing the token request, returning Reddit's
+                token JSON ({"access_token": ..., "expires_in": ...})
+
+        Returns:
+            Access token string or None if it could not be obtained
+        """
+        with self._lock:
+            entry = self._tokens.get(username)
+            if entry and entry["expires_at"] - time.time() > MIN_VALIDITY:
+                # loaded from disk: nothing is refreshing it yet
+                if username not in self._timers:
+                    self._schedule_locked(username, fetch, entry["expires_at"] - time.time())
+                return entry["access_token"]
+            flight, leader = self._join_flight(username)
+
+        if leader:
+            self._refresh(username, fetch, flight)
+        elif not flight.done.wait(FLIGHT_TIMEOUT):
+            logger.warning(lambda: f"Timed out waiting for the Reddit token of {username}")
+        return flight.token
+
+    def invalidate(self, username, token):
+        """
+        Forget username's token after Reddit rejected it, so the next get()
+        requests a new one. A newer token already in the cache is kept.
+        """
+        with self._lock:
+            entry = self._tokens.get(username)
+            if entry and entry["access_token"] == token:
+                del self._tokens[username]
+                self._save()
+
+    def _join_flight(self, username):
+        """Current request for username, and whether the caller has to run it. Needs the lock."""
+        flight = self._flights.get(username)
+        if flight is not None:
+            return flight, False
+        flight = self._flights[username] = _Flight()
+        return flight, True
+
+    def _refresh(self, username, fetch, flight):
+        token = None
+        try:
+            token_data = fetch()
+            token = token_data.get("access_token") if token_data else None
+            if token:
+                expires_in = float(token_data.get("expires_in") or 3600)
+                with self._lock:
+                    self._tokens[username] = {"access_token": token, "expires_at": time.time() + expires_in}
+                    self._save()
+                    self._schedule_locked(username, fetch, expires_in)
+        except Exception:
+            logger.exception(lambda: f"Reddit token request for {username} failed")
+        finally:
+            with self._lock:
+                if token is None:
+                    # keep handing out the old token while it is still valid
+                    entry = self._tokens.get(username)
+                    if entry and entry["expires_at"] > time.time():
+                        token = entry["access_token"]
+                flight.token = token
+                self._flights.pop(username, None)
+            flight.done.set()
+
+    def _schedule_locked(self, username, fetch, remaining):
+        """Refresh username's token in the background before it expires. Needs the lock."""
+        delay = max(remaining - REFRESH_MARGIN, remaining / 2)
+
+        def refresh():
+            with self._lock:
+                flight, leader = self._join_flight(username)
+            if leader:
+                logger.info(lambda: f"Refreshing Reddit token for {username} before it expires")
+                self._refresh(username, fetch, flight)
+
+        old = self._timers.pop(username, None)
+        if old:
+            old.cancel()
+        timer = self._timers[username] = threading.Timer(delay, refresh)
+        timer.daemon = True
+        timer.start()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_token_cache():
+    """The process-wide token cache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = TokenCache(os.path.join(cache_dir("CustomRedditDownloader"), "tokens.json"))
+        return _cache
@@ -1,9 +1,17 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import requests
+import os
+import sys
+
 from variety import VarietyPlugin
 
+try:
+    from HttpSessionPool import get_shared_pool
+except ImportError:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from HttpSessionPool import get_shared_pool
+
 metadata = {
     "name": "Reddit Wallpaper Fetcher",
     "description": "Fetch top wallpapers from r/wallpaper",
@@ -18,7 +26,7 @@ HEADERS = {
 class Plugin(VarietyPlugin):
     def get_images(self):
         url = "https://www.reddit.com/r/wallpaper/top/.json?t=day&limit=20"
-        r = requests.get(url, headers=HEADERS)
+        r = get_shared_pool().get(url, headers=HEADERS)
         data = r.json()
 
         images = []
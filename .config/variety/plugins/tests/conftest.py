@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The plugins import each other by module name, as Variety loads them
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
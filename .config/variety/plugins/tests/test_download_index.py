@@ -0,0 +1,89 @@
+import os
+import sqlite3
+
+import pytest
+
+import DownloadIndex
+from DownloadIndex import DownloadIndex as Index
+
+
+class Downloader:
+    def __init__(self, folder):
+        self.target_folder = folder
+
+    def get_local_filename(self, url):
+        return os.path.join(self.target_folder, url.rpartition("/")[2])
+
+
+@pytest.fixture
+def folder(tmp_path):
+    path = tmp_path / "Downloaded"
+    path.mkdir()
+    return path
+
+
+def save(folder, name, content=b"image"):
+    path = folder / name
+    path.write_bytes(content)
+    return str(path)
+
+
+def test_downloaded_urls_are_filtered(tmp_path, folder):
+    index = Index(str(tmp_path / "index.sqlite"))
+    index.add("https://i.redd.it/a.jpg?s=1", save(folder, "a.jpg"))
+    urls = ["https://i.redd.it/a.jpg?s=2", "https://i.redd.it/b.jpg"]
+    assert index.filter_new(Downloader(str(folder)), urls) == ["https://i.redd.it/b.jpg"]
+    assert index.filter_new(Downloader(None), urls) == ["https://i.redd.it/b.jpg"]
+
+
+def test_urls_of_deleted_files_come_back_after_a_reload(tmp_path, folder):
+    db = str(tmp_path / "index.sqlite")
+    index = Index(db)
+    index.add("https://example.com/x/a.jpg", save(folder, "a.jpg"))
+    index.add("https://example.com/y/b.jpg", save(folder, "b.jpg", b"other"))
+    os.unlink(folder / "a.jpg")
+
+    urls = ["https://example.com/x/a.jpg", "https://example.com/y/b.jpg"]
+    assert Index(db).filter_new(Downloader(str(folder)), urls) == ["https://example.com/x/a.jpg"]
+
+
+def test_deleted_files_are_pruned_while_running(tmp_path, folder, monkeypatch):
+    index = Index(str(tmp_path / "index.sqlite"))
+    index.add("https://example.com/x/a.jpg", save(folder, "a.jpg"))
+    os.unlink(folder / "a.jpg")
+    downloader = Downloader(str(folder))
+    assert index.filter_new(downloader, ["https://example.com/x/a.jpg"]) == []
+
+    monkeypatch.setattr(DownloadIndex, "PRUNE_INTERVAL", -1)
+    assert index.filter_new(downloader, ["https://example.com/x/a.jpg"]) == ["https://example.com/x/a.jpg"]
+
+
+def test_folder_that_cannot_be_listed_keeps_its_entries(tmp_path, folder):
+    db = str(tmp_path / "index.sqlite")
+    Index(db).add("https://example.com/a.jpg", save(folder, "a.jpg"))
+    os.unlink(folder / "a.jpg")
+    os.rmdir(folder)
+    assert Index(db).filter_new(Downloader(None), ["https://example.com/a.jpg"]) == []
+
+
+def test_same_content_under_another_url_is_reported(tmp_path, folder):
+    index = Index(str(tmp_path / "index.sqlite"))
+    first = save(folder, "a.jpg")
+    assert index.add("https://example.com/a.jpg", first) is None
+    assert index.add("https://mirror.example.com/copy.jpg", save(folder, "copy.jpg")) == first
+    # Saving the same file again is not a duplicate of itself
+    assert index.add("https://example.com/a.jpg", first) is None
+
+
+def test_database_without_content_hashes_is_upgraded(tmp_path, folder):
+    db = str(tmp_path / "index.sqlite")
+    conn = sqlite3.connect(db)
+    conn.execute("CREATE TABLE downloads (url TEXT PRIMARY KEY, folder TEXT, filename TEXT, added REAL)")
+    conn.execute("INSERT INTO downloads VALUES ('https://example.com/old.jpg', ?, 'old.jpg', 0)", (str(folder),))
+    conn.commit()
+    conn.close()
+    save(folder, "old.jpg")
+
+    index = Index(db)
+    assert index.filter_new(Downloader(None), ["https://example.com/old.jpg"]) == []
+    index.add("https://example.com/new.jpg", save(folder, "new.jpg", b"new"))
@@ -0,0 +1,79 @@
+from RedditFanIn import MAX_SUBREDDITS, RedditFanIn, listing_url, parse_listing_url
+
+
+class Member:
+    def __init__(self, config, variant="anon"):
+        self.config = config
+        self.variant = variant
+
+    def auth_variant(self):
+        return self.variant
+
+
+def fan_in(*members):
+    registry = RedditFanIn()
+    for member in members:
+        registry.register(member)
+    return registry
+
+
+def test_parse_listing_url():
+    assert parse_listing_url("https://www.reddit.com/r/Wallpaper+EarthPorn/top/?t=month") == (
+        frozenset({"wallpaper", "earthporn"}),
+        ("top", "t=month"),
+    )
+    assert parse_listing_url("https://old.reddit.com/r/wallpapers") == (frozenset({"wallpapers"}), ("", ""))
+    assert parse_listing_url("https://www.reddit.com/user/someone/m/walls") is None
+
+
+def test_same_feed_is_combined():
+    a = Member("https://www.reddit.com/r/wallpaper/top/?t=month")
+    b = Member("https://www.reddit.com/r/wallpapers/top/?t=month")
+    c = Member("https://www.reddit.com/r/earthporn/top/?t=week")
+    plan = fan_in(a, b, c).plan()
+    assert len(plan) == 1
+    url, group = plan[0]
+    assert url == listing_url({"wallpaper", "wallpapers"}, ("top", "t=month"))
+    assert set(group) == {a, b}
+
+
+def test_members_are_grouped_by_auth_variant():
+    a = Member("https://www.reddit.com/r/wallpaper", "anon")
+    b = Member("https://www.reddit.com/r/wallpapers", "auth")
+    c = Member("https://www.reddit.com/r/earthporn", "auth")
+    plan = fan_in(a, b, c).plan()
+    assert [set(group) for _, group in plan] == [{b, c}]
+
+
+def test_combined_requests_are_capped():
+    members = [Member(f"https://www.reddit.com/r/sub{n}/new") for n in range(MAX_SUBREDDITS + 3)]
+    plan = fan_in(*members).plan()
+    assert sorted(len(group) for _, group in plan) == [3, MAX_SUBREDDITS]
+
+
+def test_listing_urls_cover_every_member_once():
+    a = Member("https://www.reddit.com/r/wallpaper")
+    b = Member("https://www.reddit.com/r/wallpapers")
+    c = Member("https://www.reddit.com/user/someone/m/walls")
+    registry = fan_in(a, b, c)
+    assert sorted((url, len(group)) for url, group in registry.listing_urls()) == [
+        ("https://www.reddit.com/r/wallpaper+wallpapers", 2),
+        ("https://www.reddit.com/user/someone/m/walls", 1),
+    ]
+    assert len(registry.listing_urls(combined=False)) == 3
+
+
+def test_posts_are_split_between_members():
+    a = Member("https://www.reddit.com/r/wallpaper")
+    b = Member("https://www.reddit.com/r/wallpapers")
+    registry = fan_in(a, b)
+    fetched = []
+
+    def fetch_pages(url, on_page):
+        fetched.append(url)
+        posts = [{"subreddit": "Wallpaper", "n": n} for n in range(3)] + [{"subreddit": "wallpapers", "n": 9}]
+        assert on_page(posts) == 1
+
+    assert [post["n"] for post in registry.posts_for(a, fetch_pages, 2, ttl=60)] == [0, 1, 2]
+    assert [post["n"] for post in registry.posts_for(b, fetch_pages, 2, ttl=60)] == [9]
+    assert fetched == ["https://www.reddit.com/r/wallpaper+wallpapers"]
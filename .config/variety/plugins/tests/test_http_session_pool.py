@@ -0,0 +1,39 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from HttpSessionPool import SessionPool
+
+
+@pytest.fixture
+def server():
+    received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            received.append(self.headers.get("Cookie"))
+            self.send_response(200)
+            self.send_header("Set-Cookie", "session=logged-in; Path=/")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_port}/", received
+    httpd.shutdown()
+
+
+def test_set_cookie_is_not_kept_for_other_requests(server):
+    url, received = server
+    pool = SessionPool(retries=0)
+    pool.get(url, cookies={"reddit_session": "secret"})
+    pool.get(url)
+    assert received == ["reddit_session=secret", None]
+    assert len(pool.session_for(url).cookies) == 0
+    pool.close()
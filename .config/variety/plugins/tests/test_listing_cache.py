@@ -0,0 +1,82 @@
+import time
+
+import pytest
+
+import RedditListingCache
+from RedditListingCache import ListingCache, compact_listing
+
+
+class Response:
+    def __init__(self, headers):
+        self.headers = headers
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ListingCache(str(tmp_path), ttl=60)
+
+
+LISTING = {
+    "kind": "Listing",
+    "data": {
+        "after": "t3_b",
+        "dist": 2,
+        "children": [
+            {"kind": "t3", "data": {"name": "t3_a", "url": "https://i.redd.it/a.jpg", "selftext_html": "long"}},
+            {
+                "kind": "t3",
+                "data": {
+                    "name": "t3_b",
+                    "gallery_data": {"items": [{"media_id": "m1", "id": 7}]},
+                    "media_metadata": {"m1": {"status": "valid", "s": {"u": "x"}, "o": [{"u": "y"}]}},
+                },
+            },
+        ],
+    },
+}
+
+
+def test_compact_listing_keeps_only_read_fields():
+    assert compact_listing(LISTING) == {
+        "data": {
+            "after": "t3_b",
+            "children": [
+                {"data": {"name": "t3_a", "url": "https://i.redd.it/a.jpg"}},
+                {
+                    "data": {
+                        "name": "t3_b",
+                        "gallery_data": {"items": [{"media_id": "m1"}]},
+                        "media_metadata": {"m1": {"status": "valid", "s": {"u": "x"}}},
+                    }
+                },
+            ],
+        }
+    }
+
+
+def test_store_and_get_by_variant(cache):
+    url = "https://www.reddit.com/r/wallpaper.json?limit=100"
+    listing = cache.store(url, "anon", Response({"ETag": '"v1"', "Last-Modified": "Mon"}), LISTING)
+    entry = cache.get(url, "anon")
+    assert entry["listing"] == listing == compact_listing(LISTING)
+    assert cache.is_fresh(entry)
+    assert cache.conditional_headers(entry) == {"If-None-Match": '"v1"', "If-Modified-Since": "Mon"}
+    assert cache.get(url, "auth") is None
+
+
+def test_stale_entry_is_revalidated(cache):
+    url = "https://www.reddit.com/r/wallpaper.json?limit=100"
+    cache.store(url, "anon", Response({}), LISTING)
+    entry = cache.get(url, "anon")
+    entry["fetched_at"] = time.time() - 120
+    assert not cache.is_fresh(entry)
+    assert cache.conditional_headers(entry) == {}
+
+    assert cache.revalidated(url, "anon", entry) == compact_listing(LISTING)
+    assert cache.is_fresh(cache.get(url, "anon"))
+
+
+def test_old_entries_are_removed_on_start(tmp_path, monkeypatch):
+    ListingCache(str(tmp_path)).store("https://example.com/x.json", "anon", Response({}), LISTING)
+    monkeypatch.setattr(RedditListingCache, "MAX_AGE", -1)
+    assert ListingCache(str(tmp_path)).get("https://example.com/x.json", "anon") is None
@@ -0,0 +1,105 @@
+import json
+import os
+
+import pytest
+
+from RedditListingCache import compact_listing
+from RedditListingParser import FIXTURES, ListingParser, ListingStream
+
+
+def chunks(data, size):
+    return [data[start:start + size] for start in range(0, len(data), size)]
+
+
+def document(posts, after="t3_next", after_first=True):
+    children = [{"kind": "t3", "data": post} for post in posts]
+    data = {"after": after, "children": children} if after_first else {"children": children, "after": after}
+    return json.dumps({"kind": "Listing", "data": data}).encode("utf-8")
+
+
+def fixture(name="listing_top_month.json"):
+    with open(os.path.join(FIXTURES, name), "rb") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("size", [61, 4096, 1 << 20])
+def test_stream_matches_json_loads_on_recorded_listing(size):
+    data = fixture()
+    expected = compact_listing(json.loads(data))["data"]
+
+    stream = ListingStream(chunks(data, size))
+    assert stream.after == expected["after"]
+    assert list(stream) == [child["data"] for child in expected["children"]]
+    assert stream.complete
+
+
+def test_multibyte_characters_split_across_chunks():
+    posts = [{"name": "t3_a", "title": "Fjord æøå \U0001f304"}, {"name": "t3_b", "title": "日本"}]
+    data = json.dumps({"data": {"after": None, "children": [{"data": post} for post in posts]}}, ensure_ascii=False)
+    parser = ListingParser()
+    parsed = []
+    for chunk in chunks(data.encode("utf-8"), 1):
+        parsed.extend(parser.feed(chunk))
+    assert parsed == posts
+
+
+@pytest.mark.parametrize("after_first", [True, False])
+@pytest.mark.parametrize("after", ["t3_next", None])
+def test_after_before_or_after_children(after_first, after):
+    posts = [{"name": f"t3_{n}", "score": n} for n in range(5)]
+    stream = ListingStream(chunks(document(posts, after, after_first), 3))
+    assert stream.after == after
+    assert list(stream) == posts
+
+
+def test_after_is_known_before_the_posts_when_it_comes_first():
+    posts = [{"name": f"t3_{n}"} for n in range(50)]
+    data = document(posts)
+    read = []
+
+    def tracked():
+        for chunk in chunks(data, 16):
+            read.append(chunk)
+            yield chunk
+
+    stream = ListingStream(tracked())
+    assert stream.after == "t3_next"
+    assert sum(map(len, read)) < len(data) // 10
+
+
+@pytest.mark.parametrize("body", [
+    {"message": "Forbidden", "error": 403},
+    {"reason": "private", "message": "Forbidden", "error": 403},
+    {"kind": "Listing", "data": {"after": None, "children": [], "before": None}},
+])
+def test_error_and_empty_documents_have_no_posts(body):
+    stream = ListingStream(chunks(json.dumps(body).encode("utf-8"), 5))
+    assert not stream.has_posts()
+    assert stream.after is None
+    assert list(stream) == []
+
+
+def test_complete_page_is_handed_to_on_complete():
+    posts = [{"name": f"t3_{n}"} for n in range(12)]
+    stored = []
+    closed = []
+    stream = ListingStream(chunks(document(posts), 10), on_complete=stored.append, close=lambda: closed.append(True))
+    assert list(stream) == posts
+    assert stored == [{"data": {"after": "t3_next", "children": [{"data": post} for post in posts]}}]
+    assert closed == [True]
+
+
+def test_early_close_hands_over_the_prefix_with_its_own_cursor():
+    posts = [{"name": f"t3_{n}"} for n in range(12)]
+    stored = []
+    stream = ListingStream(chunks(document(posts), 10), on_complete=stored.append)
+    for n, post in enumerate(stream):
+        if n == 4:
+            break
+    stream.close()
+    assert stored == [{"data": {"after": "t3_4", "children": [{"data": post} for post in posts[:5]]}}]
+
+    # Closing again, or a stream nothing was read from, stores nothing
+    stream.close()
+    ListingStream(chunks(document(posts), 10), on_complete=stored.append).close()
+    assert len(stored) == 1
@@ -0,0 +1,52 @@
+import random
+
+import pytest
+
+from PerceptualHash import HashIndex, MultiIndex, hamming
+
+
+def flip(value, bits):
+    for bit in bits:
+        value ^= 1 << bit
+    return value
+
+
+@pytest.mark.parametrize("radius", [0, 3, 6, 10])
+def test_multi_index_matches_linear_search(radius):
+    rng = random.Random(radius)
+    index = MultiIndex(radius)
+    stored = [rng.getrandbits(64) for _ in range(300)]
+    for value in stored:
+        index.add(value)
+    assert index.size == len(stored)
+
+    queries = [flip(value, rng.sample(range(64), rng.randint(0, radius + 2))) for value in stored[:100]]
+    queries += [rng.getrandbits(64) for _ in range(100)]
+    for query in queries:
+        found = index.find(query)
+        near = [value for value in stored if hamming(value, query) <= radius]
+        if near:
+            assert found is not None and hamming(found, query) <= radius
+        else:
+            assert found is None
+
+
+def test_multi_index_finds_hashes_differing_at_chunk_borders():
+    index = MultiIndex(6)
+    index.add(0)
+    # One flipped bit in every one of the seven chunks is too far...
+    assert index.find(flip(0, [0, 10, 19, 28, 37, 46, 55])) is None
+    # ...six are within the radius, wherever they fall
+    assert index.find(flip(0, [9, 10, 18, 19, 63, 0])) == 0
+
+
+def test_claims_are_per_owner(tmp_path):
+    class Owner:
+        pass
+
+    index = HashIndex(str(tmp_path / "hashes.sqlite"), distance=4)
+    first, second = Owner(), Owner()
+    assert index.claim(0xF0F0, first)
+    assert not index.claim(flip(0xF0F0, [1, 2]), second)
+    index.release(first)
+    assert index.claim(flip(0xF0F0, [1, 2]), second)
@@ -0,0 +1,113 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from RedditRateLimiter import (
+    PRIORITY_DEFAULT,
+    PRIORITY_HEADER,
+    RateLimitedAdapter,
+    RateLimiter,
+    pop_priority,
+    priority_headers,
+)
+
+
+class Response:
+    def __init__(self, status_code=200, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+def test_burst_goes_out_at_once_then_the_rate_applies():
+    limiter = RateLimiter(rate=20.0, burst=3, max_wait=5.0)
+    assert [limiter.acquire() < 0.01 for _ in range(3)] == [True] * 3
+    waited = limiter.acquire()
+    assert 0.03 < waited < 0.2
+    assert limiter.stats()["requests"] == 4
+
+
+def test_waiting_requests_go_by_priority_then_arrival():
+    limiter = RateLimiter(rate=20.0, burst=1, max_wait=5.0)
+    limiter.acquire()  # empty the bucket so everyone below has to queue
+    order = []
+
+    def request(priority, name):
+        limiter.acquire(priority)
+        order.append(name)
+
+    threads = []
+    for priority, name in [(3, "page 4"), (1, "page 2 first"), (1, "page 2 second"), (-1, "token")]:
+        thread = threading.Thread(target=request, args=(priority, name))
+        thread.start()
+        threads.append(thread)
+        time.sleep(0.005)
+    for thread in threads:
+        thread.join()
+    assert order == ["token", "page 2 first", "page 2 second", "page 4"]
+
+
+def test_429_pauses_everyone():
+    limiter = RateLimiter(rate=100.0, burst=5, max_wait=5.0)
+    limiter.observe(Response(429, {"Retry-After": "0.2"}))
+    assert limiter.acquire() > 0.15
+    assert limiter.stats()["throttled"] == 1
+
+
+def test_exhausted_budget_waits_for_the_reset():
+    limiter = RateLimiter(rate=100.0, burst=5, max_wait=5.0)
+    limiter.observe(Response(200, {"X-Ratelimit-Remaining": "0", "X-Ratelimit-Reset": "0.2"}))
+    assert limiter.acquire() > 0.15
+
+
+def test_max_wait_sends_anyway():
+    limiter = RateLimiter(rate=0.01, burst=1, max_wait=0.1)
+    limiter.acquire()
+    assert limiter.acquire() < 0.5
+    assert limiter.stats()["timeouts"] == 1
+
+
+def test_priority_header_round_trip():
+    headers = priority_headers(2, {"User-Agent": "x"})
+    assert headers == {"User-Agent": "x", PRIORITY_HEADER: "2"}
+    assert pop_priority(headers) == 2
+    assert headers == {"User-Agent": "x"}
+    assert pop_priority({}) == PRIORITY_DEFAULT
+
+
+def test_adapter_takes_the_priority_off_the_request():
+    received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            received.append(self.headers.get(PRIORITY_HEADER))
+            self.send_response(200)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    class Limiter(RateLimiter):
+        def acquire(self, priority=PRIORITY_DEFAULT):
+            priorities.append(priority)
+            return 0.0
+
+    priorities = []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    session = requests.Session()
+    session.mount("http://", RateLimitedAdapter(Limiter()))
+    try:
+        url = f"http://127.0.0.1:{httpd.server_port}/"
+        # Sent from another thread, as the page pipeline and the async engine do
+        worker = threading.Thread(target=session.get, args=(url,), kwargs={"headers": priority_headers(4)})
+        worker.start()
+        worker.join()
+        session.get(url)
+    finally:
+        session.close()
+        httpd.shutdown()
+    assert priorities == [4, PRIORITY_DEFAULT]
+    assert received == [None, None]
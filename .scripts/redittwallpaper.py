@@ -1,113 +1,384 @@
 from bs4 import BeautifulSoup
 import requests
-import shutil
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+import threading
 import sys
 import logging
 from datetime import datetime
 import re
+import html
 import ctypes
 import os
+import time
 
 logging.basicConfig(level=logging.INFO)
-logging.info("Fetching HTML page ...")
 
 url_base = 'https://www.reddit.com'
-url = 'https://www.reddit.com/r/wallpaper/top/?t=day'
+listing_path = '/r/wallpaper/top/?t=day'
+json_listing_path = '/r/wallpaper/top/.json?t=day&limit=100'  # same listing, as CustomRedditDownloader builds it
+USER_AGENT = 'Mozilla/5.0 (X11; Linux x86_64; rv:120.0) Gecko/20100101 Firefox/120.0'
 
-try:
-    html_page = requests.get(url)
-    html_page.raise_for_status()
-    logging.info("r/Wallpaper/top/day page fetched successfully!")
-except requests.exceptions.RequestException as e:
-    print(f"Error fetching HTML page: {e}")
-    sys.exit(1)
+MAX_WORKERS = 6  # post pages fetched at once
+TIMEOUT = 30
+CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_ATTEMPTS = 3  # resumed with a Range request after a dropped connection
 
-soup = BeautifulSoup(html_page.content, 'html.parser')
-posts = soup.find_all('a', class_='absolute inset-0')
+# Leading bytes of each format we accept, and the extension to save it under
+MAGIC = [
+    (b'\xff\xd8\xff', '.jpg'),
+    (b'\x89PNG\r\n\x1a\n', '.png'),
+    (b'GIF87a', '.gif'),
+    (b'GIF89a', '.gif'),
+]
 
-download_folder = r'~/Pictures/Wallpapers/ '  
-download_folder = os.path.expanduser(download_folder)
+download_folder = r'X:\Photos\Wallpapers\Reddit'  # configure for yourself
 
 
+def make_session(workers=MAX_WORKERS):
+    """One pooled session so every post page reuses the same connections."""
+    session = requests.Session()
+    session.headers['User-Agent'] = USER_AGENT
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=workers)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
 
-for post in posts:
-    source = post.attrs['href']
-    full_url = url_base + source
-    
-    try:
-        html_page2 = requests.get(full_url)
-        html_page2.raise_for_status()
-        logging.info("Post to image fetched successfully!")
-    except requests.exceptions.RequestException as t:
-        print(f"Error fetching HTML page: {t}")
-        continue
-    
-    soup2 = BeautifulSoup(html_page2.content, 'html.parser')
-    shreddit_title_tag = soup2.find('shreddit-title')  # Find <shreddit-title>-Tag
-    
-    if shreddit_title_tag:
-        title = shreddit_title_tag.get('title')
+
+def fetch_listing(session, base=url_base):
+    """Return the absolute URLs of the posts on the top/day page."""
+    logging.info("Fetching HTML page ...")
+    html_page = session.get(base + listing_path, timeout=TIMEOUT)
+    html_page.raise_for_status()
+    logging.info("r/Wallpaper/top/day page fetched successfully!")
+
+    soup = BeautifulSoup(html_page.content, 'html.parser')
+    posts = soup.find_all('a', class_='absolute inset-0')
+    return [base + post.attrs['href'] for post in posts]
+
+
+def clean_title(title):
+    """File name part of a post title: the bit before the colon, minus [..] and unsafe characters."""
+    if title:
         title_without_brackets = re.sub(r'\[.*?\]', '', title)  # Remove [..] and image size from title
         split_title = title_without_brackets.split(':')
-        
+
         if len(split_title) > 1:
             desired_part = split_title[0].strip()
         else:
             print("Can't find colon")
             desired_part = f"generic_title_{datetime.now().strftime('%Y-%m-%d')}"
-            
+
     else:
-        print("Can't find <shreddit-title>-Tag.")
+        print("Can't find post title.")
         desired_part = f"generic_title_{datetime.now().strftime('%Y-%m-%d')}"
-    
+
     desired_part = desired_part.replace(',', '_').replace("'", '')  # Replace commas and apostrophes
-    
+
     # Clean up the desired_part to remove any invalid characters
-    desired_part = re.sub(r'[<>:"/\\|?*]', '_', desired_part)
-    
-    download_folder = r'X:\Photos\Wallpapers\Reddit'  # configure for yourself
-    current_date = datetime.now().strftime('%Y-%m-%d')  # Format: YYYY-MM-DD
-    
-    # Get the image URL from the post page
+    return re.sub(r'[<>:"/\\|?*]', '_', desired_part)
+
+
+def parse_post(content):
+    """
+    Pull the file name part of the title and the single image URL out of a
+    post page. The image URL is None for galleries (2 or more images).
+    """
+    soup = BeautifulSoup(content, 'html.parser')
+    shreddit_title_tag = soup.find('shreddit-title')  # Find <shreddit-title>-Tag
+    desired_part = clean_title(shreddit_title_tag.get('title') if shreddit_title_tag else None)
+
+    element2 = soup.find('div', class_="max-h-[100vw] h-full w-full object-contain overflow-hidden relative bg-black")
+    full_img = None
+    if element2:
+        a_element = element2.find('a')
+        if a_element:
+            full_img = a_element.attrs.get('href')
+
+    return desired_part, full_img
+
+
+def single_image_url(post):
+    """
+    Image URL of a listing post (the `data` of one of `data.children`), or
+    None for galleries of 2 or more images, videos and links.
+    """
+    if post.get('is_gallery'):
+        items = (post.get('gallery_data') or {}).get('items') or []
+        if len(items) != 1:
+            return None
+        meta = (post.get('media_metadata') or {}).get(items[0].get('media_id'), {})
+        if meta.get('status') != 'valid':
+            return None
+        url = meta.get('s', {}).get('u')
+        return html.unescape(url) if url else None
+
+    url = post.get('url_overridden_by_dest') or post.get('url') or ''
+    if post.get('post_hint') == 'image' or url.lower().endswith(('.jpg', '.jpeg', '.png', '.webp', '.gif')):
+        return url
+    return None
+
+
+def iter_json_posts(session, base=url_base):
+    """
+    Yield (desired_part, image_url) for single-image posts from the JSON
+    listing. Title, image and gallery info all come from this one request.
+    """
+    logging.info("Fetching JSON listing ...")
+    r = session.get(base + json_listing_path, timeout=TIMEOUT)
+    r.raise_for_status()
+    logging.info("r/Wallpaper/top/day listing fetched successfully!")
+
+    for child in r.json().get('data', {}).get('children', []):
+        post = child.get('data', {})
+        full_img = single_image_url(post)
+        if not full_img:
+            print("Not a single-image post, moving to next post.")
+            continue
+        yield clean_title(post.get('title')), full_img
+
+
+def fetch_post(session, full_url, stop):
+    """Fetch and parse one post page, once. Returns None if it failed or we are done."""
+    if stop.is_set():
+        return None
     try:
-        html_post_page = requests.get(full_url)
+        html_post_page = session.get(full_url, timeout=TIMEOUT)
         html_post_page.raise_for_status()
-        post_soup = BeautifulSoup(html_post_page.content, 'html.parser')
-        element2 = post_soup.find('div', class_="max-h-[100vw] h-full w-full object-contain overflow-hidden relative bg-black")
-        
-        if element2:
-            a_element = element2.find('a')
-            full_img = a_element.attrs['href']
-        else:
-            print("Post with 2 or more Images, moving to next post.")
-            continue  # Skip this post if 2 or more Images
-        
-        file_name = os.path.join(download_folder, f"{desired_part}_{current_date}.png")
-        
+        logging.info("Post to image fetched successfully!")
+    except requests.exceptions.RequestException as t:
+        if not stop.is_set():  # after a hit nobody is waiting for this page
+            print(f"Error fetching post page: {t}")
+        return None
+    return parse_post(html_post_page.content)
+
+
+def iter_posts(session, post_urls, workers=MAX_WORKERS):
+    """
+    Yield (desired_part, image_url) for single-image posts in listing order
+    while up to `workers` post pages are fetched in the background. When
+    the caller stops iterating, pages not started yet are cancelled.
+    """
+    stop = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = [executor.submit(fetch_post, session, u, stop) for u in post_urls]
+        for future in futures:
+            result = future.result()
+            if result is None:
+                continue
+            desired_part, full_img = result
+            if not full_img:
+                print("Post with 2 or more Images, moving to next post.")
+                continue
+            yield desired_part, full_img
+    finally:
+        stop.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+class DownloadError(Exception):
+    pass
+
+
+def image_extension(head):
+    """Extension for the image format `head` starts with, or None if it is not an image."""
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return '.webp'
+    for magic, ext in MAGIC:
+        if head.startswith(magic):
+            return ext
+    return None
+
+
+def _fetch_part(session, full_img, part_name):
+    """
+    Append the rest of the image to part_name, resuming with a Range
+    request when part of it is already there. Returns the full size the
+    server announced, or None if it did not say.
+    """
+    have = os.path.getsize(part_name) if os.path.exists(part_name) else 0
+    headers = {'Range': f'bytes={have}-'} if have else {}
+
+    with session.get(full_img, stream=True, timeout=TIMEOUT, headers=headers) as r:
+        if r.status_code == 416:  # nothing left to send, the part file is complete
+            return have
+        r.raise_for_status()
+
+        if r.status_code == 206:
+            total = r.headers.get('Content-Range', '').rpartition('/')[2]
+            total = int(total) if total.isdigit() else None
+            mode = 'ab'
+        else:  # server ignored the Range header, start over
+            length = r.headers.get('Content-Length')
+            total = int(length) if length and length.isdigit() else None
+            mode = 'wb'
+
+        with open(part_name, mode) as f:
+            for chunk in r.iter_content(CHUNK_SIZE):
+                f.write(chunk)
+    return total
+
+
+def download_image(session, full_img, file_stem):
+    """
+    Stream the image to `<file_stem>.part`, resuming after dropped
+    connections, check its length and leading bytes, then rename it to
+    file_stem plus the extension of its real format. Returns the final path.
+    """
+    part_name = file_stem + '.part'
+    for attempt in range(DOWNLOAD_ATTEMPTS):
         try:
-            r = requests.get(full_img, stream=True)
-            r.raise_for_status()
-            
-            with open(file_name, 'wb') as f:
-                r.raw.decode_content = True
-                shutil.copyfileobj(r.raw, f)
-                print(f"Downloading wallpaper: {desired_part} ({current_date})")
-            
-            SPI_SETDESKWALLPAPER = 20
-            WALLPAPER_PATH = file_name
-            
-            try:
-                ctypes.windll.user32.SystemParametersInfoW(SPI_SETDESKWALLPAPER, 0, WALLPAPER_PATH, 3)
-                print("Wallpaper change successful!")
-                break
-            except:
-                print("Wallpaper change failed!")
-                break
-        except requests.exceptions.RequestException as e:
+            total = _fetch_part(session, full_img, part_name)
+            break
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                requests.exceptions.ChunkedEncodingError) as e:
+            if attempt == DOWNLOAD_ATTEMPTS - 1:
+                raise
+            print(f"Download interrupted ({e}), resuming ...")
+
+    size = os.path.getsize(part_name)
+    if total is not None and size != total:
+        os.remove(part_name)
+        raise DownloadError(f"got {size} of {total} bytes")
+
+    with open(part_name, 'rb') as f:
+        ext = image_extension(f.read(16))
+    if ext is None:
+        os.remove(part_name)
+        raise DownloadError("response is not a JPEG, PNG, GIF or WebP image")
+
+    file_name = file_stem + ext
+    os.replace(part_name, file_name)
+    return file_name
+
+
+def set_wallpaper(path):
+    SPI_SETDESKWALLPAPER = 20
+    try:
+        ctypes.windll.user32.SystemParametersInfoW(SPI_SETDESKWALLPAPER, 0, path, 3)
+        print("Wallpaper change successful!")
+    except:
+        print("Wallpaper change failed!")
+
+
+def download_first(session, posts):
+    """Download and set the first post that downloads cleanly. Returns True on success."""
+    current_date = datetime.now().strftime('%Y-%m-%d')  # Format: YYYY-MM-DD
+
+    for desired_part, full_img in posts:
+        file_stem = os.path.join(download_folder, f"{desired_part}_{current_date}")
+        try:
+            print(f"Downloading wallpaper: {desired_part} ({current_date})")
+            file_name = download_image(session, full_img, file_stem)
+        except (requests.exceptions.RequestException, DownloadError, OSError) as e:
             print(f"Error downloading image: {e}")
             continue
-    except requests.exceptions.RequestException as p:
-        print(f"Error fetching post page: {p}")
-        continue
 
-print("Script completed.")
+        set_wallpaper(file_name)
+        return True
+    return False
+
+
+def main(use_json=True):
+    session = make_session()
+
+    # The JSON listing gives every post's title and image in one request;
+    # scraping the HTML (1 + N page loads, tied to reddit's markup) is
+    # only the fallback.
+    done = False
+    if use_json:
+        try:
+            done = download_first(session, iter_json_posts(session))
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"Error fetching JSON listing: {e}, falling back to HTML")
+
+    if not done:
+        try:
+            post_urls = fetch_listing(session)
+        except requests.exceptions.RequestException as e:
+            print(f"Error fetching HTML page: {e}")
+            sys.exit(1)
+        download_first(session, iter_posts(session, post_urls))
+
+    print("Script completed.")
+
+
+def bench(posts=25, first_valid=12, delay=0.15):
+    """
+    Time finding the first single-image post against a local stand-in for
+    reddit: `posts` post pages that each take `delay` seconds, the first
+    `first_valid` of them galleries. Compares the old loop (one post at a
+    time, every page fetched twice) with iter_posts and the JSON listing.
+    """
+    import json
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class StandIn(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.startswith('/r/wallpaper/top/.json'):
+                time.sleep(delay)
+                children = [{'data': {'title': f'Post {i}: test [3840x2160]',
+                                      'is_gallery': i < first_valid,
+                                      'url_overridden_by_dest': f'{base}/img/{i}.png'}}
+                            for i in range(posts)]
+                body = json.dumps({'data': {'children': children}})
+            elif self.path.startswith('/r/wallpaper/top/'):
+                links = ''.join(f'<a class="absolute inset-0" href="/r/wallpaper/comments/{i}/"></a>'
+                                for i in range(posts))
+                body = f'<html><body>{links}</body></html>'
+            else:
+                time.sleep(delay)
+                i = int(self.path.rstrip('/').split('/')[-1])
+                image = ''
+                if i >= first_valid:
+                    image = ('<div class="max-h-[100vw] h-full w-full object-contain overflow-hidden relative bg-black">'
+                             f'<a href="/img/{i}.png"></a></div>')
+                body = f'<html><body><shreddit-title title="Post {i}: test [3840x2160]"></shreddit-title>{image}</body></html>'
+            data = body.encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{server.server_address[1]}'
+    logging.getLogger().setLevel(logging.WARNING)
+
+    try:
+        start = time.perf_counter()
+        for full_url in fetch_listing(requests, base):
+            requests.get(full_url, timeout=TIMEOUT)  # title
+            _, full_img = parse_post(requests.get(full_url, timeout=TIMEOUT).content)  # image
+            if full_img:
+                break
+        sequential = time.perf_counter() - start
+
+        start = time.perf_counter()
+        session = make_session()
+        for _, full_img in iter_posts(session, fetch_listing(session, base)):
+            break
+        concurrent = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _, full_img in iter_json_posts(make_session(), base):
+            break
+        listing = time.perf_counter() - start
+    finally:
+        server.shutdown()
+
+    print(f"sequential: {sequential:6.2f} s")
+    print(f"concurrent: {concurrent:6.2f} s  ({sequential / concurrent:.1f}x, {MAX_WORKERS} workers)")
+    print(f"json:       {listing:6.2f} s  ({sequential / listing:.1f}x, one request)")
+
+
+if __name__ == '__main__':
+    if '--bench' in sys.argv:
+        bench()
+    else:
+        main(use_json='--html' not in sys.argv)